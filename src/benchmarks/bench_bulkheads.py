@@ -0,0 +1,154 @@
+"""
+Benchmark cheap endpoint latency while LLM-bound requests saturate the app.
+
+Drives an in-process ASGI app through BulkheadMiddleware with two endpoints that model the
+real ones: /menu-items (one short Mongo query, a little rendering) and /recommendations
+(several Mongo queries, a slow outbound LLM call, response parsing). Mongo is a bounded
+connection pool with fixed query times, the LLM call a sleep; the CPU work is real.
+
+  shared     one bulkhead for everything, one pool, parsing on the event loop
+  bulkheads  interactive and llm bulkheads, a pool each, parsing on the llm threads
+
+Run from src/: python benchmarks/bench_bulkheads.py
+"""
+import asyncio
+import os
+import re
+import sys
+import time
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulkheads import BULKHEAD_INTERACTIVE, BULKHEAD_LLM, Bulkhead, BulkheadMiddleware, Bulkheads  # noqa: E402
+
+CHEAP_RATE = 200          # /menu-items requests per second
+CHEAP_SECONDS = 3.0
+LLM_BURST = 400           # /recommendations requests fired during the first second
+MONGO_POOL = 15           # total connections, split 10/5 with bulkheads
+CHEAP_QUERY = 0.002
+LLM_QUERIES = 4
+LLM_QUERY = 0.005
+LLM_CALL = 0.3
+
+LLM_TEXT = "\n".join(
+    f"- Dish {i} ({300 + i} calories)\nGrilled chicken with rice. Protein: {20 + i % 9}g, Carbs: {40 + i % 7}g, Fat: {10 + i % 5}g"
+    for i in range(60)
+)
+
+
+class SimulatedPool:
+    """Bounded connection pool: a query holds a connection for its duration."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.semaphore = None
+
+    async def query(self, seconds: float):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.size)
+        async with self.semaphore:
+            await asyncio.sleep(seconds)
+
+
+def parse_recommendation(text: str) -> dict:
+    totals = {"calories": 0, "protein": 0, "carbs": 0, "fat": 0}
+    for _ in range(25):
+        for calories in re.findall(r"\((\d+) calories\)", text):
+            totals["calories"] += int(calories)
+        for name, grams in re.findall(r"(Protein|Carbs|Fat): (\d+)g", text):
+            totals[name.lower()] += int(grams)
+    return totals
+
+
+def render_menu() -> str:
+    return "".join(f"<li>Dish {i}</li>" for i in range(50))
+
+
+def build_app(isolated: bool):
+    if isolated:
+        bulkheads = Bulkheads(
+            {
+                BULKHEAD_INTERACTIVE: Bulkhead(BULKHEAD_INTERACTIVE, max_concurrent=256, max_queue=256, mongo_pool=10),
+                BULKHEAD_LLM: Bulkhead(BULKHEAD_LLM, max_concurrent=48, max_queue=16, mongo_pool=5, cpu_workers=2),
+            },
+            {"/recommendations": BULKHEAD_LLM}
+        )
+    else:
+        bulkheads = Bulkheads({BULKHEAD_INTERACTIVE: Bulkhead(BULKHEAD_INTERACTIVE, max_concurrent=1024, max_queue=1024, mongo_pool=MONGO_POOL)}, {})
+    pools = {name: SimulatedPool(bulkhead.mongo_pool) for name, bulkhead in bulkheads.bulkheads.items()}
+
+    async def menu_items(request):
+        await pools[bulkheads.current().name].query(CHEAP_QUERY)
+        return JSONResponse({"html": render_menu()})
+
+    async def recommendations(request):
+        bulkhead = bulkheads.current()
+        for _ in range(LLM_QUERIES):
+            await pools[bulkhead.name].query(LLM_QUERY)
+        await asyncio.sleep(LLM_CALL)
+        if isolated:
+            goals = await bulkhead.run_cpu(parse_recommendation, LLM_TEXT)
+        else:
+            goals = parse_recommendation(LLM_TEXT)
+        return JSONResponse(goals)
+
+    app = Starlette(routes=[Route("/menu-items", menu_items), Route("/recommendations", recommendations, methods=["POST"])])
+    return BulkheadMiddleware(app, bulkheads), bulkheads
+
+
+async def run(label: str, isolated: bool, with_llm: bool = True):
+    app, bulkheads = build_app(isolated)
+    transport = httpx.ASGITransport(app=app)
+    timings = []
+    statuses = {}
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        async def cheap():
+            start = time.perf_counter()
+            response = await client.get("/menu-items")
+            timings.append(time.perf_counter() - start)
+            assert response.status_code == 200
+
+        async def llm():
+            response = await client.post("/recommendations")
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def paced(send, count, rate):
+            # Fire at a fixed rate without waiting for responses, then wait for all of them
+            start = time.perf_counter()
+            sent = []
+            for i in range(count):
+                await asyncio.sleep(max(0.0, start + i / rate - time.perf_counter()))
+                sent.append(asyncio.ensure_future(send()))
+            await asyncio.gather(*sent)
+
+        load = [paced(cheap, int(CHEAP_RATE * CHEAP_SECONDS), CHEAP_RATE)]
+        if with_llm:
+            load.append(paced(llm, LLM_BURST, LLM_BURST))
+        await asyncio.gather(*load)
+    await bulkheads.close()
+
+    timings.sort()
+
+    def pct(p):
+        return timings[min(len(timings) - 1, int(len(timings) * p))] * 1000
+
+    llm_summary = f"   llm {dict(sorted(statuses.items()))}" if with_llm else ""
+    print(f"{label:<22} /menu-items p50 {pct(0.5):7.2f} ms   p99 {pct(0.99):8.2f} ms   max {timings[-1] * 1000:8.2f} ms{llm_summary}")
+    return pct(0.99)
+
+
+async def main():
+    await run("cheap only", isolated=True, with_llm=False)
+    shared = await run("shared under LLM burst", isolated=False)
+    isolated = await run("bulkheads under burst", isolated=True)
+    print(f"/menu-items p99 under LLM saturation: {shared / isolated:.1f}x lower with bulkheads")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+Benchmark logging overhead per request on the calling (event loop) thread.
+
+Each simulated request logs like /recommendations does: a couple of app INFO lines and
+a few httpx INFO lines. Compares the old setup (basicConfig + f-strings, formatted and
+written synchronously) with the queue-based JSON setup from logging_setup, once with a
+fast sink and once with a sink that stalls like a backed-up container log pipe.
+
+With the fast sink expect about the same cost (0.9-1.1x, noisy): the listener thread
+still formats every kept record, and under the GIL that time is taken from the caller.
+The gain is with the stalled sink, whose writes no longer block the caller.
+
+Run from src/: python benchmarks/bench_logging.py
+"""
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging_setup  # noqa: E402
+
+REQUESTS = 20_000
+SLOW_WRITE_SECONDS = 0.0002
+PROFILE = {"email": "user@example.com", "goals": ["lose_weight"], "allergies": ["peanut"], "age": 31}
+
+app_logger = logging.getLogger("main")
+http_logger = logging.getLogger("httpx")
+
+
+def request_eager(i):
+    app_logger.info(f"Generating recommendations for {PROFILE['email']} with profile {PROFILE}")
+    for _ in range(3):
+        http_logger.info(f"HTTP Request: POST https://api.groq.com/openai/v1/chat/completions \"HTTP/1.1 200 OK\" #{i}")
+    app_logger.debug(f"Prompt built for request {i}: {PROFILE}")
+    app_logger.info(f"Recommendation served by model tier: primary ({i})")
+
+
+def request_lazy(i):
+    app_logger.info("Generating recommendations for %s with profile %s", PROFILE["email"], PROFILE)
+    for _ in range(3):
+        http_logger.info("HTTP Request: %s %s \"%s\" #%s", "POST", "https://api.groq.com/openai/v1/chat/completions", "HTTP/1.1 200 OK", i)
+    app_logger.debug("Prompt built for request %s: %s", i, PROFILE)
+    app_logger.info("Recommendation served by model tier: %s (%s)", "primary", i)
+
+
+class SlowSink:
+    """Stream whose writes block for a while, like stdout when the log collector lags."""
+
+    def write(self, text):
+        time.sleep(SLOW_WRITE_SECONDS)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def run(label, request, requests=REQUESTS):
+    for i in range(min(500, requests)):
+        request(i)
+    start = time.perf_counter()
+    for i in range(requests):
+        request(i)
+    elapsed = (time.perf_counter() - start) / requests
+    print(f"{label:36s} {elapsed * 1e6:9.2f} us/request")
+    return elapsed
+
+
+def compare(sink_name, sink, requests=REQUESTS):
+    logging.basicConfig(level=logging.INFO, stream=sink, force=True)
+    eager = run(f"{sink_name}: basicConfig + f-strings", request_eager, requests)
+
+    stdout = sys.stdout
+    sys.stdout = sink
+    sampling = logging_setup.setup_logging("INFO", {"httpx": 0.01})
+    sys.stdout = stdout
+    lazy = run(f"{sink_name}: queue + JSON + sampling", request_lazy, requests)
+    start = time.perf_counter()
+    logging_setup.stop_logging()
+    print(f"{sink_name}: listener drained backlog in {(time.perf_counter() - start) * 1000:.0f} ms, "
+          f"{sampling.dropped} records sampled out")
+    print(f"{sink_name}: caller-side speedup {eager / lazy:.1f}x")
+
+
+if __name__ == "__main__":
+    with open(os.devnull, "w") as devnull:
+        compare("fast sink", devnull)
+    compare("slow sink", SlowSink(), requests=1_000)
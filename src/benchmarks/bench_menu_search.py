@@ -0,0 +1,82 @@
+"""
+Benchmark /menu-items/search over a 50k item catalog (target: p99 under 5 ms).
+
+Run from src/: python benchmarks/bench_menu_search.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from menu_search import SearchIndex  # noqa: E402
+
+ITEMS = 50_000
+QUERIES = 2_000
+WORDS = ["grilled", "chicken", "salad", "salmon", "teriyaki", "beef", "rendang", "nasi", "goreng",
+         "tofu", "tempeh", "soup", "porridge", "oat", "banana", "smoothie", "quinoa", "bowl", "spicy",
+         "sambal", "avocado", "toast", "egg", "omelette", "brown", "rice", "noodle", "curry", "lentil",
+         "yogurt", "granola", "berry", "steamed", "fish", "vegetable", "stir", "fry", "mushroom"]
+CATEGORIES = ["breakfast", "lunch", "dinner", "snack"]
+
+
+def make_items():
+    random.seed(3)
+    return [
+        {
+            "_id": str(i),
+            "name": " ".join(random.sample(WORDS, k=3)).title(),
+            "description": " ".join(random.sample(WORDS, k=8)),
+            "category": random.choice(CATEGORIES),
+            "nutrition_info": {"calories": random.randint(150, 900)}
+        }
+        for i in range(ITEMS)
+    ]
+
+
+def typo(word):
+    if len(word) < 4:
+        return word
+    i = random.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1:]
+
+
+def make_queries():
+    random.seed(5)
+    queries = []
+    for _ in range(QUERIES):
+        kind = random.random()
+        word = random.choice(WORDS)
+        if kind < 0.4:
+            queries.append((word[:random.randint(2, len(word))], {}))
+        elif kind < 0.7:
+            queries.append((f"{typo(word)} {random.choice(WORDS)}", {}))
+        else:
+            low = random.randint(150, 600)
+            queries.append((typo(word), {"category": random.choice(CATEGORIES), "min_calories": low, "max_calories": low + 300}))
+    return queries
+
+
+if __name__ == "__main__":
+    items = make_items()
+    start = time.perf_counter()
+    index = SearchIndex()
+    index.rebuild(items)
+    print(f"index build  {(time.perf_counter() - start) * 1000:8.1f} ms for {ITEMS} items")
+
+    queries = make_queries()
+    for query, filters in queries[:50]:
+        index.search(query, **filters)
+
+    timings = []
+    for query, filters in queries:
+        start = time.perf_counter()
+        index.search(query, **filters)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+
+    def pct(p):
+        return timings[min(len(timings) - 1, int(len(timings) * p))] * 1000
+
+    print(f"p50 {pct(0.5):6.2f} ms   p95 {pct(0.95):6.2f} ms   p99 {pct(0.99):6.2f} ms   max {timings[-1] * 1000:6.2f} ms")
@@ -0,0 +1,155 @@
+"""
+Benchmark the primary's read load with and without read routing to secondaries.
+
+Runs the same mixed workload (70% catalog, 20% plan history, 10% profile read-after-write)
+twice against a replica set: once with every route on the primary, once with the default
+READ_ROUTING. Reads served by each member are taken from serverStatus opcounters.
+
+Needs a local 3-node replica set, e.g.:
+
+    mkdir -p /tmp/rs/a /tmp/rs/b /tmp/rs/c
+    mongod --replSet rs0 --port 27017 --dbpath /tmp/rs/a --fork --logpath /tmp/rs/a.log
+    mongod --replSet rs0 --port 27018 --dbpath /tmp/rs/b --fork --logpath /tmp/rs/b.log
+    mongod --replSet rs0 --port 27019 --dbpath /tmp/rs/c --fork --logpath /tmp/rs/c.log
+    mongosh --port 27017 --eval 'rs.initiate({_id: "rs0", members: [
+        {_id: 0, host: "localhost:27017"}, {_id: 1, host: "localhost:27018"}, {_id: 2, host: "localhost:27019"}]})'
+
+Run from src/: python benchmarks/bench_read_routing.py
+(MONGO_URL overrides the connection string; the bench writes to the read_routing_bench db)
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from read_routing import (  # noqa: E402
+    DEFAULT_READ_ROUTES, ROUTE_CATALOG, ROUTE_HISTORY, ROUTE_PROFILE, ReadRoute, ReadRouter
+)
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0")
+DB_NAME = "read_routing_bench"
+ITEMS = 5_000
+USERS = 500
+PLANS_PER_USER = 10
+REQUESTS = 20_000
+CONCURRENCY = 50
+CATEGORIES = ["breakfast", "lunch", "dinner", "snack"]
+
+ALL_PRIMARY = {name: ReadRoute(name, "primary", read_concern="local") for name in DEFAULT_READ_ROUTES}
+
+
+async def seed(db):
+    await db.client.drop_database(DB_NAME)
+    random.seed(3)
+    await db.menu_items.insert_many([
+        {"name": f"Dish {i}", "category": random.choice(CATEGORIES),
+         "nutrition_info": {"calories": random.randint(150, 900)}, "price": random.randint(20, 80) * 1000}
+        for i in range(ITEMS)
+    ])
+    await db.menu_items.create_index([("category", 1), ("nutrition_info.calories", 1)])
+    await db.users.insert_many([{"email": f"user{i}@example.com", "health_profile": {"age": 30}} for i in range(USERS)])
+    await db.users.create_index("email", unique=True)
+    await db.diet_plans.insert_many([
+        {"user_id": f"user{i}@example.com", "day": day, "total_calories": 2000}
+        for i in range(USERS) for day in range(PLANS_PER_USER)
+    ])
+    await db.diet_plans.create_index("user_id")
+
+
+async def request(router, db, kind, user):
+    if kind == ROUTE_CATALOG:
+        low = random.randint(150, 700)
+        query = {"category": random.choice(CATEGORIES), "nutrition_info.calories": {"$gte": low, "$lte": low + 200}}
+        await router.database(db, ROUTE_CATALOG).menu_items.find(query).to_list(length=50)
+    elif kind == ROUTE_HISTORY:
+        await router.database(db, ROUTE_HISTORY).diet_plans.find({"user_id": user}).to_list(length=None)
+    else:
+        profile_db = router.database(db, ROUTE_PROFILE)
+        age = random.randint(18, 80)
+        await profile_db.users.update_one({"email": user}, {"$set": {"health_profile.age": age}})
+        saved = await profile_db.users.find_one({"email": user})
+        assert saved["health_profile"]["age"] == age, "profile route must read its own write"
+
+
+def workload():
+    random.seed(7)
+    kinds = random.choices([ROUTE_CATALOG, ROUTE_HISTORY, ROUTE_PROFILE], weights=[70, 20, 10], k=REQUESTS)
+    return [(kind, f"user{random.randrange(USERS)}@example.com") for kind in kinds]
+
+
+def member_reads(members):
+    """Reads (query + getmore) served so far by each replica set member."""
+    reads = {}
+    for host, client in members.items():
+        counters = client.admin.command("serverStatus")["opcounters"]
+        reads[host] = counters["query"] + counters["getmore"]
+    return reads
+
+
+async def run(label, routes, db, members, primary, requests):
+    router = ReadRouter(routes)
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    timings = []
+
+    async def timed(kind, user):
+        async with semaphore:
+            start = time.perf_counter()
+            await request(router, db, kind, user)
+            timings.append(time.perf_counter() - start)
+
+    before = member_reads(members)
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(kind, user) for kind, user in requests))
+    elapsed = time.perf_counter() - start
+    after = member_reads(members)
+    timings.sort()
+
+    reads = {host: after[host] - before[host] for host in members}
+    print(f"{label:<14} {len(requests) / elapsed:8.0f} req/s   p50 {timings[len(timings) // 2] * 1000:6.2f} ms   "
+          f"p99 {timings[int(len(timings) * 0.99)] * 1000:6.2f} ms")
+    for host, count in reads.items():
+        print(f"    {host:<18} {'primary' if host == primary else 'secondary':<9} {count:8d} reads")
+    return reads
+
+
+def primary_host(members):
+    for host, client in members.items():
+        if client.admin.command("hello").get("isWritablePrimary"):
+            return host
+
+
+async def main():
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    hello = await client.admin.command("hello")
+    if "setName" not in hello:
+        sys.exit("MONGO_URL must point at a replica set (see the docstring)")
+    members = {host: MongoClient(host, directConnection=True) for host in hello["hosts"]}
+
+    await seed(db)
+    requests = workload()
+    # Let secondaries catch up with the seed data before measuring
+    await asyncio.sleep(2)
+    primary = primary_host(members)
+    await run("warmup", DEFAULT_READ_ROUTES, db, members, primary, requests[:1_000])
+
+    baseline = await run("all primary", ALL_PRIMARY, db, members, primary, requests)
+    routed = await run("routed", DEFAULT_READ_ROUTES, db, members, primary, requests)
+
+    reduction = 1 - routed[primary] / max(baseline[primary], 1)
+    print(f"primary read load reduced by {reduction * 100:.0f}% "
+          f"({baseline[primary]} -> {routed[primary]} reads)")
+
+    await client.drop_database(DB_NAME)
+    for member in members.values():
+        member.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""
+Benchmark the /recipes proxy against a local stand-in recipe service.
+
+The stand-in is a small ASGI app with a fixed latency, served in-process through
+httpx.ASGITransport. Compares direct upstream calls with the cached, coalescing proxy
+for a burst of concurrent identical requests and a stream of repeated requests.
+
+Run from src/: python benchmarks/bench_recipe_proxy.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recipe_proxy import RecipeProxy  # noqa: E402
+
+UPSTREAM_LATENCY = 0.2
+BURST = 50
+REPEATS = 200
+
+stand_in = FastAPI()
+upstream_calls = 0
+
+
+@stand_in.post("/api/recipes")
+async def fake_recipes(request: Request):
+    global upstream_calls
+    upstream_calls += 1
+    body = await request.json()
+    await asyncio.sleep(UPSTREAM_LATENCY)
+    return {"recipes": [{"name": f"{' & '.join(body['ingredients'])} bowl", "description": "",
+                         "ingredients": body["ingredients"], "instructions": ["Cook"]}]}
+
+
+async def direct(client, body):
+    response = await client.post("http://stand-in/api/recipes", json=body)
+    return response.json()
+
+
+async def run(label, call):
+    global upstream_calls
+    upstream_calls = 0
+    bodies = [{"ingredients": ["Rice", " egg"]}, {"ingredients": ["egg", "rice"]}]
+
+    start = time.perf_counter()
+    await asyncio.gather(*[call(bodies[i % 2]) for i in range(BURST)])
+    burst = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(REPEATS):
+        await call(bodies[i % 2])
+    repeated = (time.perf_counter() - start) / REPEATS
+
+    print(f"{label:<8} burst of {BURST}: {burst * 1000:7.1f} ms   repeated: {repeated * 1000:7.3f} ms/request   "
+          f"upstream calls: {upstream_calls}")
+
+
+async def main():
+    transport = httpx.ASGITransport(app=stand_in)
+    async with httpx.AsyncClient(transport=transport) as client:
+        await run("direct", lambda body: direct(client, body))
+
+    proxy = RecipeProxy("http://stand-in/api/recipes", transport=transport)
+    await proxy.start()
+    await run("proxy", proxy.get)
+    print(f"proxy stats: {proxy.stats()}")
+    await proxy.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+"""
+Benchmark serializing a 10k item /menu-items response.
+
+Compares the default FastAPI path (response_model validation + jsonable_encoder + json)
+with the orjson fast path used for trusted DB documents.
+
+Run from src/: python benchmarks/bench_serialization.py
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import List
+
+import numpy as np
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# main.py reads its settings at import time; nothing here connects to them
+for key in ["MONGO_URL", "AUTH0_CLIENT_ID", "AUTH0_CLIENT_SECRET", "AUTH0_DOMAIN",
+            "AUTH0_CALLBACK_URL", "AUTH0_AUDIENCE", "SECRET_KEY", "GROQ_API_KEY"]:
+    os.environ.setdefault(key, "benchmark")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from main import MenuItem  # noqa: E402
+from serialization import dumps, prepare_documents  # noqa: E402
+
+ITEMS = 10_000
+ROUNDS = 5
+
+
+def make_documents():
+    now = datetime.now()
+    return [
+        {
+            "_id": ObjectId(),
+            "name": f"Dish {i}",
+            "description": "Grilled chicken with brown rice and steamed vegetables",
+            "nutrition_info": {"calories": 350 + i % 400, "protein": 25.0, "carbs": 40.0, "fat": np.float64(12.5)},
+            "price": 45000.0,
+            "category": ["breakfast", "lunch", "dinner"][i % 3],
+            "created_at": now,
+            "updated_at": now
+        }
+        for i in range(ITEMS)
+    ]
+
+
+def pydantic_path(documents):
+    adapter = TypeAdapter(List[MenuItem])
+    for document in documents:
+        document["id"] = str(document.pop("_id"))
+        document["nutrition_info"] = {k: float(v) for k, v in document["nutrition_info"].items()}
+    return json.dumps(jsonable_encoder(adapter.validate_python(documents))).encode()
+
+
+def fast_path(documents):
+    return dumps(prepare_documents(documents))
+
+
+def run(name, fn):
+    timings = []
+    for _ in range(ROUNDS):
+        documents = make_documents()
+        start = time.perf_counter()
+        body = fn(documents)
+        timings.append(time.perf_counter() - start)
+    print(f"{name:<10} best {min(timings) * 1000:8.1f} ms   size {len(body) / 1024:8.0f} KiB")
+    return min(timings)
+
+
+if __name__ == "__main__":
+    print(f"Serializing {ITEMS} menu items, best of {ROUNDS}")
+    slow = run("pydantic", pydantic_path)
+    fast = run("orjson", fast_path)
+    print(f"speedup    {slow / fast:.1f}x")
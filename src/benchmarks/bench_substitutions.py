@@ -0,0 +1,96 @@
+"""
+Benchmark dish substitution lookups over a 50k item catalog (target: under 1 ms).
+
+Compares SubstitutionIndex against scoring every item of the catalog in Python.
+
+Run from src/: python benchmarks/bench_substitutions.py
+"""
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dietary_tags import item_exclusion_tags  # noqa: E402
+from substitutions import SubstitutionIndex, item_features  # noqa: E402
+
+ITEMS = 50_000
+QUERIES = 2_000
+K = 5
+ALLERGENS = ["peanut", "tree_nut", "dairy", "egg", "gluten", "soy", "fish", "shellfish", "sesame"]
+CATEGORIES = ["breakfast", "lunch", "dinner", "snack"]
+
+
+def make_items():
+    random.seed(13)
+    return [
+        {
+            "_id": str(i),
+            "name": f"Dish {i}",
+            "category": random.choice(CATEGORIES),
+            "allergens": random.sample(ALLERGENS, k=random.randint(0, 2)),
+            "nutrition_info": {
+                "calories": random.randint(150, 900),
+                "protein": round(random.uniform(5, 60), 1),
+                "carbs": round(random.uniform(10, 120), 1),
+                "fat": round(random.uniform(3, 40), 1)
+            },
+            "price": random.randint(20, 80) * 1000
+        }
+        for i in range(ITEMS)
+    ]
+
+
+def make_queries():
+    random.seed(17)
+    return [(str(random.randrange(ITEMS)), set(random.sample(ALLERGENS, k=random.randint(0, 3)))) for _ in range(QUERIES)]
+
+
+def linear_nearest(items, scale, item_id, exclude):
+    target = items[int(item_id)]
+    vector = item_features(target)
+    scored = []
+    for item in items:
+        if item is target or item["category"] != target["category"] or item_exclusion_tags(item) & exclude:
+            continue
+        distance = math.sqrt(sum(((a - b) / s) ** 2 for a, b, s in zip(item_features(item), vector, scale)))
+        scored.append((distance, item["_id"]))
+    scored.sort()
+    return [item_id for _, item_id in scored[:K]]
+
+
+if __name__ == "__main__":
+    items = make_items()
+    queries = make_queries()
+
+    start = time.perf_counter()
+    index = SubstitutionIndex()
+    index.rebuild(items)
+    print(f"index build  {(time.perf_counter() - start) * 1000:8.1f} ms for {ITEMS} items")
+
+    for item_id, exclude in queries[:50]:
+        index.nearest(item_id, K, exclude)
+
+    timings = []
+    for item_id, exclude in queries:
+        start = time.perf_counter()
+        index.nearest(item_id, K, exclude)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+
+    def pct(p):
+        return timings[min(len(timings) - 1, int(len(timings) * p))] * 1000
+
+    print(f"p50 {pct(0.5):6.3f} ms   p95 {pct(0.95):6.3f} ms   p99 {pct(0.99):6.3f} ms   max {timings[-1] * 1000:6.3f} ms")
+
+    start = time.perf_counter()
+    for item_id, exclude in queries[:5]:
+        expected = linear_nearest(items, index.scale, item_id, exclude)
+    linear = (time.perf_counter() - start) / 5
+    print(f"linear scan  {linear * 1000:8.1f} ms/query")
+
+    item_id, exclude = queries[4]
+    assert [item["_id"] for item in index.nearest(item_id, K, exclude)] == expected
+    print(f"speedup (p50 vs linear) {linear * 1000 / pct(0.5):.0f}x")
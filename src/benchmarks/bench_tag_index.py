@@ -0,0 +1,92 @@
+"""
+Benchmark allergen/diet filtering over a 50k item catalog with 30+ tags.
+
+Compares the bitset TagIndex against filtering the item list in Python.
+
+Run from src/: python benchmarks/bench_tag_index.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dietary_tags import TagIndex, item_diet_tags, item_exclusion_tags  # noqa: E402
+
+ITEMS = 50_000
+QUERIES = 200
+ALLERGENS = ["peanut", "tree_nut", "dairy", "egg", "gluten", "soy", "fish", "shellfish", "sesame",
+             "mustard", "celery", "lupin", "sulphite", "mollusc", "corn", "pork", "beef", "alcohol"]
+DIETS = ["vegetarian", "vegan", "halal", "kosher", "keto", "low_carb", "gluten_free", "dairy_free",
+         "low_salt", "high_protein", "paleo", "diabetic_friendly", "low_fat", "pescatarian"]
+CATEGORIES = ["breakfast", "lunch", "dinner", "snack"]
+
+
+def make_items():
+    random.seed(7)
+    return [
+        {
+            "_id": str(i),
+            "name": f"Dish {i}",
+            "category": random.choice(CATEGORIES),
+            "allergens": random.sample(ALLERGENS, k=random.randint(0, 3)),
+            "diet_tags": random.sample(DIETS, k=random.randint(0, 4))
+        }
+        for i in range(ITEMS)
+    ]
+
+
+def make_queries():
+    random.seed(11)
+    return [
+        (random.choice(CATEGORIES), set(random.sample(ALLERGENS, k=3)), set(random.sample(DIETS, k=1)))
+        for _ in range(QUERIES)
+    ]
+
+
+def linear_filter(items, category, exclude, require):
+    return [
+        item for item in items
+        if item["category"] == category
+        and not item_exclusion_tags(item) & exclude
+        and require <= item_diet_tags(item)
+    ]
+
+
+if __name__ == "__main__":
+    items = make_items()
+    queries = make_queries()
+    print(f"{ITEMS} items, {len(ALLERGENS) + len(DIETS)} tags, {QUERIES} queries")
+
+    start = time.perf_counter()
+    index = TagIndex()
+    index.rebuild(items)
+    print(f"index build        {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    start = time.perf_counter()
+    for category, exclude, require in queries[:10]:
+        expected = linear_filter(items, category, exclude, require)
+    linear = (time.perf_counter() - start) / 10
+    print(f"linear filter      {linear * 1000:8.3f} ms/query")
+
+    start = time.perf_counter()
+    for category, exclude, require in queries:
+        index.match(category, exclude, require)
+    bitset = (time.perf_counter() - start) / QUERIES
+    print(f"bitset match       {bitset * 1000:8.3f} ms/query")
+
+    start = time.perf_counter()
+    for category, exclude, require in queries:
+        result = index.items_for(index.match(category, exclude, require))
+    materialize = (time.perf_counter() - start) / QUERIES
+    print(f"match + items      {materialize * 1000:8.3f} ms/query")
+
+    category, exclude, require = queries[9]
+    assert index.items_for(index.match(category, exclude, require)) == expected
+
+    start = time.perf_counter()
+    for i in range(1000):
+        index.upsert({**items[i], "allergens": ["dairy"]})
+    print(f"incremental upsert {(time.perf_counter() - start):8.3f} ms/item")
+    print(f"speedup (match + items vs linear) {linear / materialize:.0f}x")
@@ -0,0 +1,190 @@
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+from starlette.responses import JSONResponse
+
+from concurrency import ConcurrencyLimiter, LoadShedError
+from settings import load_json_overrides
+
+logger = logging.getLogger(__name__)
+
+BULKHEAD_INTERACTIVE = "interactive"
+BULKHEAD_LLM = "llm"
+BULKHEAD_BATCH = "batch"
+
+# Name of the bulkhead the current request (or job) runs in
+current_bulkhead_var: ContextVar[Optional[str]] = ContextVar("current_bulkhead", default=None)
+
+
+class Bulkhead(ConcurrencyLimiter):
+    """
+    Resources reserved for one class of endpoints.
+
+    A fixed budget of concurrent requests with a short bounded queue (requests beyond it
+    are shed, see ConcurrencyLimiter), plus the size of its own Mongo connection pool, outbound HTTP connection
+    pool and thread pool for CPU-heavy work. One class saturating its share leaves the
+    others' untouched.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int = 64,
+        max_queue: int = 64,
+        max_wait: float = 2.0,
+        mongo_pool: int = 10,
+        http_connections: int = 0,
+        cpu_workers: int = 2,
+    ):
+        super().__init__(max_concurrent, max_queue=max_queue, max_wait=max_wait)
+        self.name = name
+        self.mongo_pool = mongo_pool
+        self.http_connections = http_connections
+        self.cpu_workers = cpu_workers
+        self.completed = 0
+        self.cpu_tasks = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._http: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def from_dict(cls, name: str, data: Dict[str, Any]) -> "Bulkhead":
+        return cls(
+            name,
+            max_concurrent=int(data.get("max_concurrent", 64)),
+            max_queue=int(data.get("max_queue", 64)),
+            max_wait=float(data.get("max_wait", 2.0)),
+            mongo_pool=int(data.get("mongo_pool", 10)),
+            http_connections=int(data.get("http_connections", 0)),
+            cpu_workers=int(data.get("cpu_workers", 2)),
+        )
+
+    async def run_cpu(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run CPU-heavy work (parsing, rendering) on this class's threads, off the event loop."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.cpu_workers, thread_name_prefix=f"bulkhead-{self.name}")
+        self.cpu_tasks += 1
+        # Copy the context so log lines from the thread keep the request id
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    def http_client(self) -> httpx.AsyncClient:
+        """Shared outbound client whose connection pool is capped at http_connections."""
+        if self._http is None:
+            limits = httpx.Limits(max_connections=self.http_connections or None, max_keepalive_connections=self.http_connections or None)
+            self._http = httpx.AsyncClient(limits=limits)
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inflight": self.inflight,
+            "queue_depth": len(self._waiters),
+            "max_concurrent": self.limit,
+            "completed": self.completed,
+            "shed_count": self.shed_count,
+            "mongo_pool": self.mongo_pool,
+            "http_connections": self.http_connections,
+            "cpu_workers": self.cpu_workers,
+            "cpu_tasks": self.cpu_tasks
+        }
+
+
+def load_bulkheads(raw: str, defaults: Dict[str, Bulkhead]) -> Dict[str, Bulkhead]:
+    """
+    Parse the BULKHEADS setting on top of the defaults.
+
+    BULKHEADS is a JSON object of bulkhead name to its limits, e.g.
+    {"llm": {"max_concurrent": 32, "mongo_pool": 5, "http_connections": 64, "cpu_workers": 2}}.
+    """
+    return load_json_overrides("BULKHEADS", raw, defaults, Bulkhead.from_dict)
+
+
+class Bulkheads:
+    """The bulkheads of the app and which request paths run in which one."""
+
+    def __init__(self, bulkheads: Dict[str, Bulkhead], routes: Dict[str, str], default: str = BULKHEAD_INTERACTIVE):
+        if default not in bulkheads:
+            raise ValueError(f"Unknown default bulkhead: {default}")
+        self.bulkheads = bulkheads
+        self.routes = routes
+        self.default = default
+
+    def __getitem__(self, name: str) -> Bulkhead:
+        return self.bulkheads[name]
+
+    def for_path(self, path: str) -> Bulkhead:
+        return self.bulkheads.get(self.routes.get(path), self.bulkheads[self.default])
+
+    def current(self) -> Bulkhead:
+        return self.bulkheads.get(current_bulkhead_var.get(), self.bulkheads[self.default])
+
+    @asynccontextmanager
+    async def use(self, name: str):
+        """
+        Run work outside a request (e.g. queued jobs) in the given bulkhead, holding one of its slots.
+
+        It waits for the slot rather than being shed: there is no client to answer 503 to.
+        """
+        bulkhead = self.bulkheads[name]
+        await bulkhead.acquire(shed=False)
+        token = current_bulkhead_var.set(name)
+        try:
+            yield bulkhead
+        finally:
+            current_bulkhead_var.reset(token)
+            bulkhead.completed += 1
+            bulkhead.release()
+
+    async def close(self):
+        for bulkhead in self.bulkheads.values():
+            await bulkhead.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: bulkhead.stats() for name, bulkhead in self.bulkheads.items()}
+
+
+class BulkheadMiddleware:
+    """ASGI middleware that runs each request inside its path's bulkhead, shedding with 503 when full."""
+
+    def __init__(self, app, bulkheads: Bulkheads):
+        self.app = app
+        self.bulkheads = bulkheads
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        bulkhead = self.bulkheads.for_path(scope.get("path"))
+        try:
+            await bulkhead.acquire()
+        except LoadShedError as e:
+            response = JSONResponse(
+                {"detail": "Service is busy, please retry shortly"},
+                status_code=503,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        token = current_bulkhead_var.set(bulkhead.name)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_bulkhead_var.reset(token)
+            bulkhead.completed += 1
+            bulkhead.release()
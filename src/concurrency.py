@@ -0,0 +1,207 @@
+import asyncio
+import statistics
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+
+class LoadShedError(Exception):
+    """Raised when the limiter rejects a request instead of queueing it."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Too many concurrent requests")
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    Fixed concurrency limit with a short bounded wait queue.
+
+    A slot is taken at once while one is free and nobody is queued, otherwise the caller
+    waits its turn for at most max_wait. Callers beyond max_queue waiters, or whose wait
+    runs out, are shed with LoadShedError. Released slots go straight to the oldest waiter.
+    """
+
+    def __init__(self, limit: int, max_queue: int = 16, max_wait: float = 2.0):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.inflight = 0
+        self.shed_count = 0
+        self._waiters = deque()
+
+    async def acquire(self, shed: bool = True):
+        """
+        Take a slot, waiting in the queue if needed.
+
+        With shed=False the caller waits however long it takes instead of being shed, for
+        work with no client to answer 503 to (queued jobs, bounded by their own workers).
+        """
+        if self.inflight < int(self.limit) and not self._waiters:
+            self.inflight += 1
+            return
+        if shed and len(self._waiters) >= self.max_queue:
+            self._shed()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=self.max_wait if shed else None)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot just as the wait ended (or the caller was cancelled), give it back
+                self._free()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._shed()
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        # The slot was handed over by _wake()
+
+    def release(self):
+        self._free()
+
+    def _free(self):
+        self.inflight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.inflight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.inflight += 1
+                waiter.set_result(None)
+
+    def _shed(self):
+        self.shed_count += 1
+        raise LoadShedError(retry_after=self.retry_after())
+
+    def retry_after(self) -> int:
+        """Rough number of seconds until a slot frees up."""
+        return max(1, int(self.max_wait))
+
+
+class AdaptiveLimiter(ConcurrencyLimiter):
+    """
+    AIMD concurrency limiter driven by observed latency.
+
+    Single calls are too noisy to judge load by, so latency is looked at per window of
+    `window` calls: the window's median is compared with the baseline, the lowest window
+    median over the last `baseline_windows` windows. The limit grows by 1/limit per call of
+    a window within tolerance of the baseline and is cut multiplicatively after a slower
+    window or any failure. Once per `baseline_windows` windows one window runs at half the
+    limit, so the baseline keeps being measured below load: otherwise, with the limit held
+    just above capacity, the loaded latency would age into the baseline and ratchet it up.
+    Requests above the limit wait in a short bounded queue and are shed when it is full or
+    the wait is too long.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        max_queue: int = 16,
+        max_wait: float = 2.0,
+        latency_tolerance: float = 2.0,
+        backoff: float = 0.8,
+        window: int = 20,
+        baseline_windows: int = 50,
+    ):
+        super().__init__(float(initial_limit), max_queue=max_queue, max_wait=max_wait)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.window = window
+        self.recent_latency: Optional[float] = None
+        self.baseline_latency: Optional[float] = None
+        self.last_latency: Optional[float] = None
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.downgraded = 0
+        self._samples = []
+        self._medians = deque(maxlen=baseline_windows)
+        self._windows = 0
+        self._probe_restore: Optional[float] = None
+
+    def release(self, latency: float, success: bool = True):
+        self._adjust(latency, success)
+        self._free()
+
+    def _release_cancelled(self):
+        """Give back the slot of a cancelled call without feeding it to the limit."""
+        self.cancelled += 1
+        self._free()
+
+    @asynccontextmanager
+    async def slot(self, shed: bool = True):
+        """Hold a slot for the duration of the block and feed its latency back."""
+        await self.acquire(shed)
+        start = time.monotonic()
+        try:
+            yield
+        except asyncio.CancelledError:
+            # The caller went away (disconnect, deadline, resubmit), not a sign of overload
+            self._release_cancelled()
+            raise
+        except BaseException:
+            self.release(time.monotonic() - start, success=False)
+            raise
+        self.release(time.monotonic() - start, success=True)
+
+    def _adjust(self, latency: float, success: bool):
+        self.last_latency = latency
+        if not success:
+            self.failed += 1
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            return
+
+        self.completed += 1
+        self._samples.append(latency)
+        if len(self._samples) < self.window:
+            return
+        self.recent_latency = statistics.median(self._samples)
+        self._samples = []
+        self._medians.append(self.recent_latency)
+        self.baseline_latency = min(self._medians)
+        self._windows += 1
+
+        if self._probe_restore is not None:
+            # End of a probe window: back to the limit from before it
+            self.limit, self._probe_restore = self._probe_restore, None
+        elif self.recent_latency > self.baseline_latency * self.latency_tolerance:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        else:
+            self.limit = min(self.max_limit, self.limit + self.window / self.limit)
+
+        if self._windows % self._medians.maxlen == 0:
+            self._probe_restore = self.limit
+            self.limit = max(self.min_limit, self.limit / 2)
+
+    def mark_downgraded(self):
+        """Count a shed request that was answered by a cheaper fallback instead."""
+        self.downgraded += 1
+
+    def retry_after(self) -> int:
+        """Rough number of seconds until a slot frees up."""
+        latency = self.recent_latency or self.last_latency or 1.0
+        return max(1, int(latency))
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "queue_depth": len(self._waiters),
+            "shed_count": self.shed_count,
+            "downgraded": self.downgraded,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "recent_latency_seconds": self.recent_latency,
+            "baseline_latency_seconds": self.baseline_latency,
+            "last_latency_seconds": self.last_latency
+        }
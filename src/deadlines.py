@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, Optional
+
+import pymongo
+
+from settings import load_json_overrides
+
+logger = logging.getLogger(__name__)
+
+# Absolute time.monotonic() deadline of the current request, None when it has none
+request_deadline_var: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+# Clients may ask for a tighter budget with "X-Request-Timeout: <seconds>"
+TIMEOUT_HEADER = b"x-request-timeout"
+
+ABANDON_DISCONNECT = "client_disconnect"
+ABANDON_DEADLINE = "deadline"
+ABANDON_SUPERSEDED = "superseded"
+
+
+class DeadlineExceeded(Exception):
+    """Raised when there is no time left in the request's budget for another call."""
+
+
+class WorkAbandoned(Exception):
+    """Raised to the caller when its work was cancelled before finishing."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Request work abandoned: {reason}")
+        self.reason = reason
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline, None without a deadline."""
+    deadline = request_deadline_var.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def timeout_for(default: Optional[float]) -> Optional[float]:
+    """The timeout for one outbound call: its own default, cut down to the time left."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return left if default is None else min(default, left)
+
+
+@contextmanager
+def mongo_deadline():
+    """Apply the time left to every Mongo operation in the block (sent as maxTimeMS)."""
+    left = remaining()
+    if left is None:
+        yield
+        return
+    # pymongo treats 0 as "no timeout", so an expired budget gets the smallest real one
+    with pymongo.timeout(max(left, 0.001)):
+        yield
+
+
+async def run_to_completion(awaitable: Awaitable) -> Any:
+    """
+    Finish a write sequence even if the request is cancelled or out of time meanwhile.
+
+    Cancelling between the writes of a plan upsert would leave versions and the production
+    summary out of step with the plan, so once persistence starts it runs to the end.
+    """
+    async def unbounded():
+        with pymongo.timeout(None):
+            return await awaitable
+    return await asyncio.shield(asyncio.ensure_future(unbounded()))
+
+
+def parse_timeout(value: Optional[str]) -> Optional[float]:
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+    return seconds if seconds > 0 else None
+
+
+def load_route_deadlines(raw: str, defaults: Dict[str, float]) -> Dict[str, float]:
+    """Parse the ROUTE_DEADLINES setting (JSON object of path to seconds) on top of the defaults."""
+    return load_json_overrides("ROUTE_DEADLINES", raw, defaults, lambda path, seconds: float(seconds))
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware that gives each request its deadline.
+
+    The budget is the route's configured deadline, or the X-Request-Timeout header when it
+    asks for less (or the route has none; capped at max_timeout). Mongo operations run
+    under it as maxTimeMS; outbound HTTP calls read it through timeout_for().
+    """
+
+    def __init__(self, app, routes: Dict[str, float], max_timeout: float = 60.0):
+        self.app = app
+        self.routes = routes
+        self.max_timeout = max_timeout
+
+    def budget(self, scope) -> Optional[float]:
+        budget = self.routes.get(scope.get("path"))
+        for name, value in scope.get("headers", []):
+            if name == TIMEOUT_HEADER:
+                requested = parse_timeout(value.decode("latin-1"))
+                if requested is not None:
+                    budget = min(requested, budget or self.max_timeout)
+                break
+        return budget
+
+    async def __call__(self, scope, receive, send):
+        budget = self.budget(scope) if scope["type"] == "http" else None
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        token = request_deadline_var.set(time.monotonic() + budget)
+        try:
+            with mongo_deadline():
+                await self.app(scope, receive, send)
+        finally:
+            request_deadline_var.reset(token)
+
+
+class WorkTracker:
+    """
+    Runs expensive request work so it stops as soon as nobody will read the result.
+
+    The work is cancelled when the client disconnects, when the request deadline passes,
+    or when the same key (e.g. a user double-submitting) starts newer work. Counts the
+    abandoned work and estimates the time reclaimed: how much longer the work would
+    typically have run, from a moving average of completed runs.
+    """
+
+    def __init__(self, smoothing: float = 0.2):
+        self.smoothing = smoothing
+        self.expected: Dict[str, float] = {}
+        self.completed: Dict[str, int] = {}
+        self.abandoned: Dict[str, int] = {ABANDON_DISCONNECT: 0, ABANDON_DEADLINE: 0, ABANDON_SUPERSEDED: 0}
+        self.abandoned_after_seconds = 0.0
+        self.reclaimed_seconds = 0.0
+        self._inflight: Dict[Any, asyncio.Task] = {}
+
+    async def _disconnected(self, receive):
+        # Call once the body has been read: the next message is the disconnect
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+
+    async def run(self, name: str, awaitable: Awaitable, receive=None, key: Any = None) -> Any:
+        """
+        Await the work, cancelling it early; receive is the ASGI receive of the request.
+
+        Raises WorkAbandoned with the reason when the work was cancelled.
+        """
+        work = asyncio.ensure_future(awaitable)
+        if key is not None:
+            previous = self._inflight.get(key)
+            if previous is not None and not previous.done():
+                previous.cancel()
+            self._inflight[key] = work
+
+        watcher = asyncio.ensure_future(self._disconnected(receive)) if receive is not None else None
+        start = time.monotonic()
+        # Stays set if this coroutine itself is cancelled, e.g. the server shutting down
+        reason = ABANDON_DISCONNECT
+        try:
+            waiting = {work} if watcher is None else {work, watcher}
+            await asyncio.wait(waiting, timeout=remaining(), return_when=asyncio.FIRST_COMPLETED)
+            if work.done():
+                reason = None
+            elif watcher is not None and watcher.done():
+                reason = ABANDON_DISCONNECT
+            else:
+                reason = ABANDON_DEADLINE
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            if key is not None and self._inflight.get(key) is work:
+                del self._inflight[key]
+            if reason is not None:
+                work.cancel()
+                self._abandon(name, reason, time.monotonic() - start)
+
+        if reason is not None:
+            raise WorkAbandoned(reason)
+        if work.cancelled():
+            # Only newer work for the same key cancels it
+            self._abandon(name, ABANDON_SUPERSEDED, time.monotonic() - start)
+            raise WorkAbandoned(ABANDON_SUPERSEDED)
+        if work.exception() is None:
+            self._complete(name, time.monotonic() - start)
+        return work.result()
+
+    def _complete(self, name: str, elapsed: float):
+        self.completed[name] = self.completed.get(name, 0) + 1
+        expected = self.expected.get(name)
+        self.expected[name] = elapsed if expected is None else expected + self.smoothing * (elapsed - expected)
+
+    def _abandon(self, name: str, reason: str, elapsed: float):
+        self.abandoned[reason] = self.abandoned.get(reason, 0) + 1
+        self.abandoned_after_seconds += elapsed
+        self.reclaimed_seconds += max(0.0, self.expected.get(name, 0.0) - elapsed)
+        logger.info("Abandoned %s work after %.2fs: %s", name, elapsed, reason)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "completed": dict(self.completed),
+            "abandoned": dict(self.abandoned),
+            "abandoned_after_seconds": round(self.abandoned_after_seconds, 3),
+            "reclaimed_seconds": round(self.reclaimed_seconds, 3),
+            "expected_seconds": {name: round(value, 3) for name, value in self.expected.items()}
+        }
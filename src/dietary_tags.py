@@ -0,0 +1,236 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Free-text spellings mapped to one canonical tag
+TAG_SYNONYMS = {
+    "peanuts": "peanut",
+    "groundnut": "peanut",
+    "tree_nuts": "tree_nut",
+    "almond": "tree_nut",
+    "almonds": "tree_nut",
+    "cashew": "tree_nut",
+    "walnut": "tree_nut",
+    "milk": "dairy",
+    "lactose": "dairy",
+    "cheese": "dairy",
+    "eggs": "egg",
+    "wheat": "gluten",
+    "shrimp": "shellfish",
+    "prawn": "shellfish",
+    "crab": "shellfish",
+    "lobster": "shellfish",
+    "shellfishes": "shellfish",
+    "soya": "soy",
+    "soybean": "soy",
+    "sesame_seed": "sesame",
+    "veggie": "vegetarian",
+    "plant_based": "vegan",
+    "lowcarb": "low_carb",
+    "low_carbohydrate": "low_carb",
+    "ketogenic": "keto",
+    "no_gluten": "gluten_free",
+    "no_dairy": "dairy_free",
+    "lactose_free": "dairy_free",
+    "low_sodium": "low_salt",
+}
+
+# Umbrella terms that stand for several canonical tags; excluding one excludes them all
+TAG_GROUPS = {
+    "seafood": ("fish", "shellfish"),
+    "nuts": ("tree_nut", "peanut"),
+    "nut": ("tree_nut", "peanut"),
+}
+
+MEAT_TAGS = ("meat", "beef", "pork", "chicken", "fish", "shellfish", "mollusc")
+
+# Diet restrictions stand for the allergens they rule out and the diet tag an item must carry
+DIET_RESTRICTIONS = {
+    "gluten_free": (("gluten",), ()),
+    "dairy_free": (("dairy",), ()),
+    "vegetarian": (MEAT_TAGS, ("vegetarian",)),
+    "vegan": (MEAT_TAGS + ("dairy", "egg"), ("vegan",)),
+}
+
+# Diets that include another one: a vegan item is also vegetarian
+IMPLIED_DIETS = {
+    "vegan": ("vegetarian",),
+}
+
+
+def normalize_tag(value: Any) -> Tuple[str, ...]:
+    """Canonical tags one allergen or diet tag stands for ("Tree Nuts" -> ("tree_nut",), "seafood" -> ("fish", "shellfish"))."""
+    return _normalize_tag(str(value))
+
+
+@lru_cache(maxsize=4096)
+def _normalize_tag(value: str) -> Tuple[str, ...]:
+    tag = re.sub(r"[\s\-]+", "_", value.strip().lower())
+    tag = re.sub(r"[^a-z0-9_]", "", tag)
+    if not tag:
+        return ()
+    if tag in TAG_GROUPS:
+        return TAG_GROUPS[tag]
+    return (TAG_SYNONYMS.get(tag, tag),)
+
+
+def normalize_tags(values) -> Set[str]:
+    """Normalize a list (or comma separated string) of tags, expanding umbrella terms."""
+    if not values:
+        return set()
+    if isinstance(values, str):
+        values = values.split(",")
+    return {tag for value in values for tag in normalize_tag(value)}
+
+
+def restriction_tags(values) -> Tuple[Set[str], Set[str]]:
+    """
+    Split restrictions into tags to exclude and diet tags to require.
+
+    "gluten_free" excludes gluten and "vegetarian" requires the vegetarian tag (and excludes
+    meat and fish). Anything else, such as an allergen, is excluded as it is.
+    """
+    exclude, require = set(), set()
+    for tag in normalize_tags(values):
+        if tag in DIET_RESTRICTIONS:
+            excluded, required = DIET_RESTRICTIONS[tag]
+            exclude.update(excluded)
+            require.update(required)
+        else:
+            exclude.add(tag)
+    return exclude, require
+
+
+def item_exclusion_tags(item: Dict[str, Any]) -> Set[str]:
+    """Allergens and restrictions a menu item conflicts with."""
+    return normalize_tags(item.get("allergens")) | normalize_tags(item.get("restrictions"))
+
+
+def item_diet_tags(item: Dict[str, Any]) -> Set[str]:
+    """Diets a menu item is suitable for."""
+    diets = normalize_tags(item.get("diet_tags")) | normalize_tags(item.get("tags"))
+    return diets.union(*(IMPLIED_DIETS.get(diet, ()) for diet in diets))
+
+
+def _bitset(slots: List[int], size: int) -> int:
+    flags = np.zeros(size, dtype=bool)
+    flags[slots] = True
+    return int.from_bytes(np.packbits(flags, bitorder="little").tobytes(), "little")
+
+
+class TagIndex:
+    """
+    In-memory inverted index over the menu catalog.
+
+    Every tag and category maps to a bitset (a Python int) of item slots, so excluding
+    allergens or requiring diets across the whole catalog is a handful of bitwise ops.
+    Items can be added, replaced and removed one at a time.
+    """
+
+    def __init__(self):
+        self.items: List[Optional[Dict[str, Any]]] = []
+        self.slots: Dict[str, int] = {}
+        self.free_slots: List[int] = []
+        self.alive = 0
+        self.exclusions: Dict[str, int] = {}
+        self.diets: Dict[str, int] = {}
+        self.categories: Dict[str, int] = {}
+        self.version = None
+
+    def __len__(self):
+        return len(self.slots)
+
+    @staticmethod
+    def _item_id(item: Dict[str, Any]) -> str:
+        return str(item.get("_id", item.get("id")))
+
+    def rebuild(self, items: Iterable[Dict[str, Any]], version=None):
+        """Replace the whole index, building each bitset once instead of bit by bit."""
+        self.__init__()
+        exclusions, diets, categories = {}, {}, {}
+        for slot, item in enumerate(items):
+            self.items.append(item)
+            self.slots[self._item_id(item)] = slot
+            for tag in item_exclusion_tags(item):
+                exclusions.setdefault(tag, []).append(slot)
+            for tag in item_diet_tags(item):
+                diets.setdefault(tag, []).append(slot)
+            categories.setdefault(str(item.get("category", "")).lower(), []).append(slot)
+
+        size = len(self.items)
+        self.alive = (1 << size) - 1
+        self.exclusions = {tag: _bitset(slots, size) for tag, slots in exclusions.items()}
+        self.diets = {tag: _bitset(slots, size) for tag, slots in diets.items()}
+        self.categories = {tag: _bitset(slots, size) for tag, slots in categories.items()}
+        self.version = version
+
+    def upsert(self, item: Dict[str, Any]):
+        item_id = self._item_id(item)
+        if item_id in self.slots:
+            self.remove(item_id)
+        slot = self.free_slots.pop() if self.free_slots else len(self.items)
+        if slot == len(self.items):
+            self.items.append(item)
+        else:
+            self.items[slot] = item
+        self.slots[item_id] = slot
+
+        bit = 1 << slot
+        self.alive |= bit
+        for tag in item_exclusion_tags(item):
+            self.exclusions[tag] = self.exclusions.get(tag, 0) | bit
+        for tag in item_diet_tags(item):
+            self.diets[tag] = self.diets.get(tag, 0) | bit
+        category = str(item.get("category", "")).lower()
+        self.categories[category] = self.categories.get(category, 0) | bit
+
+    def remove(self, item_id: str):
+        slot = self.slots.pop(str(item_id), None)
+        if slot is None:
+            return
+        mask = ~(1 << slot)
+        self.alive &= mask
+        for bitsets in (self.exclusions, self.diets, self.categories):
+            for tag in list(bitsets):
+                bitsets[tag] &= mask
+                if not bitsets[tag]:
+                    del bitsets[tag]
+        self.items[slot] = None
+        self.free_slots.append(slot)
+
+    def match(
+        self,
+        category: Optional[str] = None,
+        exclude: Iterable[str] = (),
+        require: Iterable[str] = (),
+    ) -> int:
+        """Bitset of items in a category, free of every excluded tag and carrying every required one."""
+        bits = self.alive
+        if category is not None:
+            bits &= self.categories.get(category.lower(), 0)
+        for tag in exclude:
+            bits &= ~self.exclusions.get(tag, 0)
+        for tag in require:
+            bits &= self.diets.get(tag, 0)
+        return bits
+
+    def slots_for(self, bits: int) -> np.ndarray:
+        """Slot numbers of the set bits, in ascending order."""
+        if not bits:
+            return np.empty(0, dtype=np.int64)
+        raw = np.frombuffer(bits.to_bytes((bits.bit_length() + 7) // 8, "little"), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(raw, bitorder="little"))
+
+    def items_for(self, bits: int) -> List[Dict[str, Any]]:
+        items = self.items
+        return [items[slot] for slot in self.slots_for(bits)]
+
+    def select(
+        self,
+        category: Optional[str] = None,
+        exclude: Iterable[str] = (),
+        require: Iterable[str] = (),
+    ) -> List[Dict[str, Any]]:
+        return self.items_for(self.match(category, normalize_tags(list(exclude)), normalize_tags(list(require))))
@@ -0,0 +1,92 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from pymongo import ReturnDocument
+
+# Collection holding one version counter per cacheable resource
+VERSIONS_COLLECTION = "resource_versions"
+
+CATALOG_CACHE_CONTROL = "public, max-age=60, stale-while-revalidate=300"
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def menu_items_key() -> str:
+    return "menu_items"
+
+
+def diet_plans_key(user_id: str) -> str:
+    return f"diet_plans:{user_id}"
+
+
+async def get_version(db, key: str, session=None) -> Tuple[int, Optional[datetime]]:
+    """Current version and last change time of a resource, (0, None) if never written."""
+    document = await db[VERSIONS_COLLECTION].find_one({"_id": key}, session=session)
+    if not document:
+        return 0, None
+    return document.get("version", 0), document.get("updated_at")
+
+
+async def bump_version(db, key: str) -> int:
+    """Mark a resource as changed. Call after every write that affects its responses."""
+    document = await db[VERSIONS_COLLECTION].find_one_and_update(
+        {"_id": key},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return document["version"]
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag from the parts that identify one representation of a resource."""
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def _to_http_date(value: datetime) -> str:
+    return format_datetime(value.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime], cache_control: str) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified:
+        headers["Last-Modified"] = _to_http_date(last_modified)
+    return headers
+
+
+def _opaque_tag(etag: str) -> str:
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def not_modified(request: Request, etag: str, last_modified: Optional[datetime], cache_control: str) -> Optional[Response]:
+    """
+    Return a 304 response when the client copy is still current, otherwise None.
+
+    If-None-Match takes precedence over If-Modified-Since and uses the weak comparison, as in
+    RFC 9110: a W/ prefix is ignored on both sides (proxies that compress add it).
+    """
+    headers = cache_headers(etag, last_modified, cache_control)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [_opaque_tag(tag) for tag in if_none_match.split(",")]
+        if "*" in candidates or _opaque_tag(etag) in candidates:
+            return Response(status_code=304, headers=headers)
+        return None
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return None
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        if last_modified.astimezone(timezone.utc).replace(microsecond=0) <= since:
+            return Response(status_code=304, headers=headers)
+
+    return None
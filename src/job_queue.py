@@ -0,0 +1,243 @@
+import asyncio
+import ipaddress
+import logging
+import socket
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class PermanentJobError(Exception):
+    """Raised by a job handler for a failure that retrying cannot fix; the job fails at once."""
+
+
+async def check_callback_url(url: str, allowed_hosts: Iterable[str] = ()):
+    """
+    Raise ValueError unless url is an http(s) URL the server may POST job results to.
+
+    With an allow-list only those hosts are accepted. Without one, every address the host
+    resolves to must be public, so results (user health data) are never sent to loopback,
+    private, link-local (cloud metadata) or other internal addresses.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("callback_url must be an http(s) URL")
+    host = parts.hostname.lower()
+    allowed_hosts = {h.lower() for h in allowed_hosts}
+    if allowed_hosts:
+        if host not in allowed_hosts:
+            raise ValueError("callback_url host is not allowed")
+        return
+
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        addresses = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, ValueError):
+        raise ValueError("callback_url host does not resolve")
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if getattr(address, "ipv4_mapped", None):
+            address = address.ipv4_mapped
+        if not address.is_global:
+            raise ValueError("callback_url must not point to a private or internal address")
+
+
+class JobQueue:
+    """
+    Durable job queue stored in a MongoDB collection.
+
+    Jobs are claimed with an atomic find_one_and_update and hold a lease while they run,
+    so a job left `running` by a crashed worker is picked up again once its lease expires
+    (or marked failed when that was its last attempt).
+    Any process running workers against the same collection can take any job.
+    Finished jobs (done or failed) are deleted by a TTL index retention_seconds after they end.
+    """
+
+    def __init__(
+        self,
+        get_collection: Callable[[], Any],
+        handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        workers: int = 4,
+        lease_seconds: int = 120,
+        poll_interval: float = 1.0,
+        max_attempts: int = 3,
+        callback_hosts: Iterable[str] = (),
+        retention_seconds: int = 7 * 24 * 3600,
+    ):
+        self.get_collection = get_collection
+        self.handler = handler
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.callback_hosts = list(callback_hosts)
+        self.retention_seconds = retention_seconds
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks = []
+        self._http_client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        collection = self.get_collection()
+        # _claim: queued jobs (and running ones past their lease) oldest first
+        await collection.create_index([("status", 1), ("created_at", 1)])
+        # _fail_exhausted: running jobs past their lease
+        await collection.create_index([("status", 1), ("lease_until", 1)])
+        # Only finished jobs have finished_at, queued and running ones are never expired
+        await collection.create_index("finished_at", expireAfterSeconds=self.retention_seconds)
+        self._wakeup = asyncio.Event()
+        self._http_client = httpx.AsyncClient(timeout=10.0)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info("Started %s job workers", self.workers)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._http_client:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    async def submit(self, payload: Dict[str, Any], owner: Optional[str] = None, callback_url: Optional[str] = None) -> str:
+        """Store a new job and wake up an idle worker. Returns the job id."""
+        now = datetime.now()
+        result = await self.get_collection().insert_one({
+            "status": JOB_QUEUED,
+            "owner": owner,
+            "payload": payload,
+            "callback_url": callback_url,
+            "attempts": 0,
+            "result": None,
+            "error": None,
+            "lease_until": None,
+            "created_at": now,
+            "updated_at": now
+        })
+        if self._wakeup:
+            self._wakeup.set()
+        return str(result.inserted_id)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not ObjectId.is_valid(job_id):
+            return None
+        return await self.get_collection().find_one({"_id": ObjectId(job_id)}, {"payload": 0})
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.now()
+        return await self.get_collection().find_one_and_update(
+            {
+                "$or": [
+                    {"status": JOB_QUEUED},
+                    {"status": JOB_RUNNING, "lease_until": {"$lt": now}}
+                ],
+                "attempts": {"$lt": self.max_attempts}
+            },
+            {
+                "$set": {
+                    "status": JOB_RUNNING,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _fail_exhausted(self):
+        """Fail jobs whose lease expired on their last attempt; _claim never picks them up again."""
+        while True:
+            now = datetime.now()
+            update = {"status": JOB_FAILED, "error": "worker lost on the final attempt", "lease_until": None,
+                      "updated_at": now, "finished_at": now}
+            job = await self.get_collection().find_one_and_update(
+                {"status": JOB_RUNNING, "lease_until": {"$lt": now}, "attempts": {"$gte": self.max_attempts}},
+                {"$set": update}
+            )
+            if job is None:
+                return
+            logger.error("Job %s failed: lease expired on attempt %s", job['_id'], job['attempts'])
+            if job.get("callback_url"):
+                await self._notify(job, update)
+
+    async def _worker(self, worker_id: int):
+        while True:
+            try:
+                job = await self._claim()
+                if job is None:
+                    await self._fail_exhausted()
+                else:
+                    await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # A transient Mongo error must not end the worker for good
+                logger.error("Job worker %s error: %s", worker_id, e)
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _run(self, job: Dict[str, Any]):
+        collection = self.get_collection()
+        try:
+            result = await self.handler(job["payload"])
+            update = {"status": JOB_DONE, "result": result, "error": None}
+        except asyncio.CancelledError:
+            # Leave the job running, its lease expiring makes it available again
+            raise
+        except PermanentJobError as e:
+            logger.error("Job %s failed permanently: %s", job['_id'], e)
+            update = {"status": JOB_FAILED, "error": str(e)}
+        except Exception as e:
+            logger.error("Job %s failed: %s", job['_id'], e)
+            retry = job["attempts"] < self.max_attempts
+            update = {"status": JOB_QUEUED if retry else JOB_FAILED, "error": str(e)}
+
+        now = datetime.now()
+        update.update({"lease_until": None, "updated_at": now})
+        if update["status"] in (JOB_DONE, JOB_FAILED):
+            update["finished_at"] = now
+        # Only while this claim still owns the job: past the lease another worker may have
+        # re-claimed it, or _fail_exhausted failed it
+        written = await collection.update_one(
+            {"_id": job["_id"], "status": JOB_RUNNING, "attempts": job["attempts"]},
+            {"$set": update}
+        )
+        if written.modified_count == 0:
+            logger.warning("Job %s was taken over after its lease expired, dropping this result", job['_id'])
+            return
+
+        if update["status"] in (JOB_DONE, JOB_FAILED) and job.get("callback_url"):
+            await self._notify(job, update)
+
+    async def _notify(self, job: Dict[str, Any], update: Dict[str, Any]):
+        """POST the final job state to the callback URL. Failures are logged, never retried."""
+        body = {
+            "job_id": str(job["_id"]),
+            "status": update["status"],
+            "result": update.get("result"),
+            "error": update.get("error")
+        }
+        try:
+            # Checked again at send time: the host may resolve elsewhere than at submit time
+            await check_callback_url(job["callback_url"], self.callback_hosts)
+            response = await self._http_client.post(job["callback_url"], json=body)
+            response.raise_for_status()
+        except Exception as e:
+            logger.error("Callback for job %s failed: %s", job['_id'], e)
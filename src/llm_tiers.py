@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from settings import load_json_setting
+
+logger = logging.getLogger(__name__)
+
+
+class ModelTier:
+    """One model configuration the recommendation prompt can be sent to."""
+
+    def __init__(
+        self,
+        name: str,
+        model: str,
+        max_tokens: int = 2048,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+    ):
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.system_prompt = system_prompt
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ModelTier":
+        return cls(
+            name=data["name"],
+            model=data["model"],
+            max_tokens=int(data.get("max_tokens", 2048)),
+            temperature=float(data.get("temperature", 0.7)),
+            system_prompt=data.get("system_prompt"),
+        )
+
+
+def load_tiers(raw: str, defaults: List[ModelTier]) -> List[ModelTier]:
+    """Parse the LLM_TIERS setting (a JSON list of tier objects), falling back to defaults."""
+    return load_json_setting("LLM_TIERS", raw, lambda items: [ModelTier.from_dict(item) for item in items], defaults)
+
+
+class HedgedCaller:
+    """
+    Send a request to the primary tier and hedge it to the next tier when it is slow.
+
+    The hedge fires once the primary has been running longer than the given percentile of
+    its recent latencies. Whichever call first returns a usable response wins and the other
+    one is cancelled. If a call fails, the remaining one is awaited instead. A primary that
+    loses to the hedge is recorded at the time it had run (a lower bound): leaving the slow
+    calls out would keep sliding the hedge delay below its percentile.
+    """
+
+    def __init__(
+        self,
+        tiers: List[ModelTier],
+        send: Callable[[str, ModelTier], Awaitable[Dict[str, Any]]],
+        hedge_percentile: float = 0.9,
+        initial_hedge_delay: float = 4.0,
+        min_samples: int = 20,
+        window: int = 200,
+    ):
+        if not tiers:
+            raise ValueError("At least one model tier is required")
+        self.tiers = tiers
+        self.send = send
+        self.hedge_percentile = hedge_percentile
+        self.initial_hedge_delay = initial_hedge_delay
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self.served = {tier.name: 0 for tier in tiers}
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.failures = 0
+
+    def hedge_delay(self) -> float:
+        if len(self._latencies) < self.min_samples:
+            return self.initial_hedge_delay
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile))
+        return ordered[index]
+
+    async def _timed(self, prompt: str, tier: ModelTier) -> Dict[str, Any]:
+        start = time.monotonic()
+        response = await self.send(prompt, tier)
+        if not response.get("choices") or not response["choices"][0]["message"].get("content"):
+            raise ValueError(f"Empty response from tier {tier.name}")
+        if tier is self.tiers[0]:
+            self._latencies.append(time.monotonic() - start)
+        return response
+
+    async def call(self, prompt: str) -> Tuple[Dict[str, Any], str]:
+        """Return the first usable response and the name of the tier that produced it."""
+        primary = self.tiers[0]
+        start = time.monotonic()
+        tasks = {asyncio.create_task(self._timed(prompt, primary)): primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            primary_failed = bool(done) and next(iter(done)).exception() is not None
+            if (not done or primary_failed) and len(self.tiers) > 1:
+                hedge = self.tiers[1]
+                self.hedges_fired += 1
+                tasks[asyncio.create_task(self._timed(prompt, hedge))] = hedge
+
+            errors = []
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        tier = tasks[task]
+                        self.served[tier.name] += 1
+                        if tier is not primary:
+                            self.hedges_won += 1
+                            if any(tasks[other] is primary for other in pending):
+                                self._latencies.append(time.monotonic() - start)
+                        return task.result(), tier.name
+                    errors.append(task.exception())
+
+            self.failures += 1
+            raise errors[0]
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "served_by_tier": dict(self.served),
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "failures": self.failures,
+            "hedge_delay_seconds": round(self.hedge_delay(), 3)
+        }
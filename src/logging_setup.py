@@ -0,0 +1,217 @@
+"""
+Non-blocking structured logging.
+
+Log calls on the event loop only run cheap filters (request id, sampling) and put the
+record on a queue. A QueueListener thread formats the message lazily as one JSON line
+and writes it to stdout, so formatting and I/O never block request handling.
+"""
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+import uuid
+from typing import Dict, Mapping, Optional
+
+from settings import load_json_overrides
+
+request_id_var: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# Message arguments that cannot change between the log call and the listener formatting them
+_IMMUTABLE_ARGS = (str, bytes, int, float, bool, type(None), BaseException)
+
+# json.dumps(..., default=str) builds a new encoder on every call
+_json_encoder = json.JSONEncoder(default=str)
+
+# Tracebacks are rendered on the calling thread, with the stock formatting
+_exception_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with request id and any `extra=` fields."""
+
+    def __init__(self):
+        super().__init__()
+        # Most records share their second with the one before, so its timestamp text is reused
+        self._second = None
+        self._second_text = ""
+
+    def format(self, record: logging.LogRecord) -> str:
+        second = int(record.created)
+        if second != self._second:
+            self._second = second
+            self._second_text = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        entry = {
+            "ts": f"{self._second_text}.{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key in record.__dict__.keys() - _RESERVED_ATTRS:
+            if not key.startswith("_"):
+                entry[key] = record.__dict__[key]
+        exc_text = record.exc_text or (self.formatException(record.exc_info) if record.exc_info else None)
+        if exc_text:
+            entry["exc_info"] = exc_text
+        return _json_encoder.encode(entry)
+
+
+class RequestIdFilter(logging.Filter):
+    """Copy the current request id onto the record while still in the request's context."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of the records below WARNING for selected loggers.
+
+    Sampling is deterministic (every n-th record per logger), so it costs a counter
+    increment instead of a random draw. Warnings and errors are always kept.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.every = {name: max(1, round(1 / rate)) if rate > 0 else 0 for name, rate in rates.items()}
+        self.counters = {name: 0 for name in rates}
+        self.dropped = 0
+
+    def _rule(self, name: str) -> Optional[str]:
+        while name:
+            if name in self.every:
+                return name
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rule = self._rule(record.name)
+        if rule is None:
+            return True
+        every = self.every[rule]
+        self.counters[rule] += 1
+        if every and self.counters[rule] % every == 1 % every:
+            return True
+        self.dropped += 1
+        return False
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves message formatting to the listener thread where it is safe.
+
+    The stock prepare() formats every message on the calling thread. Here a record whose
+    arguments are all immutable (strings, numbers, exceptions) is queued as is and the
+    listener formats it later. Any other argument (a dict, a list, a model) could be
+    changed by the caller before then, so `msg % args` is rendered on the calling thread
+    first. Tracebacks are rendered into exc_text here as well and exc_info dropped, like
+    the stock handler does, so the queue never holds frames the caller may still change
+    (or that keep their locals alive). The record is not copied: root holds this handler
+    only. `extra=` values are still serialized by the listener, so pass snapshots there,
+    not live objects.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args or ()
+        # A mapping here is the caller's own dict (a lone dict argument or %(name)s values)
+        if isinstance(args, Mapping) or not all(isinstance(value, _IMMUTABLE_ARGS) for value in args):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level: str = "INFO", sample_rates: Optional[Dict[str, float]] = None) -> SamplingFilter:
+    """Route all logging through a queue to a JSON stdout writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    log_queue = queue.SimpleQueue()
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+
+    # The JSON lines carry no thread or process info; skip collecting it per record
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    handler = LazyQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    sampling = SamplingFilter(sample_rates or {})
+    handler.addFilter(sampling)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    # Uvicorn installs its own stdout handlers; send its records through the queue too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return sampling
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def parse_sample_rates(raw: str) -> Dict[str, float]:
+    """LOG_SAMPLE_RATES is a JSON object of logger name to kept fraction, e.g. {"httpx": 0.01}."""
+    return load_json_overrides("LOG_SAMPLE_RATES", raw, {}, lambda name, rate: float(rate))
+
+
+class RequestIdMiddleware:
+    """ASGI middleware that sets the request id for logs and echoes it as X-Request-ID."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
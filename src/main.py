@@ -1,5 +1,5 @@
 from fastapi import FastAPI, HTTPException, Depends, Request, Response, Security
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import List, Dict, Optional
 from groq import Groq
 from starlette.config import Config
@@ -10,7 +10,8 @@ from authlib.integrations.base_client.errors import MismatchingStateError
 from starlette.responses import RedirectResponse
 from functools import wraps
 import jwt
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import Counter
 import httpx
 from jwt.algorithms import RSAAlgorithm
 import json
@@ -24,13 +25,44 @@ from motor.motor_asyncio import AsyncIOMotorClient
 import logging
 import asyncio
 from pymongo.server_api import ServerApi
+from pymongo import ReturnDocument
 import certifi
 import ssl
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 import re
 from typing import Dict, Any
 import random
 import os
+import time
+from meal_planner import build_meal_plan
+from nutrition import GOAL_KEYS, ensure_indexes as ensure_nutrition_indexes, normalize_category, nutrient_value, range_query
+from dietary_tags import TagIndex, normalize_tags, restriction_tags
+from menu_search import SearchIndex
+from substitutions import SubstitutionIndex
+import rules_engine
+from read_routing import DEFAULT_READ_ROUTES, ROUTE_CATALOG, ROUTE_HISTORY, ROUTE_PROFILE, ReadRouter, load_routes
+from recipe_proxy import RecipeProxy, UpstreamError
+from job_queue import JobQueue, JOB_QUEUED, PermanentJobError, check_callback_url
+from serialization import FastJSONResponse, model_projection, prepare_documents
+from concurrency import AdaptiveLimiter, LoadShedError
+from bulkheads import (
+    BULKHEAD_BATCH, BULKHEAD_INTERACTIVE, BULKHEAD_LLM, Bulkhead, BulkheadMiddleware, Bulkheads, load_bulkheads
+)
+from deadlines import (
+    ABANDON_DEADLINE, ABANDON_DISCONNECT, ABANDON_SUPERSEDED, DeadlineExceeded, DeadlineMiddleware,
+    WorkAbandoned, WorkTracker, load_route_deadlines, run_to_completion, timeout_for
+)
+from llm_tiers import HedgedCaller, ModelTier, load_tiers
+from production_report import (
+    SUMMARY_COLLECTION, apply_plan_change, ensure_indexes as ensure_production_indexes,
+    iter_report_csv, rebuild_summary, report_query, report_row
+)
+from logging_setup import RequestIdMiddleware, parse_sample_rates, setup_logging, stop_logging
+from profile_import import detect_format, import_profiles, iter_lines, iter_rows
+from http_cache import (
+    CATALOG_CACHE_CONTROL, PRIVATE_CACHE_CONTROL, bump_version, cache_headers,
+    diet_plans_key, get_version, make_etag, menu_items_key, not_modified
+)
 
 # Initialize Groq
 groq_client = None
@@ -41,15 +73,16 @@ def get_groq_client():
         try:
             groq_client = Groq(api_key=GROQ_API_KEY)
         except Exception as e:
-            logger.error(f"Failed to initialize Groq client: {str(e)}")
+            logger.error("Failed to initialize Groq client: %s", e)
             raise HTTPException(
                 status_code=500,
                 detail="Failed to initialize AI service"
             )
     return groq_client
 
-async def call_groq_api(prompt: str) -> Dict[str, Any]:
+async def call_groq_api(prompt: str, tier: ModelTier = None) -> Dict[str, Any]:
     """Make an async call to the Groq API with improved formatting."""
+    tier = tier or LLM_TIERS[0]
     url = "https://api.groq.com/openai/v1/chat/completions"
     headers = {
         "Authorization": f"Bearer {GROQ_API_KEY}",
@@ -88,33 +121,39 @@ async def call_groq_api(prompt: str) -> Dict[str, Any]:
     Keep descriptions concise and focused on what the customer needs to know."""
     
     payload = {
-        "model": "mixtral-8x7b-32768",
+        "model": tier.model,
         "messages": [
             {
                 "role": "system",
-                "content": system_prompt
+                "content": tier.system_prompt or system_prompt
             },
             {
                 "role": "user",
                 "content": prompt
             }
         ],
-        "temperature": 0.7,
-        "max_tokens": 2048,
+        "temperature": tier.temperature,
+        "max_tokens": tier.max_tokens,
         "top_p": 1
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        return response.json()
+    # Pooled connections capped by the LLM bulkhead; never wait on Groq past the request's deadline
+    client = bulkheads[BULKHEAD_LLM].http_client()
+    response = await client.post(url, json=payload, headers=headers, timeout=timeout_for(LLM_TIMEOUT))
+    response.raise_for_status()
+    return response.json()
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Configuration
 config = Config('.env')
+
+# Set up logging: JSON lines written by a background thread. LOG_SAMPLE_RATES keeps
+# only a fraction of INFO/DEBUG records for chatty loggers, e.g. {"httpx": 0.01}
+LOG_LEVEL = config('LOG_LEVEL', cast=str, default='INFO')
+LOG_SAMPLE_RATES = config('LOG_SAMPLE_RATES', cast=str, default='{"httpx": 0.01}')
+log_sampling = setup_logging(LOG_LEVEL, parse_sample_rates(LOG_SAMPLE_RATES))
+
 MONGO_URL = config('MONGO_URL', cast=str)
 AUTH0_CLIENT_ID = config('AUTH0_CLIENT_ID', cast=str)
 AUTH0_CLIENT_SECRET = config('AUTH0_CLIENT_SECRET', cast=str)
@@ -123,10 +162,136 @@ AUTH0_CALLBACK_URL = config('AUTH0_CALLBACK_URL', cast=str)
 AUTH0_AUDIENCE = config('AUTH0_AUDIENCE', cast=str)
 SECRET_KEY = config('SECRET_KEY', cast=str)
 GROQ_API_KEY = config('GROQ_API_KEY', cast=str)
+RECOMMENDATION_WORKERS = config('RECOMMENDATION_WORKERS', cast=int, default=4)
+# Comma-separated hosts job callbacks may go to; empty allows any host with public addresses only
+CALLBACK_ALLOWED_HOSTS = [h.strip() for h in config('CALLBACK_ALLOWED_HOSTS', cast=str, default='').split(',') if h.strip()]
+LLM_MAX_CONCURRENCY = config('LLM_MAX_CONCURRENCY', cast=int, default=32)
+LLM_MAX_QUEUE = config('LLM_MAX_QUEUE', cast=int, default=16)
+# What to do with LLM requests over the limit: "degrade" (rules-based response) or "reject" (503)
+LLM_OVERLOAD_MODE = config('LLM_OVERLOAD_MODE', cast=str, default='degrade')
+# Default recommendation engine: "llm" (Groq) or "rules" (offline templates). Requests can
+# override it with "engine" in the body. With RULES_FALLBACK, failed LLM calls use the rules.
+RECOMMENDATION_ENGINE = config('RECOMMENDATION_ENGINE', cast=str, default='llm')
+RULES_FALLBACK = config('RULES_FALLBACK', cast=bool, default=True)
+
+LLM_TIMEOUT = config('LLM_TIMEOUT', cast=float, default=5.0)
+
+llm_limiter = AdaptiveLimiter(max_limit=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE)
+
+# Model tiers, primary first. The second tier is the hedge for slow primary calls.
+# Override with LLM_TIERS='[{"name": ..., "model": ..., "max_tokens": ..., "system_prompt": ...}, ...]'
+DEFAULT_LLM_TIERS = [
+    ModelTier("primary", "mixtral-8x7b-32768", max_tokens=2048),
+    ModelTier(
+        "fast",
+        "llama-3.1-8b-instant",
+        max_tokens=1024,
+        system_prompt=(
+            "You are a dietary catering consultant. Answer with three short sections: "
+            "1. Nutritional Goals (calories, protein, carbs, fat), "
+            "2. Menu Recommendations (one dish each for Breakfast, Lunch and Dinner with calories), "
+            "3. Health Advice as bullet points starting with '-'."
+        )
+    )
+]
+LLM_TIERS = load_tiers(config('LLM_TIERS', cast=str, default=''), DEFAULT_LLM_TIERS)
+LLM_HEDGE_PERCENTILE = config('LLM_HEDGE_PERCENTILE', cast=float, default=0.9)
+RECIPE_API_URL = config('RECIPE_API_URL', cast=str, default='https://smart-health-tst.up.railway.app/api/recipes')
+RECIPE_API_KEY = config('RECIPE_API_KEY', cast=str, default='')
+RECIPE_CACHE_TTL = config('RECIPE_CACHE_TTL', cast=float, default=600.0)
+
+recipe_proxy = RecipeProxy(RECIPE_API_URL, api_key=RECIPE_API_KEY, ttl=RECIPE_CACHE_TTL)
+
+# Read preference and read concern per endpoint class (catalog, history, profile).
+# Override with READ_ROUTING='{"catalog": {"mode": "secondaryPreferred", "max_staleness": 120, "read_concern": "local"}}'
+read_router = ReadRouter(load_routes(config('READ_ROUTING', cast=str, default=''), DEFAULT_READ_ROUTES))
+
+# Seconds a checked catalog version is trusted before the menu indexes ask Mongo again
+MENU_VERSION_CHECK_INTERVAL = config('MENU_VERSION_CHECK_INTERVAL', cast=float, default=1.0)
+
+llm_caller = HedgedCaller(LLM_TIERS, lambda prompt, tier: call_groq_api(prompt, tier), hedge_percentile=LLM_HEDGE_PERCENTILE)
+
+# Request deadlines in seconds by path. Clients can ask for less with X-Request-Timeout
+# (capped at MAX_REQUEST_TIMEOUT). Override with ROUTE_DEADLINES='{"/recommendations": 20}'
+DEFAULT_ROUTE_DEADLINES = {"/recommendations": 30.0, "/diet-plans/generate": 20.0}
+ROUTE_DEADLINES = load_route_deadlines(config('ROUTE_DEADLINES', cast=str, default=''), DEFAULT_ROUTE_DEADLINES)
+MAX_REQUEST_TIMEOUT = config('MAX_REQUEST_TIMEOUT', cast=float, default=60.0)
+
+# Recommendation work is cancelled when its client disconnects, times out or resubmits
+recommendation_work = WorkTracker()
+ABANDONED_RESPONSES = {
+    ABANDON_DISCONNECT: (499, "Client closed request"),
+    ABANDON_DEADLINE: (504, "Request deadline exceeded"),
+    ABANDON_SUPERSEDED: (409, "Superseded by a newer recommendation request")
+}
+
+# Bulkheads: separate request budgets, Mongo pools, outbound HTTP pools and CPU threads per
+# endpoint class, so a burst of LLM-bound requests cannot starve the cheap pages. Paths not
+# listed run in the interactive bulkhead. Override limits with
+# BULKHEADS='{"llm": {"max_concurrent": 32, "max_queue": 32, "mongo_pool": 5, "http_connections": 64, "cpu_workers": 2}}'
+DEFAULT_BULKHEADS = {
+    BULKHEAD_INTERACTIVE: Bulkhead(BULKHEAD_INTERACTIVE, max_concurrent=256, max_queue=256, mongo_pool=10, cpu_workers=4),
+    BULKHEAD_LLM: Bulkhead(
+        BULKHEAD_LLM,
+        max_concurrent=LLM_MAX_CONCURRENCY + LLM_MAX_QUEUE,
+        max_queue=LLM_MAX_QUEUE,
+        mongo_pool=5,
+        # Room for a hedge next to every primary call
+        http_connections=2 * LLM_MAX_CONCURRENCY,
+        cpu_workers=2
+    ),
+    BULKHEAD_BATCH: Bulkhead(BULKHEAD_BATCH, max_concurrent=4, max_queue=8, max_wait=5.0, mongo_pool=3, cpu_workers=1)
+}
+BULKHEAD_ROUTES = {
+    "/recommendations": BULKHEAD_LLM,
+    "/diet-plans/generate": BULKHEAD_BATCH,
+    "/users/import": BULKHEAD_BATCH,
+    "/production-report/rebuild": BULKHEAD_BATCH
+}
+bulkheads = Bulkheads(load_bulkheads(config('BULKHEADS', cast=str, default=''), DEFAULT_BULKHEADS), BULKHEAD_ROUTES)
 
 # Global MongoDB connection
 mongodb_client = None
 mongodb_db = None
+# Databases on the separate Mongo clients (pools) of the non-default bulkheads
+bulkhead_databases = {}
+
+# Which engine produced each recommendation response ("llm" or "rules")
+recommendation_engine_counts = Counter()
+
+# In-memory allergen/diet, search and substitution indexes over menu_items, reloaded when the catalog version changes
+menu_index = TagIndex()
+search_index = SearchIndex()
+substitution_index = SubstitutionIndex()
+# Lets one request at a time rebuild them (created on first use, inside the event loop)
+menu_index_lock: Optional[asyncio.Lock] = None
+# When the catalog version was last checked (time.monotonic())
+menu_version_checked_at = float('-inf')
+
+# Fallback dishes when the catalog has nothing suitable for a meal, first match wins.
+# Calories are overridden by the calculated values; the last dish of each meal fits every diet
+DEFAULT_MENU_ITEMS = [
+    {"_id": "default-breakfast-bowl", "category": "breakfast", "name": "Healthy Breakfast Bowl", "calories": 500,
+     "description": "Nutritious breakfast with whole grains and fresh fruits",
+     "allergens": ["gluten", "dairy"], "diet_tags": ["vegetarian"]},
+    {"_id": "default-breakfast-fruit", "category": "breakfast", "name": "Fresh Fruit Plate", "calories": 500,
+     "description": "Seasonal fresh fruits with a handful of seeds",
+     "allergens": [], "diet_tags": ["vegan"]},
+    {"_id": "default-lunch-garden", "category": "lunch", "name": "Garden Fresh Plate", "calories": 700,
+     "description": "Balanced lunch with lean protein and vegetables",
+     "allergens": ["egg"], "diet_tags": ["vegetarian"]},
+    {"_id": "default-lunch-rice", "category": "lunch", "name": "Vegetable Rice Bowl", "calories": 700,
+     "description": "Steamed rice with sauteed vegetables",
+     "allergens": [], "diet_tags": ["vegan"]},
+    {"_id": "default-dinner-fish", "category": "dinner", "name": "Grilled Fish with Vegetables", "calories": 600,
+     "description": "Light and nutritious dinner option with lean protein",
+     "allergens": ["fish"], "diet_tags": []},
+    {"_id": "default-dinner-vegetables", "category": "dinner", "name": "Steamed Vegetables with Rice", "calories": 600,
+     "description": "Light dinner of steamed vegetables and rice",
+     "allergens": [], "diet_tags": ["vegan"]},
+]
+default_menu_index = TagIndex()
+default_menu_index.rebuild(DEFAULT_MENU_ITEMS)
 
 # Models
 class User(BaseModel):
@@ -159,21 +324,34 @@ class DietPlan(BaseModel):
     created_at: datetime = datetime.now()
     updated_at: datetime = datetime.now()
 
+class NutritionInfo(BaseModel):
+    calories: int = 0
+    protein: float = 0.0
+    carbs: float = 0.0
+    fat: float = 0.0
+
+    @field_validator("calories", "protein", "carbs", "fat", mode="before")
+    @classmethod
+    def parse_number(cls, value, info):
+        # Older clients send display strings such as "350 calories" or "25g"
+        return nutrient_value(info.field_name, value)
+
 class MenuItem(BaseModel):
     id: Optional[str] = None
     name: str
     description: str
-    nutrition_info: dict = {
-        "calories": int,
-        "protein": float,
-        "carbs": float,
-        "fat": float
-    }
+    nutrition_info: NutritionInfo = NutritionInfo()
     price: float
     category: str
     created_at: datetime = datetime.now()
     updated_at: datetime = datetime.now()
 
+    @field_validator("category")
+    @classmethod
+    def lowercase_category(cls, value):
+        # Category filters match the stored value exactly, so it is kept lowercase
+        return normalize_category(value)
+
     class Config:
         json_schema_extra = {
             "example": {
@@ -190,9 +368,19 @@ class MenuItem(BaseModel):
             }
         }
 # Database connection utility function
-async def get_database():
+async def get_database(route: str = None):
+    """
+    Database handle for a request, with the read preference and read concern of its route.
+
+    Uses the shared client from startup of the current request's bulkhead, whose topology
+    monitoring is what lets reads go to secondaries; a per-request client is only created
+    if startup could not connect.
+    """
+    if mongodb_db is not None:
+        db = bulkhead_databases.get(bulkheads.current().name, mongodb_db)
+        return read_router.database(db, route)
     try:
-        logger.info(f"Connecting to MongoDB at: {MONGO_URL[:20]}...")
+        logger.debug("Connecting to MongoDB at: %s...", MONGO_URL[:20])
         client = AsyncIOMotorClient(
             MONGO_URL,
             serverSelectionTimeoutMS=5000,
@@ -215,10 +403,10 @@ async def get_database():
         await db.users.create_index("email", unique=True)
         await db.menu_items.create_index("name")
         await db.diet_plans.create_index("user_id")
-        
-        return db
+
+        return read_router.database(db, route)
     except Exception as e:
-        logger.error(f"Database connection error: {str(e)}")
+        logger.error("Database connection error: %s", e)
         raise HTTPException(status_code=500, detail=f"Database connection failed: {str(e)}")
 
 # MongoDB Connection Function
@@ -257,7 +445,7 @@ async def init_mongodb():
             detail="Database connection timeout. Please try again later."
         )
     except Exception as e:
-        logger.error(f"MongoDB initialization error: {str(e)}")
+        logger.error("MongoDB initialization error: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Database connection failed: {str(e)}"
@@ -271,6 +459,7 @@ app = FastAPI(
     openapi_url="/openapi.json",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=FastJSONResponse,
     swagger_ui_oauth2_redirect_url="/oauth2-redirect",
     swagger_ui_init_oauth={
         "clientId": AUTH0_CLIENT_ID,
@@ -279,24 +468,28 @@ app = FastAPI(
     }
 )
 
+def create_mongo_client(max_pool_size: int) -> AsyncIOMotorClient:
+    """MongoDB client with robust options and its own connection pool"""
+    return AsyncIOMotorClient(
+        MONGO_URL,
+        serverSelectionTimeoutMS=10000,
+        connectTimeoutMS=10000,
+        socketTimeoutMS=10000,
+        maxPoolSize=max_pool_size,
+        retryWrites=True,
+        retryReads=True
+    )
+
 @app.on_event("startup")
 async def startup_db_client():
     global mongodb_client, mongodb_db
     try:
         # Logging awal
         logger.info("Starting MongoDB connection initialization...")
-        logger.info(f"Connecting to MongoDB at: {MONGO_URL[:20]}...")
+        logger.info("Connecting to MongoDB at: %s...", MONGO_URL[:20])
         
-        # Create MongoDB client with robust options
-        mongodb_client = AsyncIOMotorClient(
-            MONGO_URL,
-            serverSelectionTimeoutMS=10000,
-            connectTimeoutMS=10000,
-            socketTimeoutMS=10000,
-            maxPoolSize=10,
-            retryWrites=True,
-            retryReads=True
-        )
+        # The default (interactive) bulkhead uses the main client
+        mongodb_client = create_mongo_client(bulkheads[bulkheads.default].mongo_pool)
         
         # Test connection
         logger.info("Testing MongoDB connection...")
@@ -304,11 +497,11 @@ async def startup_db_client():
         
         # Get database
         mongodb_db = mongodb_client.get_database('dietary_catering')
-        logger.info(f"Connected to database: {mongodb_db.name}")
+        logger.info("Connected to database: %s", mongodb_db.name)
         
         # List and create collections if needed
         collections = await mongodb_db.list_collection_names()
-        logger.info(f"Existing collections: {collections}")
+        logger.info("Existing collections: %s", collections)
         
         required_collections = [
             'users', 
@@ -319,7 +512,7 @@ async def startup_db_client():
         # Create missing collections
         for collection in required_collections:
             if collection not in collections:
-                logger.info(f"Creating collection: {collection}")
+                logger.info("Creating collection: %s", collection)
                 await mongodb_db.create_collection(collection)
         
         # Create indexes
@@ -327,30 +520,68 @@ async def startup_db_client():
         await mongodb_db.users.create_index("email", unique=True)
         await mongodb_db.menu_items.create_index("name")
         await mongodb_db.diet_plans.create_index("user_id")
+        await ensure_production_indexes(mongodb_db)
+        await ensure_nutrition_indexes(mongodb_db)
         
         # Verify final state
         final_collections = await mongodb_db.list_collection_names()
-        logger.info(f"Final collections in database: {final_collections}")
+        logger.info("Final collections in database: %s", final_collections)
         
         # Test write operation
         test_result = await mongodb_db.command("ping")
-        logger.info(f"Database write test result: {test_result}")
+        logger.info("Database write test result: %s", test_result)
+        
+        # Every other bulkhead gets a client of its own, so its requests cannot drain the main pool
+        for name, bulkhead in bulkheads.bulkheads.items():
+            if name != bulkheads.default:
+                bulkhead_databases[name] = create_mongo_client(bulkhead.mongo_pool).get_database('dietary_catering')
+        logger.info("MongoDB pools per bulkhead: %s", {name: b.mongo_pool for name, b in bulkheads.bulkheads.items()})
         
         logger.info("MongoDB initialization completed successfully!")
         
     except Exception as e:
-        logger.error(f"Failed to initialize MongoDB: {str(e)}")
-        logger.error(f"Error type: {type(e)}")
+        logger.error("Failed to initialize MongoDB: %s", e)
+        logger.error("Error type: %s", type(e))
         logger.error("MongoDB initialization failed!")
         raise e
 
+@app.on_event("startup")
+async def startup_menu_index():
+    try:
+        await refresh_menu_index(mongodb_db)
+        logger.info("Menu index loaded with %s items", len(menu_index))
+    except Exception as e:
+        # Not fatal, the index is loaded again on first use
+        logger.error("Failed to load menu index: %s", e)
+
+@app.on_event("startup")
+async def startup_job_workers():
+    await recommendation_queue.start()
+
+@app.on_event("startup")
+async def startup_recipe_proxy():
+    await recipe_proxy.start()
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("Application is starting up...")
-    logger.info(f"Current working directory: {os.getcwd()}")
-    logger.info("Checking environment variables...")
-    for key, value in os.environ.items():
-        logger.info(f"{key}: {value}")
+    logger.info("Current working directory: %s", os.getcwd())
+    # Only names: values include credentials
+    logger.info("Environment variables set: %s", ", ".join(sorted(os.environ)))
+
+@app.on_event("shutdown")
+async def shutdown_job_workers():
+    await recommendation_queue.stop()
+
+@app.on_event("shutdown")
+async def shutdown_recipe_proxy():
+    await recipe_proxy.stop()
+
+@app.on_event("shutdown")
+async def shutdown_bulkheads():
+    for db in bulkhead_databases.values():
+        db.client.close()
+    await bulkheads.close()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
@@ -359,7 +590,7 @@ async def shutdown_db_client():
             mongodb_client.close()
             logger.info("MongoDB connection closed successfully")
     except Exception as e:
-        logger.error(f"Error closing MongoDB connection: {str(e)}")
+        logger.error("Error closing MongoDB connection: %s", e)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
@@ -367,8 +598,13 @@ async def shutdown_db_client():
         mongodb_client.close()
         logger.info("MongoDB connection closed")
 
+@app.on_event("shutdown")
+async def shutdown_logging():
+    stop_logging()
+
 # Setup templates
 templates = Jinja2Templates(directory="frontend")
+DASHBOARD_TEMPLATE = Path("frontend") / "dashboard.html"
 
 # Add CORS middleware
 from fastapi.middleware.cors import CORSMiddleware
@@ -395,6 +631,14 @@ app.add_middleware(
     https_only=True
 )
 
+app.add_middleware(DeadlineMiddleware, routes=ROUTE_DEADLINES, max_timeout=MAX_REQUEST_TIMEOUT)
+
+# Admission per endpoint class before any other work; a full class answers 503 on its own
+app.add_middleware(BulkheadMiddleware, bulkheads=bulkheads)
+
+# Outermost, so every log line of a request carries its X-Request-ID
+app.add_middleware(RequestIdMiddleware)
+
 # OAuth Setup with Auth0
 oauth = OAuth()
 oauth.register(
@@ -458,6 +702,19 @@ async def get_current_user(request: Request):
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics")
+def metrics():
+    """Runtime counters for the LLM-backed endpoints"""
+    return {
+        "llm_limiter": llm_limiter.stats(),
+        "llm_tiers": llm_caller.stats(),
+        "recipe_proxy": recipe_proxy.stats(),
+        "recommendation_engines": dict(recommendation_engine_counts),
+        "read_routing": read_router.stats(),
+        "abandoned_work": recommendation_work.stats(),
+        "bulkheads": bulkheads.stats()
+    }
+
 @app.get("/")
 async def serve_home():
     return FileResponse('frontend/index.html')
@@ -471,7 +728,7 @@ async def login(request: Request):
             prompt="login"
         )
     except Exception as e:
-        logger.error(f"Login error: {str(e)}")
+        logger.error("Login error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -484,15 +741,15 @@ async def callback(request: Request):
         request.session['user'] = dict(userinfo)
         return RedirectResponse(url='/dashboard', status_code=303)
     except Exception as e:
-        logger.error(f"Callback error: {str(e)}")
+        logger.error("Callback error: %s", e)
         return RedirectResponse(url='/login')
 
 @app.post("/update-profile")
 async def update_profile(request: Request):
     try:
         # Get fresh database connection
-        db = await get_database()
-        logger.info("Database connection established for profile update")
+        db = await get_database(ROUTE_PROFILE)
+        logger.debug("Database connection established for profile update")
         
         # Get user from session
         user = request.session.get('user')
@@ -514,13 +771,13 @@ async def update_profile(request: Request):
                     "weight": float(form.get("weight", 0)),
                     "height": float(form.get("height", 0)),
                     "medical_conditions": form.get("medical_conditions", "").split(",") if form.get("medical_conditions") else [],
-                    "allergies": form.get("allergies", "").split(",") if form.get("allergies") else [],
-                    "dietary_preferences": form.get("dietary_preferences", "").split(",") if form.get("dietary_preferences") else []
+                    "allergies": sorted(normalize_tags(form.get("allergies"))),
+                    "dietary_preferences": sorted(normalize_tags(form.get("dietary_preferences")))
                 },
                 "updated_at": datetime.now()
             }
         except (ValueError, TypeError) as e:
-            logger.error(f"Form data validation error: {str(e)}")
+            logger.error("Form data validation error: %s", e)
             raise HTTPException(status_code=400, detail="Invalid form data")
         
         # Update user profile
@@ -536,7 +793,7 @@ async def update_profile(request: Request):
             if not updated_user:
                 raise HTTPException(status_code=500, detail="Failed to verify profile update")
                 
-            logger.info(f"Profile updated successfully for user: {user.get('email')}")
+            logger.info("Profile updated successfully for user: %s", user.get('email'))
             return {
                 "status": "success",
                 "message": "Profile updated successfully",
@@ -545,13 +802,13 @@ async def update_profile(request: Request):
             }
             
         except Exception as e:
-            logger.error(f"Database update error: {str(e)}")
+            logger.error("Database update error: %s", e)
             raise HTTPException(status_code=500, detail="Failed to update profile in database")
             
     except HTTPException as he:
         raise he
     except Exception as e:
-        logger.error(f"Unexpected error in update_profile: {str(e)}")
+        logger.error("Unexpected error in update_profile: %s", e)
         raise HTTPException(status_code=500, detail="An unexpected error occurred")
 
 @app.get("/dashboard", response_class=HTMLResponse)
@@ -561,17 +818,26 @@ async def dashboard(request: Request):
         if not user:
             return RedirectResponse(url='/login')
             
-        db = await get_database()
+        db = await get_database(ROUTE_PROFILE)
         user_profile = await db.users.find_one({"email": user.get("email")})
+
+        # Profile changes and template deploys both produce a new ETag
+        last_modified = (user_profile or {}).get("updated_at")
+        etag = make_etag("dashboard", user.get("email"), last_modified, DASHBOARD_TEMPLATE.stat().st_mtime)
+        cached = not_modified(request, etag, last_modified, PRIVATE_CACHE_CONTROL)
+        if cached:
+            return cached
         
-        # Render template dengan konteks
-        return templates.TemplateResponse("dashboard.html", {
+        # Render template dengan konteks (off the event loop)
+        response = await bulkheads.current().run_cpu(templates.TemplateResponse, "dashboard.html", {
             "request": request, 
             "user": user,
             "user_profile": user_profile
         })
+        response.headers.update(cache_headers(etag, last_modified, PRIVATE_CACHE_CONTROL))
+        return response
     except Exception as e:
-        logger.error(f"Dashboard error: {str(e)}")
+        logger.error("Dashboard error: %s", e)
         return RedirectResponse(url='/')
     
 @app.get("/logout")
@@ -600,7 +866,7 @@ async def complete_profile(request: Request):
             "user": user
         })
     except Exception as e:
-        logger.error(f"Error in complete_profile: {str(e)}")
+        logger.error("Error in complete_profile: %s", e)
         return RedirectResponse(url='/dashboard')
 
 @app.post("/users", response_model=User, tags=["users"])
@@ -615,7 +881,7 @@ async def create_user(user: User, current_user: dict = Depends(get_current_user)
         user_dict['id'] = str(result.inserted_id)
         return user_dict
     except Exception as e:
-        logger.error(f"Error creating user: {str(e)}")
+        logger.error("Error creating user: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/users", response_model=List[User], tags=["users"])
@@ -625,23 +891,131 @@ async def get_users(current_user: dict = Depends(get_current_user)):
     Requires authentication.
     """
     try:
-        users = await mongodb_db.users.find().to_list(length=None)
-        for user in users:
-            user['id'] = str(user['_id'])
-            del user['_id']
-        return users
+        users = await mongodb_db.users.find({}, model_projection(User)).to_list(length=None)
+        return FastJSONResponse(prepare_documents(users))
     except Exception as e:
-        logger.error(f"Error fetching users: {str(e)}")
+        logger.error("Error fetching users: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/menu-items", response_model=List[MenuItem])
-async def get_menu_items():
-    """Get all menu items"""
+@app.post("/users/import", tags=["users"])
+async def import_users(
+    request: Request,
+    format: Optional[str] = None,
+    batch_size: int = 1000,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Bulk import user health profiles from a CSV or NDJSON request body.
+    Rows are upserted by email; invalid rows are reported by row number.
+    Requires authentication.
+    """
+    if format not in (None, "csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    if not 1 <= batch_size <= 10000:
+        raise HTTPException(status_code=400, detail="batch_size must be between 1 and 10000")
+
     try:
         db = await get_database()
-        menu_items = await db.menu_items.find().to_list(length=None)
-        return menu_items
+        fmt = format or detect_format("", request.headers.get("content-type", ""))
+        rows = iter_rows(iter_lines(request.stream()), fmt)
+        report = await import_profiles(db.users, rows, batch_size=batch_size)
+        logger.info("Imported profiles: %s rows, %s failed", report['processed'], report['failed'])
+        return report
     except Exception as e:
+        logger.error("Error importing users: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/menu-items", response_model=List[MenuItem])
+async def get_menu_items(
+    request: Request,
+    category: Optional[str] = None,
+    min_calories: Optional[float] = None,
+    max_calories: Optional[float] = None,
+    min_protein: Optional[float] = None,
+    max_protein: Optional[float] = None,
+    min_carbs: Optional[float] = None,
+    max_carbs: Optional[float] = None,
+    min_fat: Optional[float] = None,
+    max_fat: Optional[float] = None
+):
+    """Get all menu items, optionally filtered by category and calorie/macro ranges"""
+    try:
+        query = range_query(
+            category,
+            min_calories=min_calories, max_calories=max_calories,
+            min_protein=min_protein, max_protein=max_protein,
+            min_carbs=min_carbs, max_carbs=max_carbs,
+            min_fat=min_fat, max_fat=max_fat
+        )
+        db = await get_database(ROUTE_CATALOG)
+        # Version first, then the items in the same causal session: the ETag never labels older data
+        async with read_router.consistent_reads(db) as session:
+            version, last_modified = await get_version(db, menu_items_key(), session=session)
+            etag = make_etag(menu_items_key(), version, last_modified, sorted(request.query_params.items()))
+            cached = not_modified(request, etag, last_modified, CATALOG_CACHE_CONTROL)
+            if cached:
+                return cached
+
+            menu_items = await db.menu_items.find(query, model_projection(MenuItem), session=session).to_list(length=None)
+        return FastJSONResponse(
+            prepare_documents(menu_items),
+            headers=cache_headers(etag, last_modified, CATALOG_CACHE_CONTROL)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/menu-items/search")
+async def search_menu_items(
+    q: str,
+    category: Optional[str] = None,
+    min_calories: Optional[float] = None,
+    max_calories: Optional[float] = None,
+    limit: int = 10
+):
+    """Typo-tolerant search and autocomplete over menu item names and descriptions"""
+    if not 1 <= limit <= 50:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 50")
+    try:
+        db = await get_database(ROUTE_CATALOG)
+        await refresh_menu_index(db)
+        results = search_index.search(
+            q,
+            category=category,
+            min_calories=min_calories,
+            max_calories=max_calories,
+            limit=limit
+        )
+        return FastJSONResponse(prepare_documents(results))
+    except Exception as e:
+        logger.error("Menu search error: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/menu-items/{item_id}/substitutes")
+async def get_menu_item_substitutes(item_id: str, request: Request, k: int = 5, exclude: Optional[str] = None):
+    """Dishes of the same category closest in calories, macros and price, to swap a recommended dish"""
+    if not 1 <= k <= 20:
+        raise HTTPException(status_code=400, detail="k must be between 1 and 20")
+    try:
+        db = await get_database(ROUTE_CATALOG)
+        await refresh_menu_index(db)
+        # Comma separated allergens from the query, plus the signed-in user's profile allergies
+        excluded_tags = normalize_tags(exclude)
+        user = request.session.get('user')
+        if user:
+            profile_db = await get_database(ROUTE_PROFILE)
+            profile = await profile_db.users.find_one({"email": user.get("email")}, {"health_profile.allergies": 1}) or {}
+            excluded_tags |= normalize_tags((profile.get('health_profile') or {}).get('allergies'))
+
+        results = substitution_index.nearest(item_id, k, excluded_tags)
+        if results is None:
+            raise HTTPException(status_code=404, detail="Menu item not found")
+        return FastJSONResponse(prepare_documents(results))
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error("Menu substitution error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -650,6 +1024,13 @@ async def create_menu_item(item: MenuItem, current_user: dict = Depends(get_curr
     """Create new menu item (admin only)"""
     try:
         result = await mongodb_db.menu_items.insert_one(item.dict())
+        version = await bump_version(mongodb_db, menu_items_key())
+        # Apply the new item in place when this process was current, otherwise reload on next use
+        if menu_index.version == version - 1:
+            new_item = {**item.dict(), "_id": result.inserted_id}
+            for index in (menu_index, search_index, substitution_index):
+                index.upsert(new_item)
+                index.version = version
         return {**item.dict(), "id": str(result.inserted_id)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -661,83 +1042,290 @@ async def create_diet_plan(plan: DietPlan, current_user: dict = Depends(get_curr
         plan_dict = plan.dict()
         plan_dict["user_id"] = current_user["sub"]
         result = await mongodb_db.diet_plans.insert_one(plan_dict)
+        await bump_version(mongodb_db, diet_plans_key(plan_dict["user_id"]))
+        await update_production_summary(mongodb_db, None, plan_dict)
         return {**plan_dict, "id": str(result.inserted_id)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/diet-plans/{user_id}", response_model=List[DietPlan])
-async def get_user_diet_plans(user_id: str):
+async def get_user_diet_plans(user_id: str, request: Request):
     """Get diet plans for a specific user"""
     try:
-        db = await get_database()
-        plans = await db.diet_plans.find({"user_id": user_id}).to_list(length=None)
-        return plans
+        db = await get_database(ROUTE_HISTORY)
+        async with read_router.consistent_reads(db) as session:
+            version, last_modified = await get_version(db, diet_plans_key(user_id), session=session)
+            etag = make_etag(diet_plans_key(user_id), version, last_modified)
+            cached = not_modified(request, etag, last_modified, PRIVATE_CACHE_CONTROL)
+            if cached:
+                return cached
+
+            plans = await db.diet_plans.find({"user_id": user_id}, model_projection(DietPlan), session=session).to_list(length=None)
+        return FastJSONResponse(
+            prepare_documents(plans),
+            headers=cache_headers(etag, last_modified, PRIVATE_CACHE_CONTROL)
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
 
-@app.post("/recommendations")
-async def get_recommendations(request: Request):
+def recommendations_plan_filter(email: str) -> dict:
+    """The user's one /recommendations plan document, never one of the generated multi-day plans."""
+    return {"user_id": email, "meal_plan": {"$exists": False}}
+
+@app.post("/diet-plans/generate", response_model=DietPlan)
+async def generate_diet_plan(request: Request):
+    """Generate a 7 or 30 day meal plan from menu items that meets the user's macro targets"""
     try:
         user = request.session.get('user')
         if not user:
             raise HTTPException(status_code=401, detail="Not authenticated")
-        
+
         request_data = await request.json()
+        try:
+            days = int(request_data.get('days', 7))
+            start_date = datetime.fromisoformat(request_data['start_date']) if request_data.get('start_date') else datetime.now()
+            max_repeats = int(request_data.get('max_repeats', 2))
+            budget = float(request_data['budget']) if request_data.get('budget') else None
+            tolerance = float(request_data.get('tolerance', 0.1))
+        except (TypeError, ValueError):
+            raise HTTPException(
+                status_code=400,
+                detail="days, max_repeats, budget and tolerance must be numbers and start_date an ISO date"
+            )
+        if days not in (7, 30):
+            raise HTTPException(status_code=400, detail="days must be 7 or 30")
+        if max_repeats < 1:
+            raise HTTPException(status_code=400, detail="max_repeats must be at least 1")
+        if budget is not None and not 0 < budget < float('inf'):
+            raise HTTPException(status_code=400, detail="budget must be a positive number")
+        if not 0 < tolerance <= 1:
+            raise HTTPException(status_code=400, detail="tolerance must be between 0 and 1")
+
+        db = await get_database(ROUTE_PROFILE)
+        user_profile = await db.users.find_one({"email": user.get("email")}) or {}
+        health_profile = user_profile.get('health_profile', {})
+
+        nutrition_goals = calculate_nutrition_goals(health_profile, request_data)
+        targets = {GOAL_KEYS[key]: value for key, value in nutrition_goals.items()}
+
+        # Allergies from the profile are excluded together with the requested restrictions
+        excluded_tags, required_tags = restriction_tags(request_data.get('restrictions'))
+        excluded_tags |= normalize_tags(health_profile.get('allergies'))
+
+        # The menu is catalog data, read with the catalog route like the other menu endpoints
+        catalog_db = read_router.database(db, ROUTE_CATALOG)
+        menu_items = await catalog_db.menu_items.find(
+            {"category": {"$in": ["breakfast", "lunch", "dinner"]}},
+            {"name": 1, "category": 1, "nutrition_info": 1, "price": 1, "restrictions": 1, "allergens": 1,
+             "diet_tags": 1, "tags": 1}
+        ).to_list(length=None)
+
+        try:
+            meal_plan = await bulkheads.current().run_cpu(
+                build_meal_plan,
+                menu_items,
+                targets,
+                days=days,
+                start_date=start_date,
+                excluded_tags=excluded_tags,
+                required_tags=required_tags,
+                max_repeats=max_repeats,
+                budget=budget,
+                tolerance=tolerance
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+        plan_dict = {
+            "user_id": user.get('email'),
+            "start_date": start_date,
+            "end_date": start_date + timedelta(days=days - 1),
+            "meal_plan": meal_plan,
+            "calories_target": targets["calories"],
+            "protein_target": targets["protein"],
+            "carbs_target": targets["carbs"],
+            "fat_target": targets["fat"],
+            "special_instructions": request_data.get('special_instructions'),
+            "created_at": datetime.now(),
+            "updated_at": datetime.now()
+        }
+        result = await db.diet_plans.insert_one(plan_dict)
+        await bump_version(db, diet_plans_key(plan_dict["user_id"]))
+        await update_production_summary(db, None, plan_dict)
+        plan_dict["id"] = str(result.inserted_id)
+        del plan_dict["_id"]
+        return plan_dict
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error("Error generating diet plan: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    
+@app.post("/recipes")
+async def generate_recipes(request: Request):
+    """Proxy to the recipe generator service with caching and request coalescing"""
+    try:
+        body = await request.json()
+        return await recipe_proxy.get(body, api_key=request.headers.get("x-api-key"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UpstreamError as e:
+        logger.error("Recipe proxy error: %s", e.detail)
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+async def update_production_summary(db, old_plan: Optional[dict], new_plan: Optional[dict]):
+    """Keep the kitchen production summary in step with a plan write. Never fails the write."""
+    try:
+        await apply_plan_change(db, old_plan, new_plan)
+    except Exception as e:
+        logger.error("Failed to update production summary: %s", e)
+
+@app.get("/production-report", tags=["kitchen"])
+async def get_production_report(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    category: Optional[str] = None,
+    format: str = "json",
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Portions to cook per day, dish and category, read from the production summary.
+    Dates are YYYY-MM-DD. Use format=csv for a printable download.
+    Requires authentication.
+    """
+    try:
+        db = await get_database(ROUTE_HISTORY)
+        cursor = db[SUMMARY_COLLECTION].find(report_query(start_date, end_date, category)).sort(
+            [("_id.date", 1), ("_id.category", 1), ("_id.dish", 1)]
+        )
+        if format == "csv":
+            return StreamingResponse(
+                iter_report_csv(cursor),
+                media_type="text/csv",
+                headers={"Content-Disposition": "attachment; filename=production-report.csv"}
+            )
+        return [report_row(document) async for document in cursor]
+    except Exception as e:
+        logger.error("Error building production report: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/production-report/rebuild", tags=["kitchen"])
+async def rebuild_production_report(current_user: dict = Depends(get_current_user)):
+    """
+    Recompute the production summary from all diet plans with an aggregation pipeline.
+    Requires authentication.
+    """
+    try:
         db = await get_database()
-        user_profile = await db.users.find_one({"email": user.get("email")})
-        
-        # Get AI recommendations
+        await rebuild_summary(db)
+        return {"status": "success", "rows": await db[SUMMARY_COLLECTION].count_documents({})}
+    except Exception as e:
+        logger.error("Error rebuilding production report: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000)
+
+async def build_recommendations(db, email: str, request_data: dict, shed: bool = True) -> dict:
+    """
+    Run the prompt, menu selection and persistence for one recommendation request.
+
+    With shed=False the request waits for an LLM slot instead of being shed to the rules engine.
+    """
+    user_profile = await db.users.find_one({"email": email})
+    engine = str(request_data.get('engine') or RECOMMENDATION_ENGINE).lower()
+    if engine not in ('llm', 'rules'):
+        raise HTTPException(status_code=400, detail="engine must be 'llm' or 'rules'")
+    
+    # Get AI recommendations
+    ai_response = ""
+    degraded = False
+    if engine == 'llm':
         prompt = construct_dietary_prompt(user_profile, request_data)
-        response = await call_groq_api(prompt)
-        ai_response = response['choices'][0]['message']['content']
-        
-        # Process recommendations dengan mengirimkan health_profile
-        nutrition_goals = extract_nutrition_goals(
-            ai_response,
-            health_profile=user_profile.get('health_profile'),
-            form_data=request_data
-        )
-        
-        # Dapatkan total kalori dari nutrition_goals
-        total_calories = int(nutrition_goals["Calories"].split()[0])  # "2000 kcal" -> 2000
-        
-        # Hitung distribusi kalori untuk setiap makanan
-        breakfast_calories = int(total_calories * 0.3)  # 30% dari total
-        lunch_calories = int(total_calories * 0.4)     # 40% dari total
-        dinner_calories = int(total_calories * 0.3)    # 30% dari total
-        
-        # Update menu items dengan kalori yang sesuai
-        menu_items = await extract_menu_items(
-            db, 
-            ['breakfast', 'lunch', 'dinner'],
-            request_data.get('restrictions', [])
-        )
-        
-        # Update kalori untuk setiap meal berdasarkan proporsi
-        for item in menu_items:
-            if "Breakfast" in item["name"]:
-                item["calories"] = f"{breakfast_calories} calories"
-            elif "Lunch" in item["name"]:
-                item["calories"] = f"{lunch_calories} calories"
-            elif "Dinner" in item["name"]:
-                item["calories"] = f"{dinner_calories} calories"
-        
-        health_advice = extract_health_advice(ai_response)
-        
-        final_response = {
-            "nutritionGoals": nutrition_goals,
-            "menuItems": menu_items,
-            "healthAdvice": health_advice,
-            "generated_at": datetime.now().isoformat()
-        }
-        
-        # Update atau insert diet plan
-        await db.diet_plans.update_one(
-            {"user_id": user.get('email')},
+        try:
+            async with llm_limiter.slot(shed):
+                response, served_by = await llm_caller.call(prompt)
+            logger.info("Recommendation served by model tier: %s", served_by)
+            ai_response = response['choices'][0]['message']['content']
+        except LoadShedError as e:
+            if LLM_OVERLOAD_MODE == 'reject':
+                raise HTTPException(
+                    status_code=503,
+                    detail="Recommendation service is busy, please retry shortly",
+                    headers={"Retry-After": str(e.retry_after)}
+                )
+            # Goals are calculated locally and menus come from the DB, the rules engine covers the advice
+            llm_limiter.mark_downgraded()
+            logger.warning("LLM limiter shed a request, serving rules-based recommendations")
+            engine = 'rules'
+            degraded = True
+        except Exception as e:
+            if not RULES_FALLBACK:
+                raise
+            logger.warning("LLM call failed, serving rules-based recommendations: %s", e)
+            engine = 'rules'
+            degraded = True
+    recommendation_engine_counts[engine] += 1
+    
+    # Process recommendations dengan mengirimkan health_profile (parsing runs off the event loop)
+    nutrition_goals = await bulkheads.current().run_cpu(
+        extract_nutrition_goals,
+        ai_response,
+        health_profile=user_profile.get('health_profile'),
+        form_data=request_data
+    )
+    
+    # Dapatkan total kalori dari nutrition_goals
+    total_calories = nutrition_goals["Calories"]
+    
+    # Hitung distribusi kalori untuk setiap makanan
+    breakfast_calories = int(total_calories * 0.3)  # 30% dari total
+    lunch_calories = int(total_calories * 0.4)     # 40% dari total
+    dinner_calories = int(total_calories * 0.3)    # 30% dari total
+    
+    # Update menu items dengan kalori yang sesuai
+    menu_items = await extract_menu_items(
+        db, 
+        ['breakfast', 'lunch', 'dinner'],
+        request_data.get('restrictions', []),
+        health_profile=user_profile.get('health_profile'),
+        # The rules engine is deterministic: pick the dish closest to each meal's budget
+        calorie_targets={
+            'breakfast': breakfast_calories,
+            'lunch': lunch_calories,
+            'dinner': dinner_calories
+        } if engine == 'rules' else None
+    )
+    
+    # Update kalori untuk setiap meal berdasarkan proporsi
+    for item in menu_items:
+        if "Breakfast" in item["name"]:
+            item["calories"] = breakfast_calories
+        elif "Lunch" in item["name"]:
+            item["calories"] = lunch_calories
+        elif "Dinner" in item["name"]:
+            item["calories"] = dinner_calories
+    
+    if engine == 'rules':
+        health_advice = rules_engine.health_advice(user_profile.get('health_profile'), request_data, nutrition_goals)
+    else:
+        health_advice = await bulkheads.current().run_cpu(extract_health_advice, ai_response)
+    
+    final_response = {
+        "nutritionGoals": nutrition_goals,
+        "menuItems": menu_items,
+        "healthAdvice": health_advice,
+        "generated_at": datetime.now().isoformat()
+    }
+    if degraded:
+        final_response["degraded"] = True
+    
+    # Update atau insert diet plan (generated multi-day plans live in their own documents)
+    async def save_plan():
+        previous_plan = await db.diet_plans.find_one_and_update(
+            recommendations_plan_filter(email),
             {
                 "$set": {
                     "recommendations": final_response,
@@ -746,15 +1334,114 @@ async def get_recommendations(request: Request):
                     "updated_at": datetime.now()
                 }
             },
-            upsert=True
+            upsert=True,
+            projection={"recommendations": 1},
+            return_document=ReturnDocument.BEFORE
         )
+        await bump_version(db, diet_plans_key(email))
+        await update_production_summary(db, previous_plan, {"recommendations": final_response})
+
+    # Up to here a disconnect cancels everything; the plan writes are not cut in half
+    await run_to_completion(save_plan())
+    
+    return final_response
+
+@app.post("/recommendations")
+async def get_recommendations(request: Request):
+    try:
+        user = request.session.get('user')
+        if not user:
+            raise HTTPException(status_code=401, detail="Not authenticated")
         
-        return final_response
+        request_data = await request.json()
+        db = await get_database(ROUTE_PROFILE)
+        # The body has been read, so the next ASGI message on receive is the client's disconnect
+        return await recommendation_work.run(
+            "recommendations",
+            build_recommendations(db, user.get("email"), request_data),
+            receive=request.receive,
+            key=user.get("email")
+        )
         
+    except HTTPException as he:
+        raise he
+    except WorkAbandoned as e:
+        status_code, detail = ABANDONED_RESPONSES[e.reason]
+        raise HTTPException(status_code=status_code, detail=detail)
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
-        logger.error(f"Error in recommendations: {str(e)}")
+        logger.error("Error in recommendations: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+async def run_recommendation_job(payload: dict) -> dict:
+    """Job queue handler for queued recommendation requests."""
+    async with bulkheads.use(BULKHEAD_LLM):
+        db = await get_database(ROUTE_PROFILE)
+        try:
+            # Jobs have no client waiting on a 503, they wait for the LLM instead of degrading
+            return await build_recommendations(db, payload["email"], payload["request_data"], shed=False)
+        except HTTPException as he:
+            if he.status_code < 500:
+                # A bad request fails the same way on every attempt
+                raise PermanentJobError(he.detail)
+            raise
+
+recommendation_queue = JobQueue(
+    lambda: mongodb_db.recommendation_jobs,
+    run_recommendation_job,
+    workers=RECOMMENDATION_WORKERS,
+    callback_hosts=CALLBACK_ALLOWED_HOSTS
+)
+
+@app.post("/recommendations/jobs", status_code=202)
+async def submit_recommendation_job(request: Request):
+    """Queue a recommendation request and return its job id immediately"""
+    user = request.session.get('user')
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    request_data = await request.json()
+    callback_url = request_data.pop('callback_url', None)
+    if callback_url:
+        try:
+            await check_callback_url(str(callback_url), CALLBACK_ALLOWED_HOSTS)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        job_id = await recommendation_queue.submit(
+            {"email": user.get("email"), "request_data": request_data},
+            owner=user.get("email"),
+            callback_url=callback_url
+        )
+    except Exception as e:
+        logger.error("Error queueing recommendation job: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to queue recommendation job")
+
+    return {"job_id": job_id, "status": JOB_QUEUED, "status_url": f"/recommendations/jobs/{job_id}"}
+
+@app.get("/recommendations/jobs/{job_id}")
+async def get_recommendation_job(job_id: str, request: Request):
+    """Poll the status and result of a queued recommendation request"""
+    user = request.session.get('user')
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    job = await recommendation_queue.get(job_id)
+    if not job or job.get("owner") != user.get("email"):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "created_at": job["created_at"].isoformat(),
+        "updated_at": job["updated_at"].isoformat()
+    }
+
 def construct_dietary_prompt(user_profile: dict, form_data: dict = None) -> str:
     """Construct a prompt focused on catering menu recommendations."""
     health_profile = user_profile.get('health_profile', {})
@@ -809,7 +1496,7 @@ def extract_health_advice(ai_response: str) -> str:
         return '\n'.join(health_advice) if health_advice else "• Maintain a balanced diet with regular meals\n• Stay hydrated\n• Exercise regularly"
         
     except Exception as e:
-        logger.error(f"Error extracting health advice: {str(e)}")
+        logger.error("Error extracting health advice: %s", e)
         return "• Maintain a balanced diet with regular meals\n• Stay hydrated\n• Exercise regularly"
     
 def process_ai_response(ai_response: str) -> dict:
@@ -859,29 +1546,24 @@ def process_ai_response(ai_response: str) -> dict:
         }
         
     except Exception as e:
-        logger.error(f"Error processing AI response: {str(e)}")
+        logger.error("Error processing AI response: %s", e)
         # Return default recommendations directly instead of calling a separate function
         return {
-            "nutritionGoals": {
-                "Calories": "1800 kcal",
-                "Protein": "70g",
-                "Carbs": "220g",
-                "Fat": "60g"
-            },
+            "nutritionGoals": create_default_nutrition_goals(),
             "menuItems": [
                 {
                     "name": "Breakfast: Healthy Morning Bowl",
-                    "calories": "350 calories",
+                    "calories": 350,
                     "description": "A nutritious breakfast option with whole grains and fresh fruits"
                 },
                 {
                     "name": "Lunch: Fresh Garden Plate",
-                    "calories": "450 calories",
+                    "calories": 450,
                     "description": "A balanced mix of vegetables and lean protein"
                 },
                 {
                     "name": "Dinner: Light Evening Meal",
-                    "calories": "400 calories",
+                    "calories": 400,
                     "description": "Light and nutritious dinner option"
                 }
             ],
@@ -897,15 +1579,15 @@ def calculate_nutrition_goals(health_profile: dict = None, form_data: dict = Non
     - form_data: dict containing activity_level, goals, etc
     
     Returns:
-    - dict with calculated daily nutritional goals
+    - dict with calculated daily nutritional goals: Calories in kcal, macros in grams
     """
     try:
         # Default values for average adult
         default_goals = {
-            "Calories": "2000 kcal",
-            "Protein": "75g",
-            "Carbs": "250g",
-            "Fat": "65g"
+            "Calories": 2000,
+            "Protein": 75,
+            "Carbs": 250,
+            "Fat": 65
         }
         
         if not health_profile:
@@ -968,10 +1650,10 @@ def calculate_nutrition_goals(health_profile: dict = None, form_data: dict = Non
         carb_grams = int(carb_calories / 4)  # 4 calories per gram of carbs
         
         return {
-            "Calories": f"{total_calories} kcal",
-            "Protein": f"{protein_grams}g",
-            "Carbs": f"{carb_grams}g",
-            "Fat": f"{fat_grams}g"
+            "Calories": total_calories,
+            "Protein": protein_grams,
+            "Carbs": carb_grams,
+            "Fat": fat_grams
         }
         
     except Exception as e:
@@ -989,10 +1671,10 @@ def extract_nutrition_goals(nutrition_text: str, health_profile: dict = None, fo
             
         # Otherwise try to extract from AI response or use defaults
         goals = {
-            "Calories": "2000 kcal",
-            "Protein": "75g",
-            "Carbs": "250g",
-            "Fat": "65g"
+            "Calories": 2000,
+            "Protein": 75,
+            "Carbs": 250,
+            "Fat": 65
         }
         
         patterns = {
@@ -1005,93 +1687,151 @@ def extract_nutrition_goals(nutrition_text: str, health_profile: dict = None, fo
         for key, pattern in patterns.items():
             match = re.search(pattern, nutrition_text.lower())
             if match:
-                value = match.group(1)
+                value = int(match.group(1))
                 if key == 'calories':
-                    goals["Calories"] = f"{value} kcal"
+                    goals["Calories"] = value
                 elif key == 'protein':
-                    goals["Protein"] = f"{value}g"
+                    goals["Protein"] = value
                 elif key == 'carbs':
-                    goals["Carbs"] = f"{value}g"
+                    goals["Carbs"] = value
                 elif key == 'fat':
-                    goals["Fat"] = f"{value}g"
+                    goals["Fat"] = value
                     
         return goals
         
     except Exception as e:
         return create_default_nutrition_goals()
 
-async def extract_menu_items(db, menu_categories: list, dietary_restrictions: list = None) -> list:
+def menu_indexes_current(version) -> bool:
+    return all(index.version == version for index in (menu_index, search_index, substitution_index))
+
+def build_menu_indexes(items: list, version):
+    """Fresh menu indexes over items; CPU-bound, run off the event loop."""
+    indexes = (TagIndex(), SearchIndex(), SubstitutionIndex())
+    for index in indexes:
+        index.rebuild(items, version)
+    return indexes
+
+async def refresh_menu_index(db):
+    """
+    Reload the in-memory menu indexes if the catalog changed since they were built.
+
+    Once loaded, the version is checked at most once per MENU_VERSION_CHECK_INTERVAL, by one
+    request; the others keep using the indexes they have instead of a Mongo round trip each.
+    Writes through this process update the indexes in place right away.
+    """
+    global menu_version_checked_at
+    now = time.monotonic()
+    loaded = menu_indexes_current(menu_index.version) and menu_index.version is not None
+    if loaded and now - menu_version_checked_at < MENU_VERSION_CHECK_INTERVAL:
+        return
+    menu_version_checked_at = now
+    try:
+        await reload_menu_index(db)
+    except BaseException:
+        # Let the next request check again
+        menu_version_checked_at = float('-inf')
+        raise
+
+async def reload_menu_index(db):
+    global menu_index, search_index, substitution_index, menu_index_lock
+    # Catalog reads may come from a secondary: a change shows up here within the route's max staleness.
+    # The items are read in the version's causal session, so the indexes never carry a version
+    # newer than their items.
+    db = read_router.database(db, ROUTE_CATALOG)
+    version, _ = await get_version(db, menu_items_key())
+    if menu_indexes_current(version):
+        return
+
+    if menu_index_lock is None:
+        menu_index_lock = asyncio.Lock()
+    async with menu_index_lock:
+        async with read_router.consistent_reads(db) as session:
+            # Requests that waited here find the indexes rebuilt by the one before them
+            version, _ = await get_version(db, menu_items_key(), session=session)
+            if menu_indexes_current(version):
+                return
+            items = await db.menu_items.find({}, {"created_at": 0, "updated_at": 0}, session=session).to_list(length=None)
+        # Requests keep reading the old indexes until the new ones are swapped in whole
+        indexes = await bulkheads.current().run_cpu(build_menu_indexes, items, version)
+        # create_menu_item may have moved the old ones past this version in place meanwhile
+        if isinstance(menu_index.version, int) and menu_index.version > version:
+            return
+        menu_index, search_index, substitution_index = indexes
+
+async def extract_menu_items(
+    db,
+    menu_categories: list,
+    dietary_restrictions: list = None,
+    health_profile: dict = None,
+    calorie_targets: dict = None
+) -> list:
     """Extract menu items from database with proper calorie distribution."""
     try:
+        await refresh_menu_index(db)
+        health_profile = health_profile or {}
+        # Request restrictions and profile allergies are both hard limits
+        excluded_tags, required_tags = restriction_tags(dietary_restrictions)
+        excluded_tags |= normalize_tags(health_profile.get('allergies'))
+        preferred_tags = normalize_tags(health_profile.get('dietary_preferences'))
+
         menu_items = []
-        default_items = {
-            'breakfast': {
-                "name": "Healthy Breakfast Bowl",
-                "calories": "500 calories",  # Will be overridden by calculated values
-                "description": "Nutritious breakfast with whole grains and fresh fruits"
-            },
-            'lunch': {
-                "name": "Garden Fresh Plate",
-                "calories": "700 calories",  # Will be overridden by calculated values
-                "description": "Balanced lunch with lean protein and vegetables"
-            },
-            'dinner': {
-                "name": "Grilled Fish with Vegetables",
-                "calories": "600 calories",  # Will be overridden by calculated values
-                "description": "Light and nutritious dinner option with lean protein"
-            }
-        }
-        
+
+        def default_item(category):
+            # Defaults go through the same filter, so they never break the restrictions either
+            candidates = default_menu_index.items_for(default_menu_index.match(category, excluded_tags, required_tags))
+            if candidates:
+                menu_items.append({
+                    "name": f"{category.title()}: {candidates[0]['name']}",
+                    "calories": candidates[0]['calories'],
+                    "description": candidates[0]['description']
+                })
+
         for category in ['breakfast', 'lunch', 'dinner']:
             try:
-                # Get menu items for this category
-                query = {"category": category}
-                if dietary_restrictions:
-                    # Add dietary restrictions to query
-                    query["restrictions"] = {"$nin": dietary_restrictions}
-                    
-                cursor = db.menu_items.find(query)
-                category_items = await cursor.to_list(length=None)
+                # Get menu items for this category from the tag index
+                category_items = menu_index.items_for(
+                    menu_index.match(category, excluded_tags, required_tags | preferred_tags)
+                )
+                if not category_items and preferred_tags:
+                    # Preferences are soft, fall back to anything that is safe to eat
+                    category_items = menu_index.items_for(menu_index.match(category, excluded_tags, required_tags))
                 
-                if category_items:
+                selected_item = None
+                if category_items and calorie_targets:
+                    selected_item = rules_engine.closest_item(category_items, calorie_targets[category])
+                if category_items and selected_item is None:
                     # Select one item randomly
                     selected_item = random.choice(category_items)
+                
+                if selected_item:
                     menu_items.append({
+                        "menu_item_id": str(selected_item['_id']),
                         "name": f"{category.title()}: {selected_item['name']}",
-                        "calories": f"{selected_item['nutrition_info']['calories']} calories",
+                        "calories": nutrient_value("calories", (selected_item.get('nutrition_info') or {}).get('calories')),
                         "description": selected_item['description']
                     })
                 else:
                     # Use default item if no matching items found
-                    default_item = default_items[category]
-                    menu_items.append({
-                        "name": f"{category.title()}: {default_item['name']}",
-                        "calories": default_item['calories'],
-                        "description": default_item['description']
-                    })
+                    default_item(category)
             except Exception as e:
-                logger.error(f"Error processing {category} menu items: {str(e)}")
+                logger.error("Error processing %s menu items: %s", category, e)
                 # Use default item on error
-                default_item = default_items[category]
-                menu_items.append({
-                    "name": f"{category.title()}: {default_item['name']}",
-                    "calories": default_item['calories'],
-                    "description": default_item['description']
-                })
+                default_item(category)
     
         return menu_items
         
     except Exception as e:
-        logger.error(f"Error extracting menu items: {str(e)}")
+        logger.error("Error extracting menu items: %s", e)
         raise e
 
 def create_default_nutrition_goals() -> dict:
     """Create default nutrition goals."""
     return {
-        "Calories": "1800 kcal",
-        "Protein": "70g",
-        "Carbs": "220g",
-        "Fat": "60g"
+        "Calories": 1800,
+        "Protein": 70,
+        "Carbs": 220,
+        "Fat": 60
     }
 
 
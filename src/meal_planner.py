@@ -0,0 +1,198 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from dietary_tags import item_diet_tags, item_exclusion_tags
+from nutrition import MACROS, to_number
+
+# Share of the daily targets that each meal should cover
+MEAL_SPLIT = {
+    "breakfast": 0.3,
+    "lunch": 0.4,
+    "dinner": 0.3,
+}
+
+class CategoryMatrix:
+    """Menu items of one category laid out as numpy arrays for vectorized scoring."""
+
+    def __init__(self, items: List[dict]):
+        self.items = items
+        self.macros = np.array(
+            [[to_number(item.get("nutrition_info", {}).get(m)) for m in MACROS] for item in items],
+            dtype=np.float64,
+        ).reshape(len(items), len(MACROS))
+        self.price = np.array([to_number(item.get("price")) for item in items], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.items)
+
+    def serving_prices(self, usage: np.ndarray, max_repeats: int) -> np.ndarray:
+        """Sorted prices of every serving still allowed (each dish up to its repeats left)."""
+        return np.sort(np.repeat(self.price, np.maximum(max_repeats - usage, 0)))
+
+
+def filter_menu_items(menu_items: List[dict], excluded_tags: set, required_tags: set = None) -> List[dict]:
+    """
+    Drop menu items whose restrictions/allergens intersect the (normalized) excluded tags,
+    or that lack one of the required diet tags.
+    """
+    required_tags = required_tags or set()
+    if not excluded_tags and not required_tags:
+        return list(menu_items)
+    allowed = []
+    for item in menu_items:
+        if not item_exclusion_tags(item) & excluded_tags and required_tags <= item_diet_tags(item):
+            allowed.append(item)
+    return allowed
+
+
+def build_meal_plan(
+    menu_items: List[dict],
+    targets: Dict[str, float],
+    days: int = 7,
+    start_date: Optional[datetime] = None,
+    excluded_tags: set = None,
+    required_tags: set = None,
+    max_repeats: int = 2,
+    budget: Optional[float] = None,
+    tolerance: float = 0.1,
+    local_search_rounds: int = 3,
+    seed: Optional[int] = None,
+) -> List[dict]:
+    """
+    Build a multi-day meal plan from menu items.
+
+    Each day gets one breakfast, lunch and dinner. Meals are picked greedily against
+    the per-meal share of the targets, then improved by coordinate descent: every slot
+    is re-picked against the day totals of the other two slots, with all candidates of
+    a category scored at once.
+
+    `max_repeats` and the price budget (for the whole plan) are hard limits. A day's
+    picks must leave enough budget for the cheapest possible remaining days; within
+    that, spending above an even share per day is penalized. Raises ValueError when the
+    menu cannot meet them (too few dishes for the repeat limit, budget below the
+    cheapest plan), so a plan that breaks them is never returned.
+
+    Returns a list with one entry per day suitable for `DietPlan.meal_plan`.
+    """
+    start_date = start_date or datetime.now()
+    items = filter_menu_items(menu_items, excluded_tags or set(), required_tags)
+
+    matrices = {}
+    for category in MEAL_SPLIT:
+        category_items = [item for item in items if item.get("category") == category]
+        if category_items:
+            matrices[category] = CategoryMatrix(category_items)
+    if not matrices:
+        raise ValueError("No menu items available for the requested restrictions")
+    for category, matrix in matrices.items():
+        if len(matrix) * max_repeats < days:
+            raise ValueError(
+                f"Only {len(matrix)} {category} dishes available, not enough for {days} days "
+                f"with max_repeats={max_repeats}"
+            )
+
+    target_vector = np.array([float(targets.get(m, 0)) for m in MACROS], dtype=np.float64)
+    # Relative deviation on each macro, guarded against zero targets
+    scale = np.where(target_vector > 0, target_vector, 1.0)
+    daily_budget = budget / days if budget else None
+    rng = np.random.default_rng(seed)
+
+    usage = {category: np.zeros(len(matrix), dtype=np.int64) for category, matrix in matrices.items()}
+    remaining_budget = float(budget) if budget else np.inf
+    if budget:
+        cheapest = sum(float(m.serving_prices(usage[c], max_repeats)[:days].sum()) for c, m in matrices.items())
+        if cheapest > budget:
+            raise ValueError(f"Budget {budget:g} is below the cheapest possible plan ({cheapest:g})")
+    plan = []
+
+    for day in range(days):
+        # Tiny random jitter so that equally good dishes rotate between days
+        jitter = {c: rng.random(len(m)) * 1e-6 for c, m in matrices.items()}
+        picks = {}
+
+        # Budget rule: picking dish i leaves the cheapest later days costing base + floor
+        # (or base + price_i when i is pricier than floor, its serving being spent today).
+        # A day is affordable when the sum of spend(i) = max(price_i, floor) fits in `cap`.
+        days_after = days - day - 1
+        floors, cap = {}, remaining_budget
+        for category, matrix in matrices.items():
+            servings = matrix.serving_prices(usage[category], max_repeats)
+            floors[category] = servings[days_after]
+            cap -= servings[:days_after].sum()
+
+        def spend(category):
+            if category not in picks:
+                return floors[category]
+            return max(matrices[category].price[picks[category]], floors[category])
+
+        def slot_costs(category, other_macros, other_price):
+            matrix = matrices[category]
+            totals = matrix.macros + other_macros
+            cost = (((totals - target_vector) / scale) ** 2).sum(axis=1)
+            if daily_budget:
+                over = np.maximum(matrix.price + other_price - daily_budget, 0.0)
+                cost = cost + (over / daily_budget) ** 2 * 10
+            # Prefer dishes that have been served less often, ban the over-used ones
+            cost = cost + usage[category] * 0.05 + jitter[category]
+            cost = np.where(usage[category] >= max_repeats, np.inf, cost)
+            other_spend = sum(spend(c) for c in matrices if c != category)
+            affordable = np.maximum(matrix.price, floors[category]) + other_spend <= cap + 1e-6
+            return np.where(affordable, cost, np.inf)
+
+        # Greedy pass: each meal against its share of the daily targets. The cheapest
+        # allowed serving of every category always fits, so some candidate is left.
+        for category in matrices:
+            share = MEAL_SPLIT[category]
+            partial = target_vector * (1 - share)
+            cost = slot_costs(category, partial, (daily_budget or 0) * (1 - share))
+            picks[category] = int(np.argmin(cost))
+
+        # Local search: re-pick each slot given the rest of the day
+        for _ in range(local_search_rounds):
+            changed = False
+            for category in matrices:
+                others = [c for c in matrices if c != category]
+                other_macros = sum((matrices[c].macros[picks[c]] for c in others), np.zeros(len(MACROS)))
+                other_price = sum(matrices[c].price[picks[c]] for c in others)
+                cost = slot_costs(category, other_macros, other_price)
+                if np.isinf(cost).all():
+                    continue
+                best = int(np.argmin(cost))
+                if best != picks[category]:
+                    picks[category] = best
+                    changed = True
+            if not changed:
+                break
+
+        meals = []
+        totals = np.zeros(len(MACROS))
+        day_price = 0.0
+        for category in MEAL_SPLIT:
+            if category not in picks:
+                continue
+            matrix = matrices[category]
+            index = picks[category]
+            usage[category][index] += 1
+            item = matrix.items[index]
+            totals += matrix.macros[index]
+            day_price += float(matrix.price[index])
+            meals.append({
+                "category": category,
+                "menu_item_id": str(item.get("_id", item.get("id", ""))),
+                "name": item.get("name"),
+                **{m: float(matrix.macros[index][i]) for i, m in enumerate(MACROS)},
+                "price": float(matrix.price[index]),
+            })
+
+        deviation = np.abs(totals - target_vector) / scale
+        plan.append({
+            "date": (start_date + timedelta(days=day)).date().isoformat(),
+            "meals": meals,
+            "totals": {**{m: round(float(totals[i]), 1) for i, m in enumerate(MACROS)}, "price": round(day_price, 2)},
+            "within_tolerance": bool((deviation <= tolerance).all()),
+        })
+        remaining_budget -= day_price
+
+    return plan
@@ -0,0 +1,169 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from nutrition import to_number
+
+NAME_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", str(text or "").lower())
+
+
+def trigrams(text: str, prefix: bool = False) -> Set[str]:
+    """
+    Padded trigrams of every word in the text.
+
+    Words are padded with two leading spaces and one trailing space, so trigrams also
+    encode word starts and ends. With prefix=True the last word is left open at the end,
+    which lets a partially typed word match longer names (autocomplete).
+    """
+    words = _words(text)
+    grams = set()
+    for i, word in enumerate(words):
+        grams.update(_word_trigrams(word, prefix and i == len(words) - 1))
+    return grams
+
+
+@lru_cache(maxsize=65536)
+def _word_trigrams(word: str, open_end: bool) -> tuple:
+    padded = f"  {word}" if open_end else f"  {word} "
+    return tuple(padded[j:j + 3] for j in range(len(padded) - 2))
+
+
+class SearchIndex:
+    """
+    In-process trigram index over menu item names and descriptions.
+
+    Postings map each trigram to the slots of the items containing it. A query scores all
+    items at once by adding into a per-slot array, then applies the category and calorie
+    filters as numpy masks. Updated items get a new slot and the old one is masked out;
+    a rebuild compacts everything again.
+    """
+
+    def __init__(self):
+        self.items: List[Optional[Dict[str, Any]]] = []
+        self.slots: Dict[str, int] = {}
+        self.name_postings: Dict[str, List[int]] = {}
+        self.description_postings: Dict[str, List[int]] = {}
+        self._arrays: Dict[tuple, np.ndarray] = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.calories = np.zeros(0, dtype=np.float64)
+        self.category_codes = np.zeros(0, dtype=np.int32)
+        self.categories: Dict[str, int] = {}
+        self.version = None
+
+    def __len__(self):
+        return len(self.slots)
+
+    def rebuild(self, items: Iterable[Dict[str, Any]], version=None):
+        self.__init__()
+        items = list(items)
+        self._grow(len(items))
+        for item in items:
+            self._add(item, invalidate=False)
+        self.version = version
+
+    def _grow(self, extra: int):
+        size = len(self.items) + extra
+        if size <= len(self.alive):
+            return
+        capacity = max(size, len(self.alive) * 2, 64)
+        for name in ("alive", "calories", "category_codes"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _add(self, item: Dict[str, Any], invalidate: bool = True):
+        slot = len(self.items)
+        self.items.append(item)
+        self.slots[str(item.get("_id", item.get("id")))] = slot
+        self.alive[slot] = True
+        self.calories[slot] = to_number((item.get("nutrition_info") or {}).get("calories"), default=np.nan)
+        category = str(item.get("category", "")).lower()
+        self.category_codes[slot] = self.categories.setdefault(category, len(self.categories))
+
+        for field, postings in (("name", self.name_postings), ("description", self.description_postings)):
+            for gram in trigrams(item.get(field, "")):
+                postings.setdefault(gram, []).append(slot)
+                if invalidate:
+                    self._arrays.pop((field, gram), None)
+
+    def upsert(self, item: Dict[str, Any]):
+        self.remove(str(item.get("_id", item.get("id"))))
+        self._grow(1)
+        self._add(item)
+
+    def remove(self, item_id: str):
+        slot = self.slots.pop(str(item_id), None)
+        if slot is not None:
+            self.alive[slot] = False
+            self.items[slot] = None
+
+    def _postings(self, field: str, gram: str) -> Optional[np.ndarray]:
+        key = (field, gram)
+        array = self._arrays.get(key)
+        if array is None:
+            postings = (self.name_postings if field == "name" else self.description_postings).get(gram)
+            if postings is None:
+                return None
+            array = self._arrays[key] = np.array(postings, dtype=np.int64)
+        return array
+
+    def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        min_calories: Optional[float] = None,
+        max_calories: Optional[float] = None,
+        limit: int = 10,
+        min_similarity: float = 0.5,
+    ) -> List[Dict[str, Any]]:
+        """Best matching items for a (possibly misspelled or partial) query, with scores."""
+        grams = trigrams(query, prefix=True)
+        if not grams or not self.slots:
+            return []
+
+        size = len(self.items)
+        name_hits = np.zeros(size, dtype=np.float64)
+        description_hits = np.zeros(size, dtype=np.float64)
+        for gram in grams:
+            postings = self._postings("name", gram)
+            if postings is not None:
+                name_hits[postings] += 1
+            postings = self._postings("description", gram)
+            if postings is not None:
+                description_hits[postings] += 1
+
+        mask = self.alive[:size] & (np.maximum(name_hits, description_hits) >= min_similarity * len(grams))
+        if category is not None:
+            code = self.categories.get(category.lower())
+            if code is None:
+                return []
+            mask &= self.category_codes[:size] == code
+        if min_calories is not None:
+            mask &= self.calories[:size] >= min_calories
+        if max_calories is not None:
+            mask &= self.calories[:size] <= max_calories
+
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return []
+        scores = (name_hits[candidates] * NAME_WEIGHT + description_hits[candidates] * DESCRIPTION_WEIGHT) / (
+            len(grams) * (NAME_WEIGHT + DESCRIPTION_WEIGHT)
+        )
+        if len(candidates) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        return [
+            {**self.items[candidates[i]], "score": round(float(scores[i]), 3)}
+            for i in top
+        ]
@@ -0,0 +1,231 @@
+"""
+Numeric nutrition values, their range queries and the migration of old documents.
+
+Nutrition is stored and passed around as numbers: calories as an int, protein, carbs
+and fat in grams. Units are only added where values are displayed. Documents written
+before this used display strings ("350 calories", "2000 kcal", "75g"); the migration
+converts them in place, streaming and in unordered bulk_write batches. It also lowercases
+menu item categories, which are stored lowercase like the filters look them up.
+
+Migration CLI (from src/): python nutrition.py [--batch-size 500] [--dry-run]
+"""
+import argparse
+import asyncio
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from http_cache import bump_version, diet_plans_key, menu_items_key
+
+MACROS = ["calories", "protein", "carbs", "fat"]
+
+# Keys of the nutritionGoals object in recommendation responses
+GOAL_KEYS = {"Calories": "calories", "Protein": "protein", "Carbs": "carbs", "Fat": "fat"}
+
+# Compound indexes behind the category + macro range filters of GET /menu-items
+MENU_ITEM_INDEXES = [
+    [("category", 1), ("nutrition_info.calories", 1)],
+    [("category", 1), ("nutrition_info.protein", 1)],
+]
+
+
+# Migration errors listed in the report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+_NUMBER = re.compile(r"-?\d{1,3}(?:,\d{3})+(?:\.\d+)?|-?\d+(?:\.\d+)?")
+
+
+def parse_number(value) -> float:
+    """
+    Numeric value of a number or a display string ("350 calories", "1,200 kcal", "75g").
+
+    Raises ValueError when the value holds no number, rather than reading it as 0.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = _NUMBER.search(value)
+        if match:
+            return float(match.group().replace(",", ""))
+    raise ValueError(f"not a number: {value!r}")
+
+
+def to_number(value, default: float = 0.0) -> float:
+    """Read a stored numeric value leniently: the default when parse_number rejects it."""
+    try:
+        return parse_number(value)
+    except ValueError:
+        return default
+
+
+def normalize_category(category: Any) -> str:
+    """Menu categories are stored and queried lowercase ("Lunch " -> "lunch")."""
+    return str(category).strip().lower()
+
+
+def nutrient_value(name: str, value: Any) -> float:
+    """Numeric value of one nutrient: whole calories, grams to one decimal. Raises ValueError if invalid."""
+    number = parse_number(value)
+    return int(round(number)) if name == "calories" else round(number, 1)
+
+
+def numeric_nutrition(info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """nutrition_info with every macro as a number; other keys are kept as they are."""
+    info = dict(info or {})
+    for name in MACROS:
+        if name in info:
+            info[name] = nutrient_value(name, info[name])
+    return info
+
+
+def numeric_goals(goals: Dict[str, Any]) -> Dict[str, int]:
+    """nutritionGoals with whole-number values ("2000 kcal" -> 2000). Raises ValueError if one is invalid."""
+    return {key: int(round(parse_number(value))) for key, value in goals.items()}
+
+
+def range_query(category: Optional[str] = None, **bounds: Optional[float]) -> Dict[str, Any]:
+    """
+    Mongo filter for a category and macro ranges given as min_<macro>/max_<macro>.
+
+    The category equality comes first so the (category, macro) indexes serve it.
+    """
+    query: Dict[str, Any] = {}
+    if category:
+        query["category"] = normalize_category(category)
+    for key, value in bounds.items():
+        if value is None:
+            continue
+        bound, _, name = key.partition("_")
+        if bound not in ("min", "max") or name not in MACROS:
+            raise ValueError(f"Unknown nutrition filter: {key}")
+        query.setdefault(f"nutrition_info.{name}", {})["$gte" if bound == "min" else "$lte"] = value
+    return query
+
+
+async def ensure_indexes(db):
+    for keys in MENU_ITEM_INDEXES:
+        await db.menu_items.create_index(keys)
+
+
+_OLD_MENU_ITEMS = {
+    "$or": [{f"nutrition_info.{name}": {"$type": "string"}} for name in MACROS]
+    + [{"category": {"$regex": r"[A-Z]|^\s|\s$"}}]
+}
+
+_STRING_PLAN_NUTRITION = {
+    "$or": [{f"recommendations.nutritionGoals.{key}": {"$type": "string"}} for key in GOAL_KEYS]
+    + [{"recommendations.menuItems.calories": {"$type": "string"}}]
+}
+
+
+def _menu_update(item: Dict[str, Any]) -> Dict[str, Any]:
+    update = {"nutrition_info": numeric_nutrition(item.get("nutrition_info"))}
+    if isinstance(item.get("category"), str):
+        update["category"] = normalize_category(item["category"])
+    return update
+
+
+def _plan_update(plan: Dict[str, Any]) -> Dict[str, Any]:
+    recommendations = plan.get("recommendations") or {}
+    update = {}
+    if recommendations.get("nutritionGoals"):
+        update["recommendations.nutritionGoals"] = numeric_goals(recommendations["nutritionGoals"])
+    if recommendations.get("menuItems"):
+        update["recommendations.menuItems"] = [
+            {**item, "calories": nutrient_value("calories", item.get("calories"))} if "calories" in item else item
+            for item in recommendations["menuItems"]
+        ]
+    return update
+
+
+async def _flush(collection, batch: List[UpdateOne], report: Dict[str, int], dry_run: bool):
+    if not batch:
+        return
+    if dry_run:
+        report["modified"] += len(batch)
+        return
+    result = await collection.bulk_write(batch, ordered=False)
+    report["modified"] += result.modified_count
+
+
+async def migrate_collection(collection, query: Dict[str, Any], projection: Dict[str, int], make_update,
+                             batch_size: int = 500, dry_run: bool = False, on_document=None) -> Dict[str, int]:
+    """
+    Stream the documents matching query and $set the fields returned by make_update.
+
+    A document make_update rejects with ValueError is left as it is and reported as failed.
+    """
+    report = {"scanned": 0, "modified": 0, "failed": 0, "errors": []}
+    batch: List[UpdateOne] = []
+    async for document in collection.find(query, projection).batch_size(batch_size):
+        report["scanned"] += 1
+        try:
+            update = make_update(document)
+        except ValueError as e:
+            report["failed"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append({"_id": str(document["_id"]), "error": str(e)})
+            continue
+        if not update:
+            continue
+        batch.append(UpdateOne({"_id": document["_id"]}, {"$set": update}))
+        if on_document:
+            on_document(document)
+        if len(batch) >= batch_size:
+            await _flush(collection, batch, report, dry_run)
+            batch = []
+    await _flush(collection, batch, report, dry_run)
+    return report
+
+
+async def migrate(db, batch_size: int = 500, dry_run: bool = False) -> Dict[str, Dict[str, int]]:
+    """Convert string nutrition values (and menu categories) in menu_items and diet_plans, then invalidate their caches."""
+    menu_report = await migrate_collection(
+        db.menu_items,
+        _OLD_MENU_ITEMS,
+        {"nutrition_info": 1, "category": 1},
+        _menu_update,
+        batch_size=batch_size,
+        dry_run=dry_run
+    )
+
+    touched_users = set()
+    plan_report = await migrate_collection(
+        db.diet_plans,
+        _STRING_PLAN_NUTRITION,
+        {"user_id": 1, "recommendations.nutritionGoals": 1, "recommendations.menuItems": 1},
+        _plan_update,
+        batch_size=batch_size,
+        dry_run=dry_run,
+        on_document=lambda plan: touched_users.add(plan.get("user_id"))
+    )
+
+    if not dry_run:
+        if menu_report["scanned"]:
+            await bump_version(db, menu_items_key())
+        for user_id in touched_users:
+            await bump_version(db, diet_plans_key(user_id))
+        await ensure_indexes(db)
+    return {"menu_items": menu_report, "diet_plans": plan_report}
+
+
+async def _main(args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from starlette.config import Config
+
+    mongo_url = Config(".env")("MONGO_URL", cast=str)
+    client = AsyncIOMotorClient(mongo_url)
+    try:
+        report = await migrate(client.dietary_catering, batch_size=args.batch_size, dry_run=args.dry_run)
+        print(json.dumps(report, indent=2))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert string nutrition values to numbers")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Only count the documents that would change")
+    asyncio.run(_main(parser.parse_args()))
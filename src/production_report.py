@@ -0,0 +1,137 @@
+import csv
+import io
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+SUMMARY_COLLECTION = "production_summary"
+
+# Planned meals of one diet_plans document as {date, dish, category} entries.
+# Generated plans carry dated meals in meal_plan; /recommendations stores one day of
+# "Category: Dish" items under recommendations.menuItems, dated by generated_at.
+_ENTRIES_EXPRESSION = {
+    "$concatArrays": [
+        {
+            "$reduce": {
+                "input": {"$ifNull": ["$meal_plan", []]},
+                "initialValue": [],
+                "in": {
+                    "$concatArrays": [
+                        "$$value",
+                        {
+                            "$map": {
+                                "input": {"$ifNull": ["$$this.meals", []]},
+                                "as": "meal",
+                                "in": {
+                                    "date": "$$this.date",
+                                    "dish": "$$meal.name",
+                                    "category": "$$meal.category"
+                                }
+                            }
+                        }
+                    ]
+                }
+            }
+        },
+        {
+            "$map": {
+                "input": {"$ifNull": ["$recommendations.menuItems", []]},
+                "as": "item",
+                "in": {
+                    "date": {"$substrCP": ["$recommendations.generated_at", 0, 10]},
+                    "dish": {"$trim": {"input": {"$arrayElemAt": [{"$split": ["$$item.name", ":"]}, -1]}}},
+                    "category": {"$toLower": {"$trim": {"input": {"$arrayElemAt": [{"$split": ["$$item.name", ":"]}, 0]}}}}
+                }
+            }
+        }
+    ]
+}
+
+PRODUCTION_PIPELINE = [
+    {"$project": {"entries": _ENTRIES_EXPRESSION}},
+    {"$unwind": "$entries"},
+    {"$match": {"entries.date": {"$type": "string"}, "entries.dish": {"$type": "string"}}},
+    {
+        "$group": {
+            "_id": {"date": "$entries.date", "dish": "$entries.dish", "category": "$entries.category"},
+            "portions": {"$sum": 1}
+        }
+    }
+]
+
+
+def plan_entries(plan: Optional[Dict[str, Any]]) -> List[Tuple[str, str, Optional[str]]]:
+    """Python twin of the pipeline's entry extraction, used for incremental updates."""
+    if not plan:
+        return []
+    entries = []
+    for day in plan.get("meal_plan") or []:
+        for meal in day.get("meals") or []:
+            entries.append((day.get("date"), meal.get("name"), meal.get("category")))
+
+    recommendations = plan.get("recommendations") or {}
+    generated_at = str(recommendations.get("generated_at") or "")[:10]
+    for item in recommendations.get("menuItems") or []:
+        parts = item.get("name", "").split(":")
+        entries.append((generated_at, parts[-1].strip(), parts[0].strip().lower()))
+
+    return [entry for entry in entries if isinstance(entry[0], str) and entry[0] and isinstance(entry[1], str)]
+
+
+async def apply_plan_change(db, old_plan: Optional[Dict[str, Any]], new_plan: Optional[Dict[str, Any]]):
+    """Apply the portion difference between the old and new version of a plan to the summary."""
+    delta = Counter(plan_entries(new_plan))
+    delta.subtract(Counter(plan_entries(old_plan)))
+    operations = [
+        UpdateOne(
+            {"_id": {"date": date, "dish": dish, "category": category}},
+            {"$inc": {"portions": count}},
+            upsert=True
+        )
+        for (date, dish, category), count in delta.items() if count
+    ]
+    if operations:
+        await db[SUMMARY_COLLECTION].bulk_write(operations, ordered=False)
+
+
+async def rebuild_summary(db):
+    """Recompute the whole summary from diet_plans, e.g. after a backfill or data repair."""
+    await db.diet_plans.aggregate(PRODUCTION_PIPELINE + [{"$out": SUMMARY_COLLECTION}]).to_list(length=None)
+    await ensure_indexes(db)
+
+
+async def ensure_indexes(db):
+    await db[SUMMARY_COLLECTION].create_index([("_id.date", 1), ("_id.category", 1)])
+
+
+def report_query(start_date: Optional[str], end_date: Optional[str], category: Optional[str] = None) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"portions": {"$gt": 0}}
+    if start_date or end_date:
+        query["_id.date"] = {}
+        if start_date:
+            query["_id.date"]["$gte"] = start_date
+        if end_date:
+            query["_id.date"]["$lte"] = end_date
+    if category:
+        query["_id.category"] = category.lower()
+    return query
+
+
+def report_row(document: Dict[str, Any]) -> Dict[str, Any]:
+    return {**document["_id"], "portions": document["portions"]}
+
+
+async def iter_report_csv(cursor) -> AsyncIterator[str]:
+    """Stream report rows as CSV text, one line at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["date", "category", "dish", "portions"])
+    async for document in cursor:
+        row = report_row(document)
+        writer.writerow([row["date"], row["category"], row["dish"], row["portions"]])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.getvalue():
+        yield buffer.getvalue()
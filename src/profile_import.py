@@ -0,0 +1,350 @@
+"""
+Streaming bulk import of user health profiles from CSV or NDJSON.
+
+Rows are parsed one at a time, validated against the shape written by /update-profile
+and upserted by email in unordered bulk_write batches, so memory stays flat no matter
+how large the file is.
+
+CLI usage (from src/): python profile_import.py employees.csv [--format ndjson] [--batch-size 1000]
+"""
+import argparse
+import asyncio
+import csv
+import json
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from dietary_tags import normalize_tags
+
+LIST_FIELDS = ["medical_conditions", "allergies", "dietary_preferences"]
+# Stored as canonical tags, the same way /update-profile stores them
+TAG_FIELDS = {"allergies", "dietary_preferences"}
+MAX_REPORTED_ERRORS = 1000
+# A CSV record (including quoted newlines) longer than this is reported as broken
+MAX_RECORD_CHARS = 1 << 20
+
+
+def _split_list(value) -> List[str]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).split(",") if v.strip()]
+
+
+def row_to_user(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate one imported row and build the user document fields.
+
+    Accepts flat rows (CSV, or NDJSON with top-level age/weight/...) as well as NDJSON
+    rows with a nested health_profile. Raises ValueError describing the first problem.
+    """
+    email = str(row.get("email") or "").strip().lower()
+    if "@" not in email:
+        raise ValueError("missing or invalid email")
+
+    profile = row.get("health_profile") or row
+    try:
+        age = int(profile.get("age") or 0)
+        weight = float(profile.get("weight") or 0)
+        height = float(profile.get("height") or 0)
+    except (TypeError, ValueError):
+        raise ValueError("age, weight and height must be numbers")
+    if age < 0 or weight < 0 or height < 0:
+        raise ValueError("age, weight and height must not be negative")
+
+    lists = {field: _split_list(profile.get(field)) for field in LIST_FIELDS}
+    for field in TAG_FIELDS:
+        lists[field] = sorted(normalize_tags(lists[field]))
+
+    return {
+        "name": str(row.get("name") or "").strip(),
+        "email": email,
+        "phone": str(row.get("phone") or "").strip(),
+        "health_profile": {
+            "age": age,
+            "weight": weight,
+            "height": height,
+            **lists
+        }
+    }
+
+
+def _decode(line: bytes) -> Optional[str]:
+    try:
+        return line.decode("utf-8-sig").rstrip("\r")
+    except UnicodeDecodeError:
+        return None
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[Optional[str]]:
+    """
+    Split a byte stream into decoded lines without holding more than one line.
+
+    Lines that are not valid UTF-8 are yielded as None, for iter_rows to report.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield _decode(line)
+    if buffer:
+        yield _decode(buffer)
+
+
+class _QuoteState:
+    """
+    Whether a CSV record is still inside a quoted field, fed one line at a time.
+
+    Follows the csv module's default dialect: a quote only opens a quoted field at the
+    start of a field ("" inside one is an escaped quote), so a stray quote in an unquoted
+    field such as 5" tall does not swallow the following lines.
+    """
+
+    def __init__(self):
+        self.in_quotes = False
+        self.field_start = True
+        self.quote_seen = False
+
+    def feed(self, line: str) -> bool:
+        """Scan one more line of the record; True once the record is complete."""
+        for char in line:
+            if self.in_quotes:
+                if self.quote_seen:
+                    # "" is an escaped quote, anything else closed the field
+                    self.quote_seen = False
+                    self.in_quotes = char == '"'
+                    if not self.in_quotes:
+                        self.field_start = char == ","
+                elif char == '"':
+                    self.quote_seen = True
+            elif char == '"' and self.field_start:
+                self.in_quotes = True
+                self.field_start = False
+            else:
+                self.field_start = char == ","
+        if self.quote_seen:
+            # The line ended right after a closing quote
+            self.in_quotes = self.quote_seen = False
+        self.field_start = True
+        return not self.in_quotes
+
+
+class _CsvRecords:
+    """
+    Join CSV lines into records, where a quoted field may span several lines.
+
+    A quote still open at the end of the input, or past MAX_RECORD_CHARS, is reported as
+    a broken record made of its first line only. The lines after that one are read again
+    as records of their own, so one stray quote costs one row instead of the rest of the file.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Drop the record being read."""
+        self.lines: List[str] = []
+        self.chars = 0
+        self.quotes = _QuoteState()
+
+    def _resync(self) -> List[str]:
+        rest = self.lines[1:]
+        self.reset()
+        return rest
+
+    def feed(self, line: str) -> Iterator[Tuple[Optional[str], Optional[str]]]:
+        """Yield (record, None) for each record the line completes and (None, error) for a broken one."""
+        pending = deque([line])
+        while pending:
+            line = pending.popleft()
+            self.lines.append(line)
+            self.chars += len(line) + 1
+            if self.quotes.feed(line):
+                record = "\n".join(self.lines)
+                self.reset()
+                yield record, None
+            elif self.chars > MAX_RECORD_CHARS:
+                pending.extendleft(reversed(self._resync()))
+                yield None, "unterminated quoted field"
+
+    def finish(self) -> Iterator[Tuple[Optional[str], Optional[str]]]:
+        """Yield what is left at the end of the input."""
+        while self.lines:
+            rest = self._resync()
+            yield None, "unterminated quoted field"
+            for line in rest:
+                yield from self.feed(line)
+
+
+async def iter_rows(lines: AsyncIterable[str], fmt: str) -> AsyncIterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """Yield (row_number, row, parse_error) for every data row of a CSV or NDJSON stream."""
+    row_number = 0
+    if fmt == "ndjson":
+        async for line in lines:
+            if line is None:
+                row_number += 1
+                yield row_number, None, "invalid UTF-8"
+                continue
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("row is not a JSON object")
+                yield row_number, row, None
+            except ValueError as e:
+                yield row_number, None, f"invalid JSON: {str(e)}"
+        return
+
+    header = None
+
+    def csv_row(record: Optional[str], error: Optional[str]):
+        nonlocal header, row_number
+        if error:
+            row_number += 1
+            return row_number, None, error
+        if not record.strip():
+            return None
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [h.strip().lower() for h in values]
+            return None
+        row_number += 1
+        if len(values) != len(header):
+            return row_number, None, f"expected {len(header)} columns, got {len(values)}"
+        return row_number, dict(zip(header, values)), None
+
+    records = _CsvRecords()
+    async for line in lines:
+        if line is None:
+            # Drops the record it belongs to, if any
+            row_number += 1
+            yield row_number, None, "invalid UTF-8"
+            records.reset()
+            continue
+        for record, error in records.feed(line):
+            row = csv_row(record, error)
+            if row:
+                yield row
+    for record, error in records.finish():
+        row = csv_row(record, error)
+        if row:
+            yield row
+
+
+class ImportReport:
+    """Running totals of an import, with a capped list of per-row errors."""
+
+    def __init__(self):
+        self.processed = 0
+        self.upserted = 0
+        self.modified = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row_number: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "error": message})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "processed": self.processed,
+            "upserted": self.upserted,
+            "modified": self.modified,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors)
+        }
+
+
+async def _flush(collection, batch: List[UpdateOne], row_numbers: List[int], report: ImportReport):
+    try:
+        result = await collection.bulk_write(batch, ordered=False)
+        report.upserted += result.upserted_count
+        report.modified += result.modified_count
+    except BulkWriteError as e:
+        details = e.details
+        report.upserted += details.get("nUpserted", 0)
+        report.modified += details.get("nModified", 0)
+        for error in details.get("writeErrors", []):
+            report.add_error(row_numbers[error["index"]], error.get("errmsg", "write failed"))
+
+
+async def import_profiles(collection, rows: AsyncIterable, batch_size: int = 1000) -> Dict[str, Any]:
+    """Validate rows from iter_rows and upsert them into the users collection by email."""
+    report = ImportReport()
+    batch, row_numbers = [], []
+
+    async for row_number, row, parse_error in rows:
+        report.processed += 1
+        if parse_error:
+            report.add_error(row_number, parse_error)
+            continue
+        try:
+            user_data = row_to_user(row)
+        except ValueError as e:
+            report.add_error(row_number, str(e))
+            continue
+
+        now = datetime.now()
+        batch.append(UpdateOne(
+            {"email": user_data["email"]},
+            {"$set": {**user_data, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+            upsert=True
+        ))
+        row_numbers.append(row_number)
+
+        if len(batch) >= batch_size:
+            await _flush(collection, batch, row_numbers, report)
+            batch, row_numbers = [], []
+
+    if batch:
+        await _flush(collection, batch, row_numbers, report)
+
+    return report.to_dict()
+
+
+def detect_format(name: str, content_type: str = "") -> str:
+    if "ndjson" in content_type or "jsonl" in content_type or name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return "csv"
+
+
+async def _file_chunks(path: str, chunk_size: int = 1 << 16):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+async def _main(args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from starlette.config import Config
+
+    mongo_url = Config(".env")("MONGO_URL", cast=str)
+    client = AsyncIOMotorClient(mongo_url)
+    try:
+        fmt = args.format or detect_format(args.path)
+        rows = iter_rows(iter_lines(_file_chunks(args.path)), fmt)
+        report = await import_profiles(client.dietary_catering.users, rows, batch_size=args.batch_size)
+        print(json.dumps(report, indent=2))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import user health profiles")
+    parser.add_argument("path", help="CSV or NDJSON file")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,111 @@
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+from settings import load_json_overrides
+
+logger = logging.getLogger(__name__)
+
+ROUTE_CATALOG = "catalog"
+ROUTE_HISTORY = "history"
+ROUTE_PROFILE = "profile"
+
+_MODES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+# The driver rejects maxStalenessSeconds below 90
+MIN_MAX_STALENESS = 90
+
+
+class ReadRoute:
+    """Read preference and read concern for one class of endpoints."""
+
+    def __init__(self, name: str, mode: str = "primary", max_staleness: int = -1, read_concern: Optional[str] = None):
+        if mode not in _MODES:
+            raise ValueError(f"Unknown read preference mode: {mode}")
+        if mode == "primary" and max_staleness != -1:
+            raise ValueError("max_staleness cannot be used with the primary read preference")
+        if max_staleness != -1 and max_staleness < MIN_MAX_STALENESS:
+            raise ValueError(f"max_staleness must be -1 or at least {MIN_MAX_STALENESS} seconds")
+        self.name = name
+        self.mode = mode
+        self.max_staleness = max_staleness
+        self.read_concern = read_concern
+
+    @classmethod
+    def from_dict(cls, name: str, data: Dict[str, Any]) -> "ReadRoute":
+        return cls(
+            name,
+            mode=data.get("mode", "primary"),
+            max_staleness=int(data.get("max_staleness", -1)),
+            read_concern=data.get("read_concern"),
+        )
+
+    def read_preference(self):
+        if self.mode == "primary":
+            return Primary()
+        return _MODES[self.mode](max_staleness=self.max_staleness)
+
+    def describe(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "max_staleness": self.max_staleness, "read_concern": self.read_concern or "default"}
+
+
+# Catalog and plan history tolerate a couple of minutes of lag; profile paths must read
+# their own writes, so they stay on the primary. Secondary routes read "majority" so
+# consistent_reads() sessions are causally consistent across members.
+DEFAULT_READ_ROUTES = {
+    ROUTE_CATALOG: ReadRoute(ROUTE_CATALOG, "secondaryPreferred", max_staleness=120, read_concern="majority"),
+    ROUTE_HISTORY: ReadRoute(ROUTE_HISTORY, "secondaryPreferred", max_staleness=120, read_concern="majority"),
+    ROUTE_PROFILE: ReadRoute(ROUTE_PROFILE, "primary", read_concern="local"),
+}
+
+
+def load_routes(raw: str, defaults: Dict[str, ReadRoute]) -> Dict[str, ReadRoute]:
+    """
+    Parse the READ_ROUTING setting on top of the defaults.
+
+    READ_ROUTING is a JSON object of route name to {"mode", "max_staleness", "read_concern"},
+    e.g. {"catalog": {"mode": "nearest", "max_staleness": 90}} or {"history": {"mode": "primary"}}.
+    """
+    return load_json_overrides("READ_ROUTING", raw, defaults, ReadRoute.from_dict)
+
+
+class ReadRouter:
+    """Hands out database handles carrying the read preference and read concern of a route."""
+
+    def __init__(self, routes: Dict[str, ReadRoute]):
+        self.routes = routes
+
+    def database(self, db, route: Optional[str]):
+        """The same database with the route's options; unknown or missing routes read from the primary."""
+        config = self.routes.get(route) if route else None
+        if config is None:
+            return db
+        return db.client.get_database(
+            db.name,
+            read_preference=config.read_preference(),
+            read_concern=ReadConcern(config.read_concern) if config.read_concern else None,
+        )
+
+    @asynccontextmanager
+    async def consistent_reads(self, db):
+        """
+        Causally consistent session for reading a version and then the data it describes.
+
+        Each read in the session waits until its member has caught up with what the previous
+        read saw, so the data is never older than the version read before it, even when the
+        two reads are served by different secondaries.
+        """
+        async with await db.client.start_session(causal_consistency=True) as session:
+            yield session
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: route.describe() for name, route in self.routes.items()}
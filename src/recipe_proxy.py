@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamError(Exception):
+    """The recipe service failed or timed out; status_code is what the proxy should return."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def normalize_recipe_request(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Canonical request so that "Rice, egg" and "egg,rice " share one cache entry.
+
+    Raises ValueError for a body that is not a JSON object with ingredients as a list or string.
+    """
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be a JSON object")
+    ingredients = body.get("ingredients") or []
+    if isinstance(ingredients, str):
+        ingredients = ingredients.split(",")
+    elif not isinstance(ingredients, list):
+        raise ValueError("ingredients must be a list or a comma separated string")
+    normalized = sorted({str(i).strip().lower() for i in ingredients if str(i).strip()})
+    if not normalized:
+        raise ValueError("At least one ingredient is required")
+    return {"ingredients": normalized}
+
+
+class RecipeProxy:
+    """
+    Cached, coalescing proxy in front of the external recipe generator.
+
+    Responses are cached per normalized request for `ttl` seconds. For another
+    `stale_ttl` seconds a stale entry is still served immediately while one background
+    request refreshes it. Concurrent identical misses share a single upstream call.
+    Without a server api_key, callers' own keys are forwarded and entries are kept per
+    key, so no caller gets a response fetched with someone else's key.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        api_key: str = "",
+        ttl: float = 600.0,
+        stale_ttl: float = 3600.0,
+        max_entries: int = 1000,
+        timeout: float = 15.0,
+        max_connections: int = 20,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.url = url
+        self.api_key = api_key
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def start(self):
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            transport=self.transport
+        )
+
+    async def stop(self):
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(self, body: Dict[str, Any], api_key: Optional[str] = None) -> Any:
+        request = normalize_recipe_request(body)
+        key = self._cache_key(request, api_key)
+        entry = self._cache.get(key)
+
+        if entry:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return entry[1]
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    self._fetch(key, request, api_key).add_done_callback(_log_refresh_failure)
+                return entry[1]
+
+        if key in self._inflight:
+            self.coalesced += 1
+            return await asyncio.shield(self._inflight[key])
+
+        self.misses += 1
+        return await asyncio.shield(self._fetch(key, request, api_key))
+
+    def _cache_key(self, request: Dict[str, Any], api_key: Optional[str]) -> str:
+        key = json.dumps(request, sort_keys=True)
+        if self.api_key or not api_key:
+            # Every upstream call uses the same key (or none)
+            return key
+        return hashlib.sha256(api_key.encode()).hexdigest() + ":" + key
+
+    def _fetch(self, key: str, request: Dict[str, Any], api_key: Optional[str]) -> asyncio.Future:
+        task = asyncio.ensure_future(self._call_upstream(key, request, api_key))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finished(key, done))
+        return task
+
+    def _finished(self, key: str, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        # Mark the exception as retrieved in case every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    async def _call_upstream(self, key: str, request: Dict[str, Any], api_key: Optional[str]) -> Any:
+        if self._client is None:
+            await self.start()
+        headers = {"Content-Type": "application/json"}
+        if self.api_key or api_key:
+            headers["X-API-Key"] = self.api_key or api_key
+        try:
+            response = await self._client.post(self.url, json=request, headers=headers)
+            response.raise_for_status()
+            data = response.json()
+        except httpx.TimeoutException:
+            self.errors += 1
+            raise UpstreamError(504, "Recipe service timed out")
+        except httpx.HTTPStatusError as e:
+            self.errors += 1
+            raise UpstreamError(502, f"Recipe service returned {e.response.status_code}")
+        except (httpx.HTTPError, ValueError) as e:
+            self.errors += 1
+            raise UpstreamError(502, f"Recipe service unavailable: {str(e)}")
+
+        self._cache[key] = (time.monotonic(), data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return data
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors
+        }
+
+
+def _log_refresh_failure(task: asyncio.Future):
+    """Background refreshes keep serving stale data on failure; just log it."""
+    if not task.cancelled() and task.exception():
+        logger.warning("Background recipe refresh failed: %s", task.exception())
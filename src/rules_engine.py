@@ -0,0 +1,206 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from nutrition import to_number
+
+# Advice templates. Placeholders are filled from the calculated nutrition goals and profile.
+TARGETS_TEMPLATE = "• Aim for about {calories} kcal per day: {protein}g protein, {carbs}g carbs and {fat}g fat"
+HYDRATION_TEMPLATE = "• Drink around {water} liters of water a day, more on training days"
+
+# Words (or runs of words) in free-text medical conditions, mapped to one advice key. They
+# match whole words only, so "heartburn" is not "heart" and "adrenal" is not "renal".
+CONDITION_KEYWORDS = [
+    ("diabetes", "diabetes"),
+    ("diabetic", "diabetes"),
+    ("prediabetes", "diabetes"),
+    ("blood_sugar", "diabetes"),
+    ("hypertension", "hypertension"),
+    ("high_blood_pressure", "hypertension"),
+    ("darah_tinggi", "hypertension"),
+    ("cholesterol", "cholesterol"),
+    ("kolesterol", "cholesterol"),
+    ("heartburn", "gerd"),
+    ("heart", "heart_disease"),
+    ("jantung", "heart_disease"),
+    ("cardiac", "heart_disease"),
+    ("cardiovascular", "heart_disease"),
+    ("coronary", "heart_disease"),
+    ("kidney", "kidney_disease"),
+    ("ginjal", "kidney_disease"),
+    ("renal", "kidney_disease"),
+    ("gout", "gout"),
+    ("asam_urat", "gout"),
+    ("uric_acid", "gout"),
+    ("gerd", "gerd"),
+    ("reflux", "gerd"),
+    ("maag", "gerd"),
+    ("gastritis", "gerd"),
+    ("anemia", "anemia"),
+    ("anaemia", "anemia"),
+    ("anemic", "anemia"),
+    ("obese", "obesity"),
+    ("obesity", "obesity"),
+    ("celiac", "celiac"),
+    ("coeliac", "celiac"),
+    ("ibs", "ibs"),
+    ("irritable_bowel", "ibs"),
+    ("pregnant", "pregnancy"),
+    ("pregnancy", "pregnancy"),
+    ("hamil", "pregnancy"),
+]
+
+CONDITION_ADVICE = {
+    "diabetes": [
+        "• Spread carbohydrates evenly over the day and pair them with protein or fiber",
+        "• Prefer whole grains and brown rice over white rice, sugary drinks and pastries",
+        "• Check your blood sugar as advised by your doctor, especially after new meals"
+    ],
+    "hypertension": [
+        "• Keep sodium under 2,000 mg a day: go easy on salt, soy sauce and instant seasonings",
+        "• Eat potassium-rich vegetables and fruit such as spinach, bananas and avocado"
+    ],
+    "cholesterol": [
+        "• Limit fried food, coconut milk dishes and fatty meat; choose grilled or steamed options",
+        "• Add soluble fiber from oats, beans and fruit to help lower LDL cholesterol"
+    ],
+    "heart_disease": [
+        "• Favor fish, legumes and unsaturated oils over red and processed meat",
+        "• Keep salt low and follow your cardiologist's guidance on exercise intensity"
+    ],
+    "kidney_disease": [
+        "• Keep protein, sodium, potassium and phosphorus within the limits set by your doctor",
+        "• Ask your nephrologist how much fluid you should drink each day"
+    ],
+    "gout": [
+        "• Limit organ meat, shellfish, anchovies and sugary drinks, which raise uric acid",
+        "• Drink water regularly to help clear uric acid"
+    ],
+    "gerd": [
+        "• Eat smaller meals and avoid lying down within 3 hours after eating",
+        "• Limit spicy, acidic and very fatty food as well as coffee if they trigger symptoms"
+    ],
+    "anemia": [
+        "• Include iron-rich foods such as lean red meat, liver, spinach and legumes",
+        "• Pair iron sources with vitamin C and keep tea or coffee away from meals"
+    ],
+    "obesity": [
+        "• Fill half your plate with vegetables and keep portions of rice and noodles moderate",
+        "• Aim for a steady loss of 0.5-1 kg per week rather than crash dieting"
+    ],
+    "celiac": [
+        "• Avoid all wheat, barley and rye, including hidden gluten in sauces and batters"
+    ],
+    "ibs": [
+        "• Eat regular meals and note which foods trigger symptoms; a low-FODMAP approach may help"
+    ],
+    "pregnancy": [
+        "• Make sure you get enough folate, iron and calcium, and avoid raw fish and undercooked meat"
+    ],
+}
+
+GOAL_ADVICE = {
+    "weight_loss": [
+        "• Keep a moderate calorie deficit and prioritize protein to stay full and preserve muscle",
+        "• Limit sugary drinks and snacks between meals"
+    ],
+    "weight_gain": [
+        "• Add calorie-dense healthy foods such as nuts, avocado and whole grains to your meals",
+        "• Do not skip meals; add a snack between meals if needed"
+    ],
+    "muscle_gain": [
+        "• Spread protein across all meals and eat a protein-rich meal after training",
+        "• Combine your meals with progressive strength training 3-4 times a week"
+    ],
+    "maintenance": [
+        "• Keep meal times regular and portions consistent to maintain your weight"
+    ],
+}
+
+ACTIVITY_ADVICE = {
+    "sedentary": "• Start with 20-30 minutes of walking most days and break up long periods of sitting",
+    "light": "• Build up to at least 150 minutes of moderate exercise per week",
+    "moderate": "• Keep up your routine and include two strength sessions per week",
+    "active": "• Refuel with carbohydrates and protein after training and schedule rest days",
+    "very_active": "• Eat enough around training to cover your high energy needs and prioritize recovery and sleep",
+}
+
+GENERAL_ADVICE = [
+    "• Maintain a balanced diet with regular meals",
+    "• Include a variety of colorful vegetables and fruit every day"
+]
+
+MAX_ADVICE_LINES = 10
+
+
+def _key(value: Any) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", str(value).lower()).strip("_")
+
+
+def _as_list(values) -> List[str]:
+    if not values:
+        return []
+    if isinstance(values, str):
+        values = values.split(",")
+    return [str(v) for v in values if str(v).strip()]
+
+
+def condition_keys(conditions: Iterable[str]) -> List[str]:
+    """Advice keys for free-text medical conditions, in the order they were listed."""
+    keys = []
+    for condition in conditions:
+        text = f"_{_key(condition)}_"
+        for keyword, key in CONDITION_KEYWORDS:
+            if f"_{keyword}_" in text and key not in keys:
+                keys.append(key)
+    return keys
+
+
+def health_advice(health_profile: Optional[dict], form_data: Optional[dict], nutrition_goals: Dict[str, str]) -> str:
+    """
+    Bullet-point health advice built from templates, in the same format as the LLM advice.
+
+    Lines come from the daily targets, the user's medical conditions (profile and form),
+    their goals and activity level, in that order of priority.
+    """
+    health_profile = health_profile or {}
+    form_data = form_data or {}
+
+    lines = [TARGETS_TEMPLATE.format(
+        calories=int(to_number(nutrition_goals.get("Calories"), 2000)),
+        protein=int(to_number(nutrition_goals.get("Protein"), 75)),
+        carbs=int(to_number(nutrition_goals.get("Carbs"), 250)),
+        fat=int(to_number(nutrition_goals.get("Fat"), 65))
+    )]
+
+    conditions = _as_list(health_profile.get("medical_conditions")) + _as_list(form_data.get("health_conditions"))
+    for key in condition_keys(conditions):
+        lines.extend(CONDITION_ADVICE[key])
+
+    goals = [_key(goal) for goal in _as_list(form_data.get("goals"))] or ["maintenance"]
+    for goal in goals:
+        lines.extend(GOAL_ADVICE.get(goal, []))
+
+    activity = _key(form_data.get("activity_level") or "light")
+    if activity in ACTIVITY_ADVICE:
+        lines.append(ACTIVITY_ADVICE[activity])
+
+    weight = to_number(health_profile.get("weight"))
+    water = round(weight * 0.035, 1) if weight else 2.0
+    lines.append(HYDRATION_TEMPLATE.format(water=water))
+    lines.extend(GENERAL_ADVICE)
+
+    # Hydration and general tips are the first to go when the personal advice is long
+    return "\n".join(list(dict.fromkeys(lines))[:MAX_ADVICE_LINES])
+
+
+def closest_item(items: List[Dict[str, Any]], target_calories: float) -> Optional[Dict[str, Any]]:
+    """The item whose calories are nearest the meal's target; ties go to the lower calorie item."""
+    best, best_key = None, None
+    for item in items:
+        calories = to_number((item.get("nutrition_info") or {}).get("calories"), default=None)
+        if calories is None:
+            continue
+        key = (abs(calories - target_calories), calories, str(item.get("name", "")))
+        if best_key is None or key < best_key:
+            best, best_key = item, key
+    return best
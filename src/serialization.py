@@ -0,0 +1,51 @@
+from typing import Any, Dict, Iterable, List, Type
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def orjson_default(value: Any):
+    """Fallback for types orjson does not handle natively."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    # numpy scalars that OPT_SERIALIZE_NUMPY does not cover (e.g. np.float16)
+    if hasattr(value, "item") and callable(value.item):
+        return value.item()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=orjson_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """orjson response with native datetime, ObjectId and numpy handling."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def model_projection(model: Type[BaseModel]) -> Dict[str, int]:
+    """MongoDB projection that only returns the fields declared on a model."""
+    return {name: 1 for name in model.model_fields if name != "id"}
+
+
+def prepare_documents(documents: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Turn trusted DB documents into response dicts without revalidating them.
+
+    Only documents that were validated on write should go through here: `_id` becomes
+    the string `id` and everything else is handed to orjson as-is.
+    """
+    prepared = []
+    for document in documents:
+        if "_id" in document:
+            document["id"] = str(document.pop("_id"))
+        prepared.append(document)
+    return prepared
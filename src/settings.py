@@ -0,0 +1,35 @@
+import json
+import logging
+from typing import Any, Callable, Dict, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def load_json_setting(name: str, raw: str, parse: Callable[[Any], T], default: T) -> T:
+    """
+    Parse a setting holding JSON, falling back to the default when it is empty or invalid.
+
+    parse gets the decoded JSON. A wrong shape or value (ValueError, KeyError, AttributeError,
+    TypeError) is logged and the default used, so a typo in one setting never stops startup.
+    """
+    if not raw:
+        return default
+    try:
+        return parse(json.loads(raw))
+    except (ValueError, KeyError, AttributeError, TypeError) as e:
+        logger.error("Invalid %s setting, using defaults: %s", name, e)
+        return default
+
+
+def load_json_overrides(
+    name: str,
+    raw: str,
+    defaults: Dict[str, T],
+    parse_value: Callable[[str, Any], T],
+) -> Dict[str, T]:
+    """A setting holding a JSON object of key to value, applied on top of the defaults."""
+    def parse(data: Dict[str, Any]) -> Dict[str, T]:
+        return {**defaults, **{str(key): parse_value(str(key), value) for key, value in data.items()}}
+    return load_json_setting(name, raw, parse, dict(defaults))
@@ -0,0 +1,176 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from dietary_tags import item_exclusion_tags
+from nutrition import to_number
+
+# Dimensions of the vectors dishes are compared on
+FEATURES = ["calories", "protein", "carbs", "fat", "price"]
+
+
+def item_features(item: Dict[str, Any]) -> List[float]:
+    nutrition = item.get("nutrition_info") or {}
+    return [to_number(nutrition.get(name)) for name in FEATURES[:-1]] + [to_number(item.get("price"))]
+
+
+class _CategoryBlock:
+    """Contiguous rows of one category: scaled vectors, squared norms, tag masks, alive flags."""
+
+    def __init__(self, words: int):
+        self.items: List[Optional[Dict[str, Any]]] = []
+        self.vectors = np.zeros((0, len(FEATURES)), dtype=np.float64)
+        self.norms = np.zeros(0, dtype=np.float64)
+        self.tags = np.zeros((0, words), dtype=np.uint64)
+        self.alive = np.zeros(0, dtype=bool)
+
+    def grow(self, size: int):
+        if size <= len(self.alive):
+            return
+        capacity = max(size, len(self.alive) * 2, 64)
+        for name in ("vectors", "norms", "tags", "alive"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def widen(self, words: int):
+        tags = np.zeros((len(self.tags), words), dtype=np.uint64)
+        tags[:, :self.tags.shape[1]] = self.tags
+        self.tags = tags
+
+
+class SubstitutionIndex:
+    """
+    Nearest-neighbour lookup of similar dishes over (calories, protein, carbs, fat, price).
+
+    Each category is one contiguous matrix, so a query scores the whole category with one
+    matrix-vector product (|x - v|^2 = |x|^2 - 2 x.v + |v|^2, with |x|^2 precomputed) and
+    masks out the item itself, removed rows and rows carrying an excluded allergen (tags
+    are packed into uint64 bit masks). Dimensions are divided by their standard deviation
+    across the catalog so grams and rupiah weigh the same. Updated items get a new row;
+    a rebuild compacts everything again.
+    """
+
+    def __init__(self):
+        self.blocks: Dict[str, _CategoryBlock] = {}
+        self.slots: Dict[str, Tuple[str, int]] = {}
+        self.tag_bits: Dict[str, int] = {}
+        self.words = 1
+        self.scale = np.ones(len(FEATURES), dtype=np.float64)
+        self.version = None
+
+    def __len__(self):
+        return len(self.slots)
+
+    @staticmethod
+    def _item_id(item: Dict[str, Any]) -> str:
+        return str(item.get("_id", item.get("id")))
+
+    def rebuild(self, items: Iterable[Dict[str, Any]], version=None):
+        """Replace the whole index, filling each category block in one go."""
+        self.__init__()
+        items = list(items)
+        features = np.array([item_features(item) for item in items], dtype=np.float64).reshape(len(items), len(FEATURES))
+        if len(items) > 1:
+            scale = features.std(axis=0)
+            self.scale = np.where(scale > 0, scale, 1.0)
+        features /= self.scale
+        tag_bits = [self._tag_bits(item_exclusion_tags(item), create=True) for item in items]
+
+        by_category: Dict[str, List[int]] = {}
+        for index, item in enumerate(items):
+            by_category.setdefault(str(item.get("category", "")).lower(), []).append(index)
+        for category, indexes in by_category.items():
+            block = self.blocks[category] = _CategoryBlock(self.words)
+            size = len(indexes)
+            block.grow(size)
+            block.items = [items[i] for i in indexes]
+            block.vectors[:size] = features[indexes]
+            block.norms[:size] = np.einsum("ij,ij->i", block.vectors[:size], block.vectors[:size])
+            block.tags[:size] = [self._words(tag_bits[i]) for i in indexes]
+            block.alive[:size] = True
+            for row, i in enumerate(indexes):
+                self.slots[self._item_id(items[i])] = (category, row)
+        self.version = version
+
+    def _tag_bits(self, tags: Iterable[str], create: bool) -> int:
+        bits = 0
+        for tag in tags:
+            bit = self.tag_bits.get(tag)
+            if bit is None:
+                if not create:
+                    continue
+                bit = self.tag_bits[tag] = len(self.tag_bits)
+                if bit >= self.words * 64:
+                    self.words += 1
+                    for block in self.blocks.values():
+                        block.widen(self.words)
+            bits |= 1 << bit
+        return bits
+
+    def _words(self, bits: int) -> List[int]:
+        return [(bits >> (64 * word)) & 0xFFFFFFFFFFFFFFFF for word in range(self.words)]
+
+    def _add(self, item: Dict[str, Any]):
+        category = str(item.get("category", "")).lower()
+        tags = self._tag_bits(item_exclusion_tags(item), create=True)
+        block = self.blocks.get(category)
+        if block is None:
+            block = self.blocks[category] = _CategoryBlock(self.words)
+        row = len(block.items)
+        block.grow(row + 1)
+        block.items.append(item)
+        block.vectors[row] = np.array(item_features(item), dtype=np.float64) / self.scale
+        block.norms[row] = block.vectors[row] @ block.vectors[row]
+        block.tags[row] = self._words(tags)
+        block.alive[row] = True
+        self.slots[self._item_id(item)] = (category, row)
+
+    def upsert(self, item: Dict[str, Any]):
+        self.remove(self._item_id(item))
+        self._add(item)
+
+    def remove(self, item_id: str):
+        slot = self.slots.pop(str(item_id), None)
+        if slot is not None:
+            block = self.blocks[slot[0]]
+            block.alive[slot[1]] = False
+            block.items[slot[1]] = None
+
+    def nearest(self, item_id: str, k: int = 5, exclude: Iterable[str] = ()) -> Optional[List[Dict[str, Any]]]:
+        """
+        The k closest other items in the same category that carry none of the excluded tags.
+
+        Returns None when the item is unknown. Each result has its scaled "distance".
+        """
+        slot = self.slots.get(str(item_id))
+        if slot is None:
+            return None
+        block = self.blocks[slot[0]]
+        size = len(block.items)
+
+        mask = block.alive[:size].copy()
+        mask[slot[1]] = False
+        excluded = self._tag_bits(exclude, create=False)
+        if excluded:
+            if self.words == 1:
+                mask &= (block.tags[:size, 0] & np.uint64(excluded)) == 0
+            else:
+                mask &= ~(block.tags[:size] & np.array(self._words(excluded), dtype=np.uint64)).any(axis=1)
+
+        candidates = int(mask.sum())
+        if not candidates or k <= 0:
+            return []
+        vector = block.vectors[slot[1]]
+        distances = block.norms[:size] - 2 * (block.vectors[:size] @ vector) + block.norms[slot[1]]
+        np.maximum(distances, 0, out=distances)
+        distances[~mask] = np.inf
+
+        k = min(k, candidates)
+        top = np.argpartition(distances, k - 1)[:k] if k < size else np.arange(size)
+        top = top[np.argsort(distances[top], kind="stable")][:k]
+        return [
+            {**block.items[row], "distance": round(float(np.sqrt(distances[row])), 4)}
+            for row in top
+        ]
@@ -0,0 +1,96 @@
+"""Tests for bulkhead isolation between endpoint classes. Run from src/: python -m pytest tests"""
+import asyncio
+import os
+import sys
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulkheads import (  # noqa: E402
+    BULKHEAD_INTERACTIVE,
+    BULKHEAD_LLM,
+    Bulkhead,
+    BulkheadMiddleware,
+    Bulkheads,
+    load_bulkheads,
+)
+
+
+def make_app(llm_release: asyncio.Event):
+    bulkheads = Bulkheads(
+        {
+            BULKHEAD_INTERACTIVE: Bulkhead(BULKHEAD_INTERACTIVE, max_concurrent=8),
+            BULKHEAD_LLM: Bulkhead(BULKHEAD_LLM, max_concurrent=1, max_queue=1, max_wait=3.0),
+        },
+        {"/recommendations": BULKHEAD_LLM},
+    )
+
+    async def recommendations(request):
+        await llm_release.wait()
+        return JSONResponse({"bulkhead": bulkheads.current().name})
+
+    async def menu_items(request):
+        return JSONResponse({"bulkhead": bulkheads.current().name})
+
+    app = Starlette(routes=[Route("/recommendations", recommendations, methods=["POST"]), Route("/menu-items", menu_items)])
+    app.add_middleware(BulkheadMiddleware, bulkheads=bulkheads)
+    return app, bulkheads
+
+
+def test_full_bulkhead_sheds_with_503_and_leaves_the_others_alone():
+    async def main():
+        llm_release = asyncio.Event()
+        app, bulkheads = make_app(llm_release)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            running = asyncio.create_task(client.post("/recommendations"))
+            queued = asyncio.create_task(client.post("/recommendations"))
+            await asyncio.sleep(0.05)
+            shed = await client.post("/recommendations")
+            cheap = await client.get("/menu-items")
+            llm_release.set()
+            return shed, cheap, await running, await queued, bulkheads
+
+    shed, cheap, running, queued, bulkheads = asyncio.run(main())
+    assert shed.status_code == 503
+    assert shed.headers["retry-after"] == "3"
+    assert shed.json() == {"detail": "Service is busy, please retry shortly"}
+    assert cheap.json() == {"bulkhead": BULKHEAD_INTERACTIVE}
+    assert running.json() == queued.json() == {"bulkhead": BULKHEAD_LLM}
+    llm = bulkheads[BULKHEAD_LLM].stats()
+    assert (llm["completed"], llm["shed_count"], llm["inflight"]) == (2, 1, 0)
+
+
+def test_jobs_wait_for_a_slot_instead_of_being_shed():
+    bulkheads = Bulkheads(
+        {
+            BULKHEAD_INTERACTIVE: Bulkhead(BULKHEAD_INTERACTIVE),
+            BULKHEAD_LLM: Bulkhead(BULKHEAD_LLM, max_concurrent=1, max_queue=0, max_wait=0.01),
+        },
+        {},
+    )
+    order = []
+
+    async def job(name):
+        async with bulkheads.use(BULKHEAD_LLM) as bulkhead:
+            order.append((name, bulkheads.current().name, bulkhead.inflight))
+            await asyncio.sleep(0.03)
+
+    async def main():
+        await asyncio.gather(*(job(i) for i in range(3)))
+
+    asyncio.run(main())
+    assert order == [(0, BULKHEAD_LLM, 1), (1, BULKHEAD_LLM, 1), (2, BULKHEAD_LLM, 1)]
+    assert bulkheads[BULKHEAD_LLM].shed_count == 0
+    assert bulkheads.current().name == BULKHEAD_INTERACTIVE
+
+
+def test_bulkheads_setting_overrides_the_defaults():
+    defaults = {BULKHEAD_INTERACTIVE: Bulkhead(BULKHEAD_INTERACTIVE), BULKHEAD_LLM: Bulkhead(BULKHEAD_LLM)}
+    loaded = load_bulkheads('{"llm": {"max_concurrent": 4, "cpu_workers": 1}}', defaults)
+    assert loaded[BULKHEAD_INTERACTIVE] is defaults[BULKHEAD_INTERACTIVE]
+    assert (loaded[BULKHEAD_LLM].limit, loaded[BULKHEAD_LLM].cpu_workers) == (4, 1)
+    assert load_bulkheads("{not json", defaults) == defaults
@@ -0,0 +1,143 @@
+"""Tests for the concurrency limiters behind the LLM endpoints. Run from src/: python -m pytest tests"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concurrency import AdaptiveLimiter, ConcurrencyLimiter, LoadShedError  # noqa: E402
+
+
+def run_windows(limiter, latencies):
+    """Complete one window of calls per latency, each call taking that long."""
+    async def main():
+        for latency in latencies:
+            for _ in range(limiter.window):
+                await limiter.acquire()
+                limiter.release(latency)
+    asyncio.run(main())
+
+
+def test_limit_grows_by_one_per_window_while_latency_holds():
+    limiter = AdaptiveLimiter(initial_limit=4, window=10, max_limit=100)
+    run_windows(limiter, [0.1] * 3)
+    # Each window adds window / limit, i.e. about one slot per window at any limit
+    assert limiter.limit == pytest.approx(4 + 10 / 4 + 10 / 6.5 + 10 / (6.5 + 10 / 6.5))
+    assert limiter.baseline_latency == 0.1
+
+
+def test_limit_is_capped_at_max_limit():
+    limiter = AdaptiveLimiter(initial_limit=4, window=10, max_limit=5)
+    run_windows(limiter, [0.1] * 3)
+    assert limiter.limit == 5
+
+
+def test_slow_window_cuts_the_limit():
+    limiter = AdaptiveLimiter(initial_limit=10, window=10, latency_tolerance=2.0, backoff=0.5)
+    run_windows(limiter, [0.1])
+    grown = limiter.limit
+    run_windows(limiter, [0.19])
+    assert limiter.limit > grown
+    slower = limiter.limit
+    run_windows(limiter, [0.25])
+    assert limiter.limit == pytest.approx(slower * 0.5)
+    assert limiter.baseline_latency == 0.1
+
+
+def test_failure_cuts_the_limit_at_once_down_to_min_limit():
+    limiter = AdaptiveLimiter(initial_limit=8, min_limit=3, backoff=0.5)
+
+    async def main():
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                async with limiter.slot():
+                    raise RuntimeError("upstream error")
+    asyncio.run(main())
+    assert limiter.limit == 3
+    assert limiter.failed == 3
+    assert limiter.inflight == 0
+
+
+def test_probe_window_runs_at_half_the_limit_then_restores_it():
+    limiter = AdaptiveLimiter(initial_limit=10, window=5, baseline_windows=3, max_limit=10)
+    run_windows(limiter, [0.1] * 3)
+    assert limiter.limit == 5
+    run_windows(limiter, [0.05])
+    assert limiter.limit == 10
+    # The unloaded probe lowered the baseline
+    assert limiter.baseline_latency == 0.05
+
+
+def test_cancelled_call_frees_its_slot_without_touching_the_limit():
+    limiter = AdaptiveLimiter(initial_limit=2)
+
+    async def main():
+        async def hold():
+            async with limiter.slot():
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert limiter.inflight == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    asyncio.run(main())
+    assert limiter.limit == 2
+    assert limiter.cancelled == 1
+    assert limiter.failed == 0
+    assert limiter.inflight == 0
+
+
+def test_cancelled_waiter_leaves_the_queue_and_the_slot_goes_to_the_next():
+    limiter = ConcurrencyLimiter(limit=1, max_queue=4, max_wait=5)
+
+    async def main():
+        await limiter.acquire()
+        first = asyncio.create_task(limiter.acquire())
+        second = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.wait_for(second, 1)
+        assert first.cancelled()
+        assert limiter.inflight == 1
+        assert len(limiter._waiters) == 0
+    asyncio.run(main())
+
+
+def test_full_queue_and_long_waits_are_shed_with_retry_after():
+    limiter = ConcurrencyLimiter(limit=1, max_queue=1, max_wait=0.05)
+
+    async def main():
+        await limiter.acquire()
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(LoadShedError) as full:
+            await limiter.acquire()
+        with pytest.raises(LoadShedError):
+            await queued
+        return full.value
+    error = asyncio.run(main())
+    assert error.retry_after == 1
+    assert limiter.shed_count == 2
+    assert limiter.inflight == 1
+
+
+def test_unshed_callers_wait_past_max_wait_and_a_full_queue():
+    limiter = ConcurrencyLimiter(limit=1, max_queue=1, max_wait=0.01)
+
+    async def main():
+        await limiter.acquire()
+        jobs = [asyncio.create_task(limiter.acquire(shed=False)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        assert not any(job.done() for job in jobs)
+        for _ in jobs:
+            limiter.release()
+            await asyncio.sleep(0)
+        await asyncio.wait_for(asyncio.gather(*jobs), 1)
+    asyncio.run(main())
+    assert limiter.shed_count == 0
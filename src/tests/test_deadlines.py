@@ -0,0 +1,137 @@
+"""Tests for request deadlines and abandoning request work. Run from src/: python -m pytest tests"""
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deadlines import (  # noqa: E402
+    ABANDON_DEADLINE,
+    ABANDON_DISCONNECT,
+    ABANDON_SUPERSEDED,
+    DeadlineExceeded,
+    DeadlineMiddleware,
+    WorkAbandoned,
+    WorkTracker,
+    remaining,
+    request_deadline_var,
+    timeout_for,
+)
+
+ROUTES = {"/recommendations": 30.0}
+
+
+def scope(path="/recommendations", timeout=None):
+    headers = [(b"x-request-timeout", timeout.encode())] if timeout is not None else []
+    return {"type": "http", "path": path, "headers": headers}
+
+
+@pytest.mark.parametrize("path, timeout, budget", [
+    ("/recommendations", None, 30.0),
+    ("/recommendations", "5", 5.0),
+    ("/recommendations", "120", 30.0),
+    ("/menu-items", "120", 60.0),
+    ("/menu-items", "2.5", 2.5),
+    ("/menu-items", None, None),
+    ("/recommendations", "0", 30.0),
+    ("/recommendations", "-3", 30.0),
+    ("/recommendations", "soon", 30.0),
+])
+def test_budget_is_the_route_deadline_cut_by_the_header_and_capped(path, timeout, budget):
+    middleware = DeadlineMiddleware(None, ROUTES, max_timeout=60.0)
+    assert middleware.budget(scope(path, timeout)) == budget
+
+
+def test_middleware_sets_the_deadline_for_the_request_only():
+    seen = {}
+
+    async def app(scope, receive, send):
+        seen["remaining"] = remaining()
+        seen["timeout"] = timeout_for(10.0)
+
+    async def main():
+        await DeadlineMiddleware(app, ROUTES)(scope(timeout="3"), None, None)
+        return remaining()
+
+    assert asyncio.run(main()) is None
+    assert 2.9 < seen["remaining"] <= 3.0
+    assert seen["timeout"] == pytest.approx(seen["remaining"], abs=0.05)
+
+
+def test_timeout_for_keeps_its_default_without_a_deadline_and_fails_once_past_it():
+    assert timeout_for(10.0) == 10.0
+    token = request_deadline_var.set(time.monotonic() - 1)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            timeout_for(10.0)
+    finally:
+        request_deadline_var.reset(token)
+
+
+async def work(seconds, result="done"):
+    await asyncio.sleep(seconds)
+    return result
+
+
+def test_newer_work_for_the_same_key_supersedes_the_older():
+    tracker = WorkTracker()
+
+    async def main():
+        first = asyncio.create_task(tracker.run("recommendations", work(1.0, "old"), key="a@x.id"))
+        await asyncio.sleep(0.01)
+        other_user = asyncio.create_task(tracker.run("recommendations", work(0.05, "other"), key="b@x.id"))
+        newer = await tracker.run("recommendations", work(0.05, "new"), key="a@x.id")
+        with pytest.raises(WorkAbandoned) as abandoned:
+            await first
+        return newer, await other_user, abandoned.value.reason
+
+    newer, other, reason = asyncio.run(main())
+    assert (newer, other, reason) == ("new", "other", ABANDON_SUPERSEDED)
+    stats = tracker.stats()
+    assert stats["abandoned"][ABANDON_SUPERSEDED] == 1
+    assert stats["completed"] == {"recommendations": 2}
+    assert tracker._inflight == {}
+
+
+def test_client_disconnect_cancels_the_work():
+    tracker = WorkTracker()
+
+    async def main():
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        task = asyncio.ensure_future(work(5.0))
+        asyncio.get_running_loop().call_later(0.05, disconnected.set)
+        with pytest.raises(WorkAbandoned) as abandoned:
+            await tracker.run("recommendations", task, receive)
+        await asyncio.sleep(0)
+        return abandoned.value.reason, task.cancelled()
+
+    assert asyncio.run(main()) == (ABANDON_DISCONNECT, True)
+    assert tracker.stats()["abandoned"][ABANDON_DISCONNECT] == 1
+
+
+def test_deadline_cancels_the_work_and_counts_the_time_reclaimed():
+    tracker = WorkTracker(smoothing=1.0)
+
+    async def main():
+        await tracker.run("recommendations", work(0.2))
+        token = request_deadline_var.set(time.monotonic() + 0.05)
+        try:
+            with pytest.raises(WorkAbandoned) as abandoned:
+                await tracker.run("recommendations", work(0.2))
+        finally:
+            request_deadline_var.reset(token)
+        return abandoned.value.reason
+
+    assert asyncio.run(main()) == ABANDON_DEADLINE
+    stats = tracker.stats()
+    assert stats["abandoned"][ABANDON_DEADLINE] == 1
+    # About 0.2s expected from the completed run, minus the 0.05s the abandoned one ran
+    assert 0.1 < stats["reclaimed_seconds"] < 0.2
@@ -0,0 +1,98 @@
+"""Tests for diet restrictions and the in-memory tag index. Run from src/: python -m pytest tests"""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dietary_tags import TagIndex, item_diet_tags, restriction_tags  # noqa: E402
+from meal_planner import filter_menu_items  # noqa: E402
+from profile_import import row_to_user  # noqa: E402
+
+ALLERGENS = ["peanut", "tree_nut", "dairy", "egg", "gluten", "soy", "fish", "shellfish", "chicken"]
+DIETS = ["vegetarian", "vegan", "halal", "keto", "low_carb"]
+CATEGORIES = ["breakfast", "lunch", "dinner"]
+
+
+@pytest.mark.parametrize("restrictions, exclude, require", [
+    (["gluten_free"], {"gluten"}, set()),
+    (["Dairy-Free"], {"dairy"}, set()),
+    (["no_gluten", "lactose_free"], {"gluten", "dairy"}, set()),
+    (["vegetarian"], {"meat", "beef", "pork", "chicken", "fish", "shellfish", "mollusc"}, {"vegetarian"}),
+    (["seafood"], {"fish", "shellfish"}, set()),
+    ("peanuts, gluten_free", {"peanut", "gluten"}, set()),
+    ([], set(), set()),
+])
+def test_restrictions_split_into_exclusions_and_required_diets(restrictions, exclude, require):
+    assert restriction_tags(restrictions) == (exclude, require)
+
+
+def test_vegan_items_count_as_vegetarian():
+    assert "vegetarian" in item_diet_tags({"diet_tags": ["vegan"]})
+    assert "vegan" not in item_diet_tags({"diet_tags": ["vegetarian"]})
+
+
+def test_dashboard_restrictions_filter_the_planner_menu():
+    items = [
+        {"_id": "fish", "category": "dinner", "allergens": ["fish"]},
+        {"_id": "pasta", "category": "dinner", "allergens": ["gluten", "dairy"], "diet_tags": ["vegetarian"]},
+        {"_id": "untagged", "category": "dinner"},
+        {"_id": "salad", "category": "dinner", "diet_tags": ["vegan"]},
+    ]
+
+    def allowed(restrictions):
+        return [item["_id"] for item in filter_menu_items(items, *restriction_tags(restrictions))]
+
+    assert allowed(["gluten_free"]) == ["fish", "untagged", "salad"]
+    assert allowed(["dairy_free"]) == ["fish", "untagged", "salad"]
+    assert allowed(["vegetarian"]) == ["pasta", "salad"]
+    assert allowed(["vegetarian", "gluten_free"]) == ["salad"]
+
+
+def test_imported_profiles_store_canonical_tags():
+    user = row_to_user({"email": "A@B.C", "allergies": "Peanuts, Seafood", "dietary_preferences": "Veggie",
+                        "medical_conditions": "Diabetes, High blood pressure"})
+    profile = user["health_profile"]
+    assert profile["allergies"] == ["fish", "peanut", "shellfish"]
+    assert profile["dietary_preferences"] == ["vegetarian"]
+    assert profile["medical_conditions"] == ["Diabetes", "High blood pressure"]
+
+
+def random_item(rng, item_id):
+    return {
+        "_id": item_id,
+        "category": rng.choice(CATEGORIES),
+        "allergens": rng.sample(ALLERGENS, k=rng.randint(0, 3)),
+        "diet_tags": rng.sample(DIETS, k=rng.randint(0, 2)),
+    }
+
+
+def matched_ids(index, category, exclude, require):
+    return sorted(item["_id"] for item in index.items_for(index.match(category, exclude, require)))
+
+
+def test_upserts_and_removes_match_a_rebuilt_index():
+    rng = random.Random(3)
+    catalog = {f"item-{i}": random_item(rng, f"item-{i}") for i in range(200)}
+    incremental = TagIndex()
+    incremental.rebuild(catalog.values())
+
+    for step in range(400):
+        item_id = f"item-{rng.randrange(260)}"
+        if rng.random() < 0.3 and item_id in catalog:
+            del catalog[item_id]
+            incremental.remove(item_id)
+        else:
+            catalog[item_id] = random_item(rng, item_id)
+            incremental.upsert(catalog[item_id])
+
+    rebuilt = TagIndex()
+    rebuilt.rebuild(catalog.values())
+    assert len(incremental) == len(rebuilt) == len(catalog)
+    for _ in range(200):
+        category = rng.choice(CATEGORIES + [None])
+        exclude = set(rng.sample(ALLERGENS, k=rng.randint(0, 3)))
+        require = set(rng.sample(DIETS, k=rng.randint(0, 1)))
+        assert matched_ids(incremental, category, exclude, require) == matched_ids(rebuilt, category, exclude, require)
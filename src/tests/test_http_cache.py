@@ -0,0 +1,59 @@
+"""Tests for conditional GET handling. Run from src/: python -m pytest tests"""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from starlette.requests import Request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_cache import CATALOG_CACHE_CONTROL, make_etag, not_modified  # noqa: E402
+
+ETAG = make_etag("menu_items", 7)
+LAST_MODIFIED = datetime(2026, 10, 1, 12, 30, 15, 500000, tzinfo=timezone.utc)
+
+
+def request_with(**headers):
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/menu-items", "headers": raw})
+
+
+@pytest.mark.parametrize("if_none_match", [
+    ETAG,
+    f"W/{ETAG}",
+    f'"other", {ETAG}',
+    f'"other" , W/{ETAG}',
+    "*",
+])
+def test_matching_etag_returns_304_with_cache_headers(if_none_match):
+    response = not_modified(request_with(if_none_match=if_none_match), ETAG, LAST_MODIFIED, CATALOG_CACHE_CONTROL)
+    assert response.status_code == 304
+    assert response.headers["etag"] == ETAG
+    assert response.headers["cache-control"] == CATALOG_CACHE_CONTROL
+    assert response.headers["last-modified"] == "Thu, 01 Oct 2026 12:30:15 GMT"
+    assert response.body == b""
+
+
+def test_weak_server_etag_matches_strong_client_tag():
+    assert not_modified(request_with(if_none_match=ETAG), f"W/{ETAG}", None, CATALOG_CACHE_CONTROL) is not None
+
+
+def test_other_etag_is_served_even_if_not_modified_since():
+    request = request_with(if_none_match='"other"', if_modified_since="Thu, 01 Oct 2026 13:00:00 GMT")
+    assert not_modified(request, ETAG, LAST_MODIFIED, CATALOG_CACHE_CONTROL) is None
+
+
+@pytest.mark.parametrize("since, expected", [
+    (LAST_MODIFIED, 304),
+    (LAST_MODIFIED + timedelta(hours=1), 304),
+    (LAST_MODIFIED - timedelta(seconds=1), None),
+])
+def test_if_modified_since_uses_whole_seconds(since, expected):
+    request = request_with(if_modified_since=since.strftime("%a, %d %b %Y %H:%M:%S GMT"))
+    response = not_modified(request, ETAG, LAST_MODIFIED, CATALOG_CACHE_CONTROL)
+    assert (response.status_code if response else None) == expected
+
+
+def test_invalid_if_modified_since_is_ignored():
+    assert not_modified(request_with(if_modified_since="yesterday"), ETAG, LAST_MODIFIED, CATALOG_CACHE_CONTROL) is None
@@ -0,0 +1,61 @@
+"""
+Tests for hedging LLM calls across model tiers.
+
+Run from src/: python -m pytest tests
+"""
+import asyncio
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_tiers import HedgedCaller, ModelTier  # noqa: E402
+
+
+def reply(text):
+    return {"choices": [{"message": {"content": text}}]}
+
+
+def tiers():
+    return [ModelTier(name="primary", model="big"), ModelTier(name="fallback", model="small")]
+
+
+def test_slow_primary_is_hedged_and_recorded_as_lower_bound():
+    async def send(prompt, tier):
+        await asyncio.sleep(0.5 if tier.name == "primary" else 0.01)
+        return reply(tier.name)
+
+    async def main():
+        caller = HedgedCaller(tiers(), send, initial_hedge_delay=0.05)
+        result = await caller.call("hello")
+        return result, caller
+
+    (response, tier), caller = asyncio.run(main())
+    assert tier == "fallback"
+    assert caller.hedges_won == 1
+    assert len(caller._latencies) == 1
+    assert 0.05 <= caller._latencies[0] < 0.5
+
+
+def test_hedge_delay_tracks_the_primary_percentile():
+    rng = random.Random(7)
+    # Lognormal primary latencies: median 11 ms, p90 about 21 ms. The hedge answers at once
+    latencies = [rng.lognormvariate(-4.5, 0.5) for _ in range(300)]
+    p90 = math.exp(-4.5 + 1.2816 * 0.5)
+
+    async def send(prompt, tier):
+        await asyncio.sleep(latencies.pop() if tier.name == "primary" else 0.001)
+        return reply(tier.name)
+
+    async def main():
+        caller = HedgedCaller(tiers(), send, initial_hedge_delay=p90, min_samples=20, window=100)
+        for _ in range(300):
+            await caller.call("hello")
+        return caller
+
+    caller = asyncio.run(main())
+    # Dropping the primaries that lost would let the delay slide well below the p90
+    assert caller.hedge_delay() >= 0.85 * p90
+    assert caller.hedges_fired < 300 * 0.15
@@ -0,0 +1,52 @@
+"""Tests for the queue-based JSON logging handler. Run from src/: python -m pytest tests"""
+import json
+import logging
+import os
+import queue
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logging_setup import JsonFormatter, LazyQueueHandler  # noqa: E402
+
+
+def queued_record(*args, **kwargs):
+    """Log through a LazyQueueHandler and return the record as the listener would get it."""
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger("tests.logging_setup")
+    logger.propagate = False
+    handler = LazyQueueHandler(log_queue)
+    logger.addHandler(handler)
+    try:
+        logger.error(*args, **kwargs)
+    finally:
+        logger.removeHandler(handler)
+    return log_queue.get_nowait()
+
+
+def test_immutable_arguments_are_left_for_the_listener():
+    record = queued_record("served by %s in %s ms", "primary", 12)
+    assert record.args == ("primary", 12)
+    assert json.loads(JsonFormatter().format(record))["message"] == "served by primary in 12 ms"
+
+
+def test_mutable_arguments_are_rendered_by_the_caller():
+    profile = {"allergies": ["peanut"]}
+    record = queued_record("profile %s", profile)
+    profile["allergies"].append("dairy")
+    assert record.args is None
+    assert json.loads(JsonFormatter().format(record))["message"] == "profile {'allergies': ['peanut']}"
+
+
+def test_traceback_is_rendered_by_the_caller():
+    try:
+        raise ValueError("bad menu item")
+    except ValueError:
+        record = queued_record("import failed", exc_info=True)
+
+    assert record.exc_info is None
+    assert "ValueError: bad menu item" in record.exc_text
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["exc_info"] == record.exc_text
+    assert entry["level"] == "ERROR"
+    assert entry["ts"].endswith("Z")
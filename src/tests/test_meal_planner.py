@@ -0,0 +1,79 @@
+"""Tests for the hard limits of the multi-day meal planner. Run from src/: python -m pytest tests"""
+import os
+import random
+import sys
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from meal_planner import build_meal_plan  # noqa: E402
+
+TARGETS = {"calories": 2000, "protein": 100, "carbs": 250, "fat": 65}
+
+
+def menu(per_category=12, seed=1):
+    rng = random.Random(seed)
+    items = []
+    for category in ("breakfast", "lunch", "dinner"):
+        for i in range(per_category):
+            items.append({
+                "_id": f"{category}-{i}",
+                "name": f"{category} {i}",
+                "category": category,
+                "nutrition_info": {"calories": rng.randint(300, 900), "protein": rng.randint(10, 50),
+                                   "carbs": rng.randint(20, 120), "fat": rng.randint(5, 40)},
+                "price": rng.randint(15, 90) * 1000,
+                "allergens": ["shellfish"] if i % 4 == 0 else [],
+            })
+    return items
+
+
+def cheapest_plan(items, days, max_repeats):
+    total = 0
+    for category in ("breakfast", "lunch", "dinner"):
+        prices = sorted(item["price"] for item in items if item["category"] == category for _ in range(max_repeats))
+        total += sum(prices[:days])
+    return total
+
+
+def plan_total(plan):
+    return sum(day["totals"]["price"] for day in plan)
+
+
+def dish_counts(plan):
+    return Counter(meal["menu_item_id"] for day in plan for meal in day["meals"])
+
+
+@pytest.mark.parametrize("slack", [0, 1000, 50000, 300000])
+def test_budget_is_never_exceeded(slack):
+    items = menu()
+    budget = cheapest_plan(items, 7, 2) + slack
+    plan = build_meal_plan(items, TARGETS, days=7, budget=budget, max_repeats=2, seed=3)
+    assert len(plan) == 7
+    assert plan_total(plan) <= budget
+    assert max(dish_counts(plan).values()) <= 2
+
+
+def test_budget_below_the_cheapest_plan_is_rejected():
+    items = menu()
+    with pytest.raises(ValueError, match="Budget"):
+        build_meal_plan(items, TARGETS, days=7, budget=cheapest_plan(items, 7, 2) - 1)
+
+
+def test_max_repeats_holds_for_a_month():
+    plan = build_meal_plan(menu(per_category=30), TARGETS, days=30, max_repeats=1, seed=3)
+    assert max(dish_counts(plan).values()) == 1
+
+
+def test_too_few_dishes_for_the_repeat_limit_is_rejected():
+    with pytest.raises(ValueError, match="not enough"):
+        build_meal_plan(menu(per_category=10), TARGETS, days=30, max_repeats=1)
+
+
+def test_excluded_tags_are_never_served():
+    items = menu()
+    plan = build_meal_plan(items, TARGETS, days=7, excluded_tags={"shellfish"}, seed=3)
+    shellfish = {item["_id"] for item in items if item["allergens"]}
+    assert not shellfish & set(dish_counts(plan))
@@ -0,0 +1,60 @@
+"""Tests for the trigram menu search index. Run from src/: python -m pytest tests"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from menu_search import SearchIndex  # noqa: E402
+
+WORDS = ["grilled", "chicken", "salad", "fried", "rice", "beef", "rendang", "tofu", "soup", "noodle",
+         "spicy", "green", "curry", "steamed", "fish", "sambal", "egg", "vegetable"]
+CATEGORIES = ["breakfast", "lunch", "dinner"]
+
+
+def random_item(rng, item_id):
+    return {
+        "_id": item_id,
+        "name": " ".join(rng.sample(WORDS, k=rng.randint(1, 3))),
+        "description": " ".join(rng.sample(WORDS, k=rng.randint(2, 6))),
+        "category": rng.choice(CATEGORIES),
+        "nutrition_info": {"calories": rng.randint(150, 900)},
+    }
+
+
+def test_finds_misspelled_and_partial_names():
+    index = SearchIndex()
+    index.rebuild([
+        {"_id": "1", "name": "Nasi Goreng", "description": "Fried rice", "category": "lunch"},
+        {"_id": "2", "name": "Rendang", "description": "Slow cooked beef", "category": "dinner"},
+    ])
+    assert index.search("nasi gorng")[0]["_id"] == "1"
+    assert index.search("rend")[0]["_id"] == "2"
+    assert index.search("rendang", category="lunch") == []
+
+
+def test_upserts_and_removes_match_a_rebuilt_index():
+    rng = random.Random(5)
+    catalog = {f"item-{i}": random_item(rng, f"item-{i}") for i in range(150)}
+    incremental = SearchIndex()
+    incremental.rebuild(catalog.values())
+
+    for _ in range(300):
+        item_id = f"item-{rng.randrange(200)}"
+        if rng.random() < 0.3 and item_id in catalog:
+            del catalog[item_id]
+            incremental.remove(item_id)
+        else:
+            catalog[item_id] = random_item(rng, item_id)
+            incremental.upsert(catalog[item_id])
+
+    rebuilt = SearchIndex()
+    rebuilt.rebuild(catalog.values())
+    assert len(incremental) == len(rebuilt) == len(catalog)
+    for _ in range(100):
+        query = " ".join(rng.sample(WORDS, k=rng.randint(1, 2)))[:rng.randint(3, 20)]
+        options = {"category": rng.choice(CATEGORIES + [None]), "max_calories": rng.choice([None, 500]),
+                   "limit": len(catalog)}
+        # Ties may come back in another order, the matches and their scores must not differ
+        found = {(item["_id"], item["score"]) for item in incremental.search(query, **options)}
+        assert found == {(item["_id"], item["score"]) for item in rebuilt.search(query, **options)}
@@ -0,0 +1,88 @@
+"""Tests for numeric nutrition values and their migration. Run from src/: python -m pytest tests"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nutrition import _menu_update, migrate_collection, nutrient_value, parse_number, to_number  # noqa: E402
+
+
+@pytest.mark.parametrize("value, number", [
+    (350, 350.0),
+    (25.5, 25.5),
+    ("350 calories", 350.0),
+    ("2000 kcal", 2000.0),
+    ("1,200 kcal", 1200.0),
+    ("75g", 75.0),
+    ("12.5 g", 12.5),
+    ("-3", -3.0),
+])
+def test_numbers_and_display_strings_parse(value, number):
+    assert parse_number(value) == number
+
+
+@pytest.mark.parametrize("value", ["", "abc", "n/a", None, [], {}])
+def test_values_without_a_number_are_rejected(value):
+    with pytest.raises(ValueError):
+        parse_number(value)
+    with pytest.raises(ValueError):
+        nutrient_value("protein", value)
+    # Reading stored data stays lenient
+    assert to_number(value, default=-1) == -1
+
+
+def test_nutrient_values_are_rounded_per_unit():
+    assert nutrient_value("calories", "349.6 kcal") == 350
+    assert nutrient_value("protein", "25.46g") == 25.5
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def batch_size(self, size):
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeResult:
+    def __init__(self, modified_count):
+        self.modified_count = modified_count
+
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.documents = documents
+        self.updates = []
+
+    def find(self, query, projection):
+        return FakeCursor(self.documents)
+
+    async def bulk_write(self, requests, ordered=True):
+        self.updates.extend(requests)
+        return FakeResult(len(requests))
+
+
+def test_migration_reports_invalid_documents_and_converts_the_rest():
+    collection = FakeCollection([
+        {"_id": 1, "nutrition_info": {"calories": "350 calories", "protein": "25g"}, "category": "Lunch"},
+        {"_id": 2, "nutrition_info": {"calories": "lots"}, "category": "lunch"},
+        {"_id": 3, "nutrition_info": {"fat": "10 g"}, "category": "dinner"},
+    ])
+    report = asyncio.run(migrate_collection(collection, {}, {}, _menu_update, batch_size=2))
+
+    assert report["scanned"] == 3
+    assert report["modified"] == 2
+    assert report["failed"] == 1
+    assert report["errors"][0]["_id"] == "2"
+    assert "lots" in report["errors"][0]["error"]
+    assert collection.updates[0]._doc["$set"] == {"nutrition_info": {"calories": 350, "protein": 25.0}, "category": "lunch"}
@@ -0,0 +1,77 @@
+"""Tests for the streaming CSV/NDJSON profile parser. Run from src/: python -m pytest tests"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import profile_import  # noqa: E402
+from profile_import import iter_lines, iter_rows  # noqa: E402
+
+HEADER = b"email,name,allergies\n"
+
+
+def parse(data: bytes, fmt: str = "csv", chunk_size: int = 7):
+    """All (row_number, row, error) of data, fed in small chunks that split lines and characters."""
+    async def chunks():
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+
+    async def collect():
+        return [row async for row in iter_rows(iter_lines(chunks()), fmt)]
+    return asyncio.run(collect())
+
+
+def test_quoted_fields_may_span_lines_and_escape_quotes():
+    rows = parse(HEADER + b'a@x.id,"Ann\r\n""Annie"" Lee","peanut,\ndairy"\r\nb@x.id,Bob,\n')
+    assert rows == [
+        (1, {"email": "a@x.id", "name": 'Ann\n"Annie" Lee', "allergies": "peanut,\ndairy"}, None),
+        (2, {"email": "b@x.id", "name": "Bob", "allergies": ""}, None),
+    ]
+
+
+def test_stray_quote_inside_an_unquoted_field_is_kept():
+    rows = parse(HEADER + b'a@x.id,Ann 5" tall,\nb@x.id,Bob,egg\n')
+    assert [row[1]["name"] for row in rows] == ['Ann 5" tall', "Bob"]
+    assert all(error is None for _, _, error in rows)
+
+
+def test_unterminated_quote_costs_one_row_and_parsing_resumes():
+    rows = parse(HEADER + b'a@x.id,"Ann,peanut\nb@x.id,Bob,egg\nc@x.id,Cid,\n')
+    assert rows == [
+        (1, None, "unterminated quoted field"),
+        (2, {"email": "b@x.id", "name": "Bob", "allergies": "egg"}, None),
+        (3, {"email": "c@x.id", "name": "Cid", "allergies": ""}, None),
+    ]
+
+
+def test_overlong_open_quote_is_cut_at_the_record_limit(monkeypatch):
+    monkeypatch.setattr(profile_import, "MAX_RECORD_CHARS", 40)
+    lines = [b'a@x.id,"Ann,peanut'] + [b"x@x.id,Row %d," % i for i in range(5)]
+    rows = parse(HEADER + b"\n".join(lines) + b"\n")
+    assert rows[0] == (1, None, "unterminated quoted field")
+    assert [row[1]["name"] for row in rows[1:]] == [f"Row {i}" for i in range(5)]
+
+
+def test_invalid_utf8_and_wrong_column_counts_are_reported_per_row():
+    rows = parse(HEADER + b"a@x.id,\xff\xfe,\nb@x.id,Bob\nc@x.id,Cid,\n")
+    assert rows == [
+        (1, None, "invalid UTF-8"),
+        (2, None, "expected 3 columns, got 2"),
+        (3, {"email": "c@x.id", "name": "Cid", "allergies": ""}, None),
+    ]
+
+
+def test_ndjson_rows_must_be_objects():
+    rows = parse(b'{"email": "a@x.id"}\n\n[1, 2]\n{broken\n', fmt="ndjson")
+    assert rows[0] == (1, {"email": "a@x.id"}, None)
+    assert rows[1] == (2, None, "invalid JSON: row is not a JSON object")
+    assert rows[2][0] == 3 and rows[2][2].startswith("invalid JSON")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64, 4096])
+def test_chunk_boundaries_do_not_change_the_rows(chunk_size):
+    data = HEADER + 'a@x.id,"Añá\nLee",peanut\r\nb@x.id,Bob,egg\n'.encode()
+    assert parse(data, chunk_size=chunk_size) == parse(data, chunk_size=len(data))
@@ -0,0 +1,167 @@
+"""
+Tests for the /recipes proxy against a local stand-in recipe service.
+
+The stand-in is a FastAPI app served by uvicorn on a free local port, so timeouts and
+error statuses go through a real HTTP connection. Ingredients steer it: "slow" makes it
+answer late, "broken" makes it fail with 500.
+
+Run from src/: python -m pytest tests
+"""
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recipe_proxy import RecipeProxy, UpstreamError, normalize_recipe_request  # noqa: E402
+
+UPSTREAM_LATENCY = 0.1
+
+stand_in = FastAPI()
+upstream_calls = []
+
+
+@stand_in.post("/api/recipes")
+async def fake_recipes(request: Request):
+    body = await request.json()
+    upstream_calls.append({"ingredients": body["ingredients"], "api_key": request.headers.get("x-api-key")})
+    if "broken" in body["ingredients"]:
+        return JSONResponse({"detail": "boom"}, status_code=500)
+    await asyncio.sleep(1.0 if "slow" in body["ingredients"] else UPSTREAM_LATENCY)
+    # The call number tells a refreshed response from the one cached before it
+    return {"recipes": [{"name": " & ".join(body["ingredients"]), "call": len(upstream_calls)}]}
+
+
+@pytest.fixture(scope="module")
+def upstream_url():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(stand_in, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}/api/recipes"
+    server.should_exit = True
+    thread.join()
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    upstream_calls.clear()
+
+
+def run_with_proxy(upstream_url, scenario, **options):
+    async def main():
+        proxy = RecipeProxy(upstream_url, **options)
+        await proxy.start()
+        try:
+            return await scenario(proxy)
+        finally:
+            await proxy.stop()
+    return asyncio.run(main())
+
+
+def test_concurrent_identical_requests_share_one_upstream_call(upstream_url):
+    async def scenario(proxy):
+        bodies = [{"ingredients": "Rice, egg"}, {"ingredients": ["egg", "rice "]}]
+        return await asyncio.gather(*(proxy.get(bodies[i % 2]) for i in range(10))), proxy.stats()
+
+    results, stats = run_with_proxy(upstream_url, scenario)
+    assert len(upstream_calls) == 1
+    assert all(result == results[0] for result in results)
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 9
+
+
+def test_stale_entry_is_served_while_one_refresh_runs(upstream_url):
+    async def scenario(proxy):
+        first = await proxy.get({"ingredients": ["tofu"]})
+        await asyncio.sleep(0.3)
+        # Past the ttl: the old response comes back at once and a single refresh starts
+        start = time.monotonic()
+        stale = await asyncio.gather(*(proxy.get({"ingredients": ["tofu"]}) for _ in range(5)))
+        stale_seconds = time.monotonic() - start
+        await asyncio.sleep(UPSTREAM_LATENCY * 1.5)
+        fresh = await proxy.get({"ingredients": ["tofu"]})
+        return first, stale, stale_seconds, fresh, proxy.stats()
+
+    first, stale, stale_seconds, fresh, stats = run_with_proxy(upstream_url, scenario, ttl=0.25, stale_ttl=60)
+    assert all(response == first for response in stale)
+    assert stale_seconds < UPSTREAM_LATENCY
+    assert len(upstream_calls) == 2
+    assert fresh["recipes"][0]["call"] == 2
+    assert stats["stale_hits"] == 5
+    assert stats["hits"] == 1
+
+
+@pytest.mark.parametrize("body", [[], "rice", None, {"ingredients": 5}, {"ingredients": {"rice": 1}}, {"ingredients": " , "}])
+def test_malformed_bodies_are_rejected_before_any_upstream_call(body):
+    with pytest.raises(ValueError):
+        normalize_recipe_request(body)
+
+
+def test_upstream_error_status_maps_to_502(upstream_url):
+    async def scenario(proxy):
+        with pytest.raises(UpstreamError) as error:
+            await proxy.get({"ingredients": ["broken"]})
+        return error.value, proxy.stats()
+
+    error, stats = run_with_proxy(upstream_url, scenario)
+    assert error.status_code == 502
+    assert "500" in error.detail
+    assert stats["errors"] == 1
+    assert stats["entries"] == 0
+
+
+def test_upstream_timeout_maps_to_504(upstream_url):
+    async def scenario(proxy):
+        with pytest.raises(UpstreamError) as error:
+            await proxy.get({"ingredients": ["slow"]})
+        return error.value
+
+    assert run_with_proxy(upstream_url, scenario, timeout=0.2).status_code == 504
+
+
+def test_upstream_unreachable_maps_to_502():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        closed_port = sock.getsockname()[1]
+
+    async def scenario(proxy):
+        with pytest.raises(UpstreamError) as error:
+            await proxy.get({"ingredients": ["rice"]})
+        return error.value
+
+    assert run_with_proxy(f"http://127.0.0.1:{closed_port}/api/recipes", scenario).status_code == 502
+
+
+def test_callers_keys_get_separate_entries_without_a_server_key(upstream_url):
+    async def scenario(proxy):
+        await proxy.get({"ingredients": ["rice"]}, api_key="alice")
+        await proxy.get({"ingredients": ["rice"]}, api_key="bob")
+        await proxy.get({"ingredients": ["rice"]}, api_key="alice")
+        return proxy.stats()
+
+    stats = run_with_proxy(upstream_url, scenario)
+    assert [call["api_key"] for call in upstream_calls] == ["alice", "bob"]
+    assert stats["hits"] == 1
+
+
+def test_server_key_is_used_and_shared_by_all_callers(upstream_url):
+    async def scenario(proxy):
+        await proxy.get({"ingredients": ["rice"]}, api_key="alice")
+        await proxy.get({"ingredients": ["rice"]}, api_key="bob")
+        return proxy.stats()
+
+    stats = run_with_proxy(upstream_url, scenario, api_key="server")
+    assert [call["api_key"] for call in upstream_calls] == ["server"]
+    assert stats["hits"] == 1
@@ -0,0 +1,29 @@
+"""Tests for matching free-text medical conditions to advice keys. Run from src/: python -m pytest tests"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rules_engine import condition_keys  # noqa: E402
+
+
+@pytest.mark.parametrize("condition, keys", [
+    ("Heartburn", ["gerd"]),
+    ("adrenal insufficiency", []),
+    ("broken ribs", []),
+    ("Heart disease", ["heart_disease"]),
+    ("chronic renal failure", ["kidney_disease"]),
+    ("IBS", ["ibs"]),
+    ("Diabetes type 2", ["diabetes"]),
+    ("high blood pressure", ["hypertension"]),
+    ("penyakit jantung", ["heart_disease"]),
+    ("acid reflux", ["gerd"]),
+])
+def test_condition_matches_whole_words_only(condition, keys):
+    assert condition_keys([condition]) == keys
+
+
+def test_keys_follow_listing_order_without_duplicates():
+    assert condition_keys(["gout", "diabetic", "Diabetes", "heart failure"]) == ["gout", "diabetes", "heart_disease"]
@@ -0,0 +1,70 @@
+"""Tests for the nearest-neighbour dish substitution index. Run from src/: python -m pytest tests"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from substitutions import SubstitutionIndex  # noqa: E402
+
+ALLERGENS = ["peanut", "dairy", "egg", "gluten", "soy", "fish", "shellfish"]
+CATEGORIES = ["breakfast", "lunch", "dinner"]
+
+
+def random_item(rng, item_id):
+    return {
+        "_id": item_id,
+        "name": item_id,
+        "category": rng.choice(CATEGORIES),
+        "nutrition_info": {"calories": rng.uniform(200, 900), "protein": rng.uniform(5, 60),
+                           "carbs": rng.uniform(10, 120), "fat": rng.uniform(3, 40)},
+        "price": rng.uniform(15000, 90000),
+        "allergens": rng.sample(ALLERGENS, k=rng.randint(0, 2)),
+    }
+
+
+def test_nearest_skips_itself_and_excluded_allergens():
+    index = SubstitutionIndex()
+    index.rebuild([
+        {"_id": "a", "category": "lunch", "nutrition_info": {"calories": 500}, "price": 30000},
+        {"_id": "b", "category": "lunch", "nutrition_info": {"calories": 510}, "price": 30000, "allergens": ["peanuts"]},
+        {"_id": "c", "category": "lunch", "nutrition_info": {"calories": 800}, "price": 30000},
+        {"_id": "d", "category": "dinner", "nutrition_info": {"calories": 500}, "price": 30000},
+    ])
+    assert [item["_id"] for item in index.nearest("a")] == ["b", "c"]
+    assert [item["_id"] for item in index.nearest("a", exclude=["peanut"])] == ["c"]
+    assert index.nearest("missing") is None
+
+
+def test_upserts_and_removes_match_a_rebuilt_index():
+    rng = random.Random(11)
+    catalog = {f"item-{i}": random_item(rng, f"item-{i}") for i in range(300)}
+    incremental = SubstitutionIndex()
+    incremental.rebuild(catalog.values())
+
+    # Scaling is fixed between rebuilds, so the changes keep the same set of feature vectors:
+    # items move category, change allergens, or are removed and added back
+    removed = {}
+    for _ in range(400):
+        item_id = f"item-{rng.randrange(300)}"
+        if item_id in removed:
+            catalog[item_id] = removed.pop(item_id)
+            incremental.upsert(catalog[item_id])
+        elif rng.random() < 0.3:
+            removed[item_id] = catalog.pop(item_id)
+            incremental.remove(item_id)
+        else:
+            catalog[item_id] = {**catalog[item_id], "category": rng.choice(CATEGORIES),
+                                "allergens": rng.sample(ALLERGENS, k=rng.randint(0, 2))}
+            incremental.upsert(catalog[item_id])
+    for item in removed.values():
+        catalog[item["_id"]] = item
+        incremental.upsert(item)
+
+    rebuilt = SubstitutionIndex()
+    rebuilt.rebuild(catalog.values())
+    assert len(incremental) == len(rebuilt) == len(catalog)
+    for item_id in rng.sample(sorted(catalog), k=100):
+        exclude = rng.sample(ALLERGENS, k=rng.randint(0, 2))
+        expected = [(item["_id"], item["distance"]) for item in rebuilt.nearest(item_id, 8, exclude)]
+        assert [(item["_id"], item["distance"]) for item in incremental.nearest(item_id, 8, exclude)] == expected